@@ -1,19 +1,179 @@
 #!/usr/bin/env python3
-from flask import request, make_response, abort
+import hashlib
+import time
+import zlib
+from datetime import date, datetime, timezone
+from functools import wraps
+from urllib.parse import urlencode
+from flask import g, request, make_response, abort, stream_with_context
 from flask_restful import Resource
 from sqlalchemy import func
-from config import app, db, api
-from models import User, Movie, Rental, Rating
+from sqlalchemy.exc import OperationalError
+from sqlalchemy.orm import joinedload
+from config import app, db, api, cache, compressor
+from models import User, Movie, Rental, Rating, MovieRatingStats, TableVersion, MovieSearch, UserSummary, OverdueRental, MovieInventory, ChangeLog, MovieSimilarity, RatingRollup, GenreRatingRollup, rollup_series
+from serializers import serializer_for, dumps
+from bulk import BulkResource, missing_ids
+from validation import USER_SCHEMA, MOVIE_SCHEMA, RENTAL_SCHEMA, RATING_SCHEMA
+import instrumentation
+import jobs
+import metrics
+import routing
+
+DEFAULT_PAGE_SIZE = 100
+MAX_PAGE_SIZE = 1000
+MAX_TOP_MOVIES = 100
+DEFAULT_SEARCH_RESULTS = 20
+MAX_SEARCH_RESULTS = 100
+DEFAULT_RECOMMENDATIONS = 10
+MAX_RECOMMENDATIONS = 100
+DEFAULT_TIMESERIES_POINTS = 90
+MAX_TIMESERIES_POINTS = 1000
+EXPORT_BATCH_SIZE = 1000
+
+instrumentation.init_app(app)
+metrics.init_app(app)
+routing.init_app(app)
+jobs.init_app(app)
+compressor.init_app(app)
+
+with app.app_context():
+    for model in (User, Movie, Rental, Rating):
+        serializer_for(model)
 
 @app.route('/')
 def index():
     return '<h1>Project Server</h1>'
 
+# Pagination
+def page_args(args, model):
+    """Parse `limit`, `after` and `fields` from query args, raising ValueError with a message for the client."""
+    try:
+        limit = int(args.get('limit', DEFAULT_PAGE_SIZE))
+        after = int(args.get('after', 0))
+    except ValueError:
+        raise ValueError('`limit` and `after` must be integers')
+    if not 1 <= limit <= MAX_PAGE_SIZE:
+        raise ValueError(f'`limit` must be between 1 and {MAX_PAGE_SIZE}')
+
+    fields = None
+    if args.get('fields'):
+        fields = {field.strip() for field in args['fields'].split(',') if field.strip()}
+        unknown = sorted(fields - set(model.__table__.columns.keys()))
+        if unknown:
+            raise ValueError(f"Unknown fields: {', '.join(unknown)}")
+        fields = tuple(sorted(fields | {'id'}))
+    return limit, after, fields
+
+def paginate(model, *criteria, extend=None):
+    """Keyset-paginate a collection on `id` using the `limit`, `after` and `fields` args.
+
+    Only rows with an id greater than `after` are read, so every page costs the
+    same no matter how deep into the table it is. Rows are read as plain tuples
+    and serialized by the model's precompiled serializer into compact JSON. The
+    cursor for the next page is returned in the `X-Next-Cursor` and `Link` headers.
+    `extend`, if given, is called with the page's items to add to them in place.
+    """
+    try:
+        limit, after, fields = page_args(request.args, model)
+    except ValueError as e:
+        return make_response({'errors': str(e)}, 400)
+
+    serializer = serializer_for(model, fields)
+    rows = serializer.rows(db.session, model.id > after, *criteria, limit=limit + 1)
+    has_next = len(rows) > limit
+    with metrics.timed('serialization_time'):
+        items = serializer.serialize_rows(rows[:limit])
+    if extend:
+        extend(items)
+    with metrics.timed('serialization_time'):
+        body = dumps(items)
+
+    response = app.response_class(body, status=200, mimetype='application/json')
+    if has_next:
+        cursor = items[-1]['id']
+        args = {**request.args.to_dict(), 'after': cursor, 'limit': limit}
+        response.headers['X-Next-Cursor'] = str(cursor)
+        response.headers['Link'] = f'<{request.base_url}?{urlencode(args)}>; rel="next"'
+    return response
+
+# Conditional GET
+def version_stamp(full_path, tables, versions):
+    """The ETag and Last-Modified time of a response at `full_path` that read `tables` at `versions`.
+
+    Versions go in with the time they were bumped, as in the cache's keys, so
+    a database rebuilt from scratch, whose counters start over, doesn't
+    revalidate old copies (or the compressed bodies stored under them).
+    """
+    state = ','.join('{}.{}.{}'.format(table, *versions.get(table, (0, None))) for table in tables)
+    etag = hashlib.sha1(f'{full_path}|{state}'.encode()).hexdigest()
+    modified = max((updated_at for _, updated_at in versions.values()), default=None)
+    if modified:
+        modified = modified.replace(tzinfo=timezone.utc, microsecond=0)
+    return etag, modified
+
+def versioned(*tables, volatile_args=()):
+    """Answer conditional GETs from the version counters of the tables a response reads.
+
+    The strong ETag covers the request path and query plus each table's
+    version, so an unchanged read costs one lookup in `table_versions` and a
+    304, with no querying or serialization. Tags compare weakly, so the weak
+    ETag of a compressed response revalidates too. Requests with any of
+    `volatile_args` (whose result depends on the clock) are served normally.
+    The versions read are kept for the request, for `table_versions`.
+    """
+    def decorator(get):
+        @wraps(get)
+        def wrapper(*args, **kwargs):
+            if any(arg in request.args for arg in volatile_args):
+                return get(*args, **kwargs)
+
+            versions = TableVersion.current(tables)
+            g.table_versions = {table: versions.get(table, (0, None)) for table in tables}
+            etag, modified = version_stamp(request.full_path, tables, versions)
+
+            if request.if_none_match:
+                not_modified = request.if_none_match.contains_weak(etag)
+            else:
+                not_modified = bool(modified and request.if_modified_since and modified <= request.if_modified_since)
+
+            if not_modified:
+                response = app.response_class(status=304)
+            else:
+                response = make_response(get(*args, **kwargs))
+                if response.status_code != 200:
+                    return response
+            response.set_etag(etag)
+            if modified:
+                response.last_modified = modified
+            return response
+        return wrapper
+    return decorator
+
+def table_versions(tables):
+    """{table: (version, updated_at)} for `tables`, as `versioned` read them for this request if it did."""
+    read = g.get('table_versions', {})
+    if not all(table in read for table in tables):
+        versions = TableVersion.current(tables)
+        read = {**read, **{table: versions.get(table, (0, None)) for table in tables}}
+        g.table_versions = read
+    return read
+
+cache.versions = table_versions
+
 # User Resource
 class Users(Resource):
+    query_budget = {'get': 3}
+
+    # Summaries change as rentals fall due, so `include` responses aren't versioned.
+    @versioned('users', volatile_args=('include',))
     def get(self):
-        users = [user.to_dict() for user in User.query.all()]
-        return make_response(users, 200)
+        include = request.args.get('include')
+        if include is None:
+            return paginate(User)
+        if include != 'summary':
+            return make_response({'errors': '`include` must be `summary`'}, 400)
+        return paginate(User, extend=attach_summaries)
 
     def post(self):
         json = request.get_json()
@@ -34,6 +194,9 @@ class Users(Resource):
 
 
 class UsersById(Resource):
+    query_budget = {'get': 2}
+
+    @versioned('users')
     def get(self, id):
         users = User.query.filter(User.id == id).first()
         return make_response(users.to_dict(), 200)
@@ -57,17 +220,71 @@ class UsersById(Resource):
         user = User.query.filter(User.id == id).first()
 
         if user:
+            MovieRatingStats.forget_user(user.id)
+            RatingRollup.record_ratings(Rating.user_id == user.id, sign=-1)
             db.session.delete(user)
             db.session.commit()
             return {}, 204
         else:
             return {'error': 'User not found'}, 404
 
+def attach_summaries(items):
+    summaries = UserSummary.for_users([item['id'] for item in items])
+    for item in items:
+        item['summary'] = summaries.get(item['id'], UserSummary.EMPTY)
+
+class UserSummaryById(Resource):
+    query_budget = {'get': 3}
+
+    def get(self, id):
+        """Counts of the user's rentals (active and overdue), next due date, and ratings given with their average."""
+        if not db.session.get(User, id):
+            return make_response({'error': 'User not found'}, 404)
+        return make_response(UserSummary.for_users([id]).get(id, UserSummary.EMPTY), 200)
+
+class UserRecommendations(Resource):
+    query_budget = {'get': 3}
+
+    @versioned('users', 'ratings', 'movie_rating_stats', 'movie_similarities', 'movies')
+    def get(self, id):
+        """Movies the user hasn't rated, best first, scored from the precomputed neighbours of those they have.
+
+        A user with no ratings, or whose rated movies have no neighbours yet, gets an empty list.
+        """
+        try:
+            limit = recommendation_limit(request.args, MAX_RECOMMENDATIONS)
+        except ValueError as e:
+            return make_response({'errors': str(e)}, 400)
+        if not db.session.get(User, id):
+            return make_response({'error': 'User not found'}, 404)
+        return scored_movies(MovieSimilarity.recommended_for(id, limit))
+
+class UserRentals(Resource):
+    query_budget = {'get': 3}
+
+    @versioned('users', 'rentals')
+    def get(self, id):
+        if not db.session.get(User, id):
+            return make_response({'error': 'User not found'}, 404)
+        return paginate(Rental, Rental.user_id == id)
+
+class UserRatings(Resource):
+    query_budget = {'get': 3}
+
+    @versioned('users', 'ratings', 'movies')
+    def get(self, id):
+        if not db.session.get(User, id):
+            return make_response({'error': 'User not found'}, 404)
+        return paginate(Rating, Rating.user_id == id)
+
 # Movie Resource
 class Movies(Resource):
+    query_budget = {'get': 2}
+
+    @versioned('movies')
+    @cache.cached('movies')
     def get(self):
-        movies = [movie.to_dict() for movie in Movie.query.all()]
-        return make_response(movies, 200)
+        return paginate(Movie)
 
     def post(self):
         json = request.get_json()
@@ -89,9 +306,14 @@ class Movies(Resource):
             return {"errors": "Failed to add movie to database", 'message': str(e)}, 500
     
 class MoviesById(Resource):
+    query_budget = {'get': 2}
+
+    @versioned('movies', 'movie_rating_stats')
+    @cache.cached('movies', tables=('movies', 'movie_rating_stats'))
     def get(self, id):
-        movies = Movie.query.filter(Movie.id == id).first()
-        return make_response(movies.to_dict(), 200)
+        movies = Movie.query.options(joinedload(Movie.rating_stats)).filter(Movie.id == id).first()
+        stats = movies.rating_stats.to_dict() if movies.rating_stats else MovieRatingStats.EMPTY
+        return make_response({**movies.to_dict(), 'rating_stats': stats}, 200)
 
 
     def patch(self, id):
@@ -103,10 +325,14 @@ class MoviesById(Resource):
                 return make_response({"error": "All fields (title, genre, release_year, image) are required"}, 400)
 
             try:
+                previous = {movie.id: movie.genre}
                 movie.title = json['title']
                 movie.genre = json['genre']
                 movie.release_year = json['release_year']
                 movie.image = json['image']
+                if movie.rating_stats:
+                    movie.rating_stats.genre = movie.genre
+                GenreRatingRollup.move(previous)
 
                 db.session.commit() 
                 return make_response(movie.to_dict(), 202)
@@ -120,38 +346,297 @@ class MoviesById(Resource):
         movie = Movie.query.filter(Movie.id == id).first()
 
         if movie:
+            # Its rentals and ratings go with it through the foreign keys' cascade; the flush hooks bump their tables' versions too.
+            user_ids = UserSummary.users_of(Rating, Rating.movie_id == id) | UserSummary.users_of(Rental, Rental.movie_id == id)
+            GenreRatingRollup.forget_movies([id])
             db.session.delete(movie)
+            db.session.flush()
+            UserSummary.refresh(user_ids)
             db.session.commit()
             return {}, 204
         else:
             return {'error': 'Movie not found'}, 404
 
+class MoviesTop(Resource):
+    query_budget = {'get': 2}
+
+    @versioned('movies', 'movie_rating_stats')
+    def get(self):
+        """Highest-rated movies, optionally within a `genre`, read off the precomputed stats."""
+        try:
+            limit = int(request.args.get('limit', 10))
+            min_count = int(request.args.get('min_count', 1))
+        except ValueError:
+            return make_response({'errors': '`limit` and `min_count` must be integers'}, 400)
+        if not 1 <= limit <= MAX_TOP_MOVIES:
+            return make_response({'errors': f'`limit` must be between 1 and {MAX_TOP_MOVIES}'}, 400)
+
+        query = db.session.query(Movie, MovieRatingStats).join(Movie.rating_stats).filter(
+            MovieRatingStats.mean.isnot(None),
+            MovieRatingStats.count >= min_count,
+        )
+        if request.args.get('genre'):
+            query = query.filter(MovieRatingStats.genre == request.args['genre'])
+        rows = query.order_by(MovieRatingStats.mean.desc()).limit(limit).all()
+
+        movies = [{**movie.to_dict(), 'rating_stats': stats.to_dict()} for movie, stats in rows]
+        return make_response(movies, 200)
+
+class MoviesSearch(Resource):
+    query_budget = {'get': 2}
+
+    @versioned('movies', 'ratings')
+    def get(self):
+        """Movies matching every word of `q` in their title, genre or reviews, best first.
+
+        The last word matches as a prefix, so the endpoint can back a
+        type-ahead box. Pages are walked with `limit` and `offset`, the next
+        one linked from the `Link` header.
+        """
+        if db.engine.dialect.name != 'sqlite':
+            return make_response({'error': 'Search needs the SQLite FTS5 index'}, 501)
+        query = request.args.get('q', '')
+        if MovieSearch.match_expression(query) is None:
+            return make_response({'errors': '`q` must contain at least one word'}, 400)
+        try:
+            limit = int(request.args.get('limit', DEFAULT_SEARCH_RESULTS))
+            offset = int(request.args.get('offset', 0))
+        except ValueError:
+            return make_response({'errors': '`limit` and `offset` must be integers'}, 400)
+        if not 1 <= limit <= MAX_SEARCH_RESULTS or offset < 0:
+            return make_response({'errors': f'`limit` must be between 1 and {MAX_SEARCH_RESULTS} and `offset` at least 0'}, 400)
+
+        serializer = serializer_for(Movie)
+        hits = MovieSearch.hits(query, limit + 1, offset)
+        rows = db.session.execute(
+            serializer.statement.add_columns(hits.c.rank).join(hits, hits.c.rowid == Movie.id).order_by(hits.c.rank)
+        ).all()
+        with metrics.timed('serialization_time'):
+            items = [{**serializer.serialize(row), 'score': -row[-1]} for row in rows[:limit]]
+            body = dumps(items)
+
+        response = app.response_class(body, status=200, mimetype='application/json')
+        if len(rows) > limit:
+            args = {**request.args.to_dict(), 'offset': offset + limit, 'limit': limit}
+            response.headers['Link'] = f'<{request.base_url}?{urlencode(args)}>; rel="next"'
+        return response
+
+class MovieSimilar(Resource):
+    query_budget = {'get': 3}
+
+    @versioned('movies', 'movie_similarities')
+    def get(self, id):
+        """The movies most like this one by how users rated both, most similar first, read off the precomputed index."""
+        try:
+            limit = recommendation_limit(request.args, app.config['RECOMMENDER_NEIGHBOURS'])
+        except ValueError as e:
+            return make_response({'errors': str(e)}, 400)
+        if not db.session.get(Movie, id):
+            return make_response({'error': 'Movie not found'}, 404)
+        return scored_movies(MovieSimilarity.similar_to(id, limit))
+
+class MovieRentals(Resource):
+    query_budget = {'get': 3}
+
+    @versioned('movies', 'rentals')
+    def get(self, id):
+        if not db.session.get(Movie, id):
+            return make_response({'error': 'Movie not found'}, 404)
+        return paginate(Rental, Rental.movie_id == id)
+
+class MovieRatings(Resource):
+    query_budget = {'get': 3}
+
+    @versioned('movies', 'ratings', 'users')
+    def get(self, id):
+        if not db.session.get(Movie, id):
+            return make_response({'error': 'Movie not found'}, 404)
+        return paginate(Rating, Rating.movie_id == id)
+
+def rollup_args(args):
+    """Parse `period`, `from`, `to` and `limit` from query args, raising ValueError with a message for the client."""
+    period = args.get('period', 'day')
+    if period not in RatingRollup.PERIODS:
+        raise ValueError(f"`period` must be one of {', '.join(RatingRollup.PERIODS)}")
+    try:
+        first = date.fromisoformat(args['from']) if args.get('from') else None
+        last = date.fromisoformat(args['to']) if args.get('to') else None
+    except ValueError:
+        raise ValueError('`from` and `to` must be ISO 8601 dates')
+    try:
+        limit = int(args.get('limit', DEFAULT_TIMESERIES_POINTS))
+    except ValueError:
+        raise ValueError('`limit` must be an integer')
+    if not 1 <= limit <= MAX_TIMESERIES_POINTS:
+        raise ValueError(f'`limit` must be between 1 and {MAX_TIMESERIES_POINTS}')
+    return period, first, last, limit
+
+def rollup_points(rows):
+    """Rollup rows of (start, count, sum), latest first, as points oldest first."""
+    return [{'start': start.isoformat(), 'count': count, 'sum': total, 'mean': total / count} for start, count, total in reversed(rows)]
+
+class MovieRatingsTimeseries(Resource):
+    query_budget = {'get': 3}
+
+    @versioned('movies', 'rating_rollups')
+    def get(self, id):
+        """The movie's ratings per day or week (`period`), oldest first, read off its rollups.
+
+        The `limit` latest periods starting from `from` to `to` are listed;
+        periods without ratings are left out.
+        """
+        try:
+            period, first, last, limit = rollup_args(request.args)
+        except ValueError as e:
+            return make_response({'errors': str(e)}, 400)
+        if not db.session.get(Movie, id):
+            return make_response({'error': 'Movie not found'}, 404)
+        rows = db.session.execute(rollup_series(RatingRollup, RatingRollup.movie_id == id, period, first, last, limit)).all()
+        with metrics.timed('serialization_time'):
+            body = dumps(rollup_points(rows))
+        return app.response_class(body, status=200, mimetype='application/json')
+
+class GenreStats(Resource):
+    query_budget = {'get': 4}
+
+    @versioned('movies', 'genre_rating_rollups')
+    def get(self, genre):
+        """Every rating of the genre's movies counted, summed and averaged, with a `series` per period like a movie's timeseries."""
+        try:
+            period, first, last, limit = rollup_args(request.args)
+        except ValueError as e:
+            return make_response({'errors': str(e)}, 400)
+        count, total = db.session.execute(GenreRatingRollup.totals(genre)).one()
+        if not count and db.session.scalar(db.select(Movie.id).where(Movie.genre == genre).limit(1)) is None:
+            return make_response({'error': 'Genre not found'}, 404)
+        rows = db.session.execute(rollup_series(GenreRatingRollup, GenreRatingRollup.genre == genre, period, first, last, limit)).all()
+        return make_response({
+            'genre': genre,
+            'count': count or 0,
+            'sum': total or 0,
+            'mean': total / count if count else None,
+            'period': period,
+            'series': rollup_points(rows),
+        }, 200)
+
+class MovieInventoryById(Resource):
+    query_budget = {'get': 2}
+
+    @versioned('movies', 'movie_inventory', 'rentals')
+    def get(self, id):
+        """The copies of the movie the store holds, how many are rented out and how many are free."""
+        availability = MovieInventory.availability([id]).get(id)
+        if availability is None:
+            return make_response({'error': 'Movie not found'}, 404)
+        return make_response({'movie_id': id, **availability}, 200)
+
+    def patch(self, id):
+        json = request.get_json(silent=True) or {}
+        copies = json.get('copies')
+        if not isinstance(copies, int) or isinstance(copies, bool) or copies < 0:
+            return make_response({'errors': '`copies` must be a non-negative integer'}, 400)
+        movie = db.session.get(Movie, id)
+        if not movie:
+            return make_response({'error': 'Movie not found'}, 404)
+
+        if movie.inventory:
+            movie.inventory.copies = copies
+        else:
+            movie.inventory = MovieInventory(copies=copies)
+        db.session.commit()
+        return make_response({'movie_id': id, **MovieInventory.availability([id])[id]}, 202)
+
+# Recommendations
+def recommendation_limit(args, maximum):
+    """Parse `limit` from query args, raising ValueError with a message for the client."""
+    try:
+        limit = int(args.get('limit', min(DEFAULT_RECOMMENDATIONS, maximum)))
+    except ValueError:
+        raise ValueError('`limit` must be an integer')
+    if not 1 <= limit <= maximum:
+        raise ValueError(f'`limit` must be between 1 and {maximum}')
+    return limit
+
+def scored_movies(statement):
+    """A response listing the movies `statement` selects as (movie_id, score), best first, each with its score."""
+    serializer = serializer_for(Movie)
+    hits = statement.subquery('hits')
+    rows = db.session.execute(
+        serializer.statement.add_columns(hits.c.score).join(hits, hits.c.movie_id == Movie.id).order_by(hits.c.score.desc(), Movie.id)
+    ).all()
+    with metrics.timed('serialization_time'):
+        body = dumps([{**serializer.serialize(row), 'score': round(row[-1], 4)} for row in rows])
+    return app.response_class(body, status=200, mimetype='application/json')
+
 # Rental Resource
+def rental_criteria(args):
+    criteria = []
+    if 'user_id' in args:
+        criteria.append(Rental.user_id == int(args['user_id']))
+    if 'movie_id' in args:
+        criteria.append(Rental.movie_id == int(args['movie_id']))
+    if 'due_before' in args:
+        criteria.append(Rental.due_date < datetime.fromisoformat(args['due_before']))
+    if 'due_after' in args:
+        criteria.append(Rental.due_date > datetime.fromisoformat(args['due_after']))
+    if args.get('overdue', '').lower() == 'true':
+        criteria.append(Rental.due_date < datetime.now())
+    if args.get('status') == 'overdue':
+        # An IN over the recorded ids walks `overdue_rentals` in id order and
+        # looks each rental up, rather than walking rentals to find the overdue ones.
+        criteria.append(Rental.id.in_(db.select(OverdueRental.rental_id)))
+    return criteria
+
 class Rentals(Resource):
+    query_budget = {'get': 2}
+
+    @versioned('rentals', 'overdue_rentals', volatile_args=('overdue',))
     def get(self):
-        rentals = [rental.to_dict() for rental in Rental.query.all()]
-        return make_response(rentals, 200)
+        """Rentals, filtered in SQL by `user_id`, `movie_id`, `overdue=true`, `due_before` and `due_after`.
+
+        `status=overdue` reads the rentals the background scan has recorded as
+        overdue, walking `overdue_rentals` rather than every rental's due date.
+        Unlike `overdue=true` it lags the clock by up to `OVERDUE_SCAN_INTERVAL`,
+        and so can be versioned.
+        """
+        if request.args.get('status', 'overdue') != 'overdue':
+            return make_response({'errors': '`status` must be `overdue`'}, 400)
+        try:
+            criteria = rental_criteria(request.args)
+        except ValueError:
+            return make_response({'errors': 'Ids must be integers and dates ISO 8601 strings'}, 400)
+        return paginate(Rental, *criteria)
 
     def post(self):
-        json = request.get_json()
+        """Check out a copy of `movie_id` to `user_id`, or answer 409 when every copy is rented out."""
+        json = request.get_json(silent=True)
+        if not isinstance(json, dict):
+            return make_response({'errors': 'Body must be a JSON object'}, 400)
+        row, errors = RENTAL_SCHEMA.validate(json)
+        if errors:
+            return make_response({'errors': errors}, 400)
         try:
-            movie = db.session.get(Movie, json['movie_id'])
-            user = db.session.get(User, json['user_id'])
-            
-            if not movie or not user:
-                return make_response({'error': 'Movie or User not found'}, 404)
-            new_rental = Rental(
-                due_date=json['due_date'],
-                movie=movie,  
-                user=user  
-            )
-            db.session.add(new_rental)
+            rental_id = MovieInventory.checkout(row['user_id'], row['movie_id'], row['due_date'])
+            if rental_id is None:
+                found = db.session.get(Movie, row['movie_id']) and db.session.get(User, row['user_id'])
+                db.session.rollback()
+                if not found:
+                    return make_response({'error': 'Movie or User not found'}, 404)
+                return make_response({'error': 'No copies of this movie are available'}, 409)
             db.session.commit()
-            return make_response(new_rental.to_dict(), 201)
+            return make_response(db.session.get(Rental, rental_id).to_dict(), 201)
+        except OperationalError:
+            # Typically the write lock wasn't free within the busy timeout; nothing was written.
+            db.session.rollback()
+            return make_response({'error': 'Too many checkouts at once; try again shortly'}, 503, {'Retry-After': '1'})
         except Exception as e:
+            db.session.rollback()
             return {"errors": "Failed to add rental", 'message': str(e)}, 500
 
 class RentalsById(Resource):
+    query_budget = {'get': 2}
+
+    @versioned('rentals')
     def get(self, id):
         rentals = Rental.query.filter(Rental.id == id).first()
         return make_response(rentals.to_dict(), 200)
@@ -163,7 +648,12 @@ class RentalsById(Resource):
         if rental:
             movie = db.session.get(Movie, json['movie_id'])
             user = db.session.get(User, json['user_id'])
-            
+
+            if movie and movie.id != rental.movie_id:
+                MovieInventory.lock([movie.id])
+                if not MovieInventory.availability([movie.id])[movie.id]['available']:
+                    db.session.rollback()
+                    return make_response({'error': 'No copies of this movie are available'}, 409)
             if movie:
                 rental.movie = movie
             if user:
@@ -188,10 +678,11 @@ class RentalsById(Resource):
 
 # Rating/Review Resource
 class Ratings(Resource):
+    query_budget = {'get': 2}
 
+    @versioned('ratings', 'movies', 'users')
     def get(self):
-        ratings = [rating.to_dict() for rating in Rating.query.all()]
-        return make_response(ratings, 200)
+        return paginate(Rating)
 
     def post(self):
         json = request.get_json()
@@ -209,37 +700,366 @@ class Ratings(Resource):
                 user=user  
             )
             db.session.add(new_rating)
+            MovieRatingStats.record(movie.id, new_rating.rating)
+            db.session.flush()
+            RatingRollup.record_ratings(Rating.id == new_rating.id)
             db.session.commit()
             return make_response(new_rating.to_dict(), 201)
         except Exception as e:
             return {"errors": "Failed to add rating/review", 'message': str(e)}, 500
 
 class RatingsById(Resource):
+    loading_plan = (joinedload(Rating.movie), joinedload(Rating.user))
+    query_budget = {'get': 2}
+
+    @versioned('ratings', 'movies', 'users')
     def get(self, id):
-        ratings = Rating.query.filter(Rating.id == id).first()
+        ratings = Rating.query.options(*self.loading_plan).filter(Rating.id == id).first()
         return make_response(ratings.to_dict(), 200)
     
     def delete(self, id):
         rating = Rating.query.filter(Rating.id == id).first()
 
         if rating:
+            MovieRatingStats.record(rating.movie_id, rating.rating, -1)
+            RatingRollup.record_ratings(Rating.id == id, sign=-1)
             db.session.delete(rating)
             db.session.commit()
             return {}, 204
         else:
             return {'error': 'Review not found'}, 404
 
+# Export Resource
+class Export(Resource):
+    tables = {'users': User, 'movies': Movie, 'rentals': Rental, 'ratings': Rating}
+
+    def get(self, table):
+        """Stream a whole table as NDJSON, gzipped on the fly when the client accepts it.
+
+        Rows come off a server-side cursor `EXPORT_BATCH_SIZE` at a time and are
+        written out as they're read, so memory stays flat however big the table is.
+        """
+        model = self.tables.get(table)
+        if model is None:
+            return make_response({'error': f"Unknown table; expected one of {', '.join(self.tables)}"}, 404)
+
+        serializer = serializer_for(model)
+        gzipped = 'gzip' in request.headers.get('Accept-Encoding', '')
+
+        def generate():
+            compressor = zlib.compressobj(6, zlib.DEFLATED, 31) if gzipped else None
+            result = db.session.execute(
+                serializer.statement.order_by(model.id).execution_options(yield_per=EXPORT_BATCH_SIZE)
+            )
+            for rows in result.partitions():
+                chunk = ''.join(dumps(serializer.serialize(row)) + '\n' for row in rows).encode()
+                yield compressor.compress(chunk) if compressor else chunk
+            if compressor:
+                yield compressor.flush()
+
+        response = app.response_class(stream_with_context(generate()), mimetype='application/x-ndjson')
+        response.headers['Content-Disposition'] = f'attachment; filename={table}.ndjson'
+        if gzipped:
+            response.headers['Content-Encoding'] = 'gzip'
+            response.headers['Vary'] = 'Accept-Encoding'
+        return response
+
+# Change feed
+def change_args(args, headers):
+    """(after, tables) for a `/changes` request, raising ValueError with a message for the client.
+
+    `after` is the `Last-Event-ID` an EventSource sends when it reconnects,
+    else the `after` arg, else None to start from now; `tables` is the
+    `tables` arg split on commas, or None for all of them.
+    """
+    after = headers.get('Last-Event-ID') or args.get('after')
+    try:
+        after = int(after) if after else None
+    except ValueError:
+        raise ValueError('`after` and `Last-Event-ID` must be integers')
+    tables = None
+    if args.get('tables'):
+        tables = tuple(sorted({table.strip() for table in args['tables'].split(',') if table.strip()}))
+        unknown = [table for table in tables if table not in ChangeLog.TABLES]
+        if unknown:
+            raise ValueError(f"Unknown tables: {', '.join(unknown)}; expected some of {', '.join(ChangeLog.TABLES)}")
+    return after, tables
+
+def sse_message(data, id=None, event=None):
+    lines = []
+    if event:
+        lines.append(f'event: {event}')
+    if id is not None:
+        lines.append(f'id: {id}')
+    lines.append(f'data: {dumps(data)}')
+    return '\n'.join(lines) + '\n\n'
+
+def change_feed_opening(after, session=None):
+    """The cursor a `/changes` stream resuming after `after` starts from, and the messages it opens with.
+
+    It opens with the reconnect delay, a `reset` event if the entries the
+    client missed were pruned (it should reload its collections), and a
+    `ready` event carrying the cursor as its id.
+    """
+    cursor, pruned = ChangeLog.resume_point(after, session)
+    messages = [f"retry: {app.config['CHANGE_FEED_RETRY_MS']}\n\n"]
+    if pruned:
+        messages.append(sse_message({'error': 'Changes since Last-Event-ID were pruned; reload the collections'}, id=cursor, event='reset'))
+    messages.append(sse_message({'last_event_id': cursor}, id=cursor, event='ready'))
+    return cursor, messages
+
+class Changes(Resource):
+    def get(self):
+        """Stream row-level changes to users, movies, rentals and ratings as Server-Sent Events.
+
+        Each change is a message whose id is its change log id and whose data
+        is `{"id", "table", "action", "row"}`, `row` holding the values after
+        an insert or update and before a delete. A reconnecting EventSource
+        sends `Last-Event-ID` and picks up where it left off. Here every
+        subscriber holds a worker thread and polls the log itself; `asgi.py`
+        serves this route from one poll per process instead, for many
+        subscribers.
+        """
+        try:
+            after, tables = change_args(request.args, request.headers)
+        except ValueError as e:
+            return make_response({'errors': str(e)}, 400)
+        cursor, opening = change_feed_opening(after)
+        db.session.close()
+
+        interval = app.config['CHANGE_FEED_POLL_INTERVAL']
+        heartbeat = app.config['CHANGE_FEED_HEARTBEAT']
+        batch_size = app.config['CHANGE_FEED_BATCH_SIZE']
+
+        def generate():
+            nonlocal cursor
+            yield ''.join(opening)
+            last_sent = time.monotonic()
+            while True:
+                entries = ChangeLog.since(cursor, batch_size, tables)
+                # Don't hold a read transaction (and a pooled connection) open between polls.
+                db.session.close()
+                if entries:
+                    cursor = entries[-1].id
+                    yield ''.join(sse_message(entry.to_dict(), id=entry.id) for entry in entries)
+                    last_sent = time.monotonic()
+                    if len(entries) == batch_size:
+                        continue
+                elif time.monotonic() - last_sent >= heartbeat:
+                    yield ': keep-alive\n\n'
+                    last_sent = time.monotonic()
+                time.sleep(interval)
+
+        response = app.response_class(stream_with_context(generate()), mimetype='text/event-stream')
+        response.headers['Cache-Control'] = 'no-cache'
+        response.headers['X-Accel-Buffering'] = 'no'
+        return response
+
+# Bulk Resources
+def dangling_references(rows):
+    """Rows whose `movie_id` or `user_id` points at a row that doesn't exist."""
+    movies = missing_ids(Movie, [row['movie_id'] for row in rows if 'movie_id' in row])
+    users = missing_ids(User, [row['user_id'] for row in rows if 'user_id' in row])
+    return {
+        position: (404, 'Movie or User not found')
+        for position, row in enumerate(rows)
+        if row.get('movie_id') in movies or row.get('user_id') in users
+    }
+
+class UsersBulk(BulkResource):
+    model = User
+    schema = USER_SCHEMA
+
+    def check(self, rows):
+        emails = [row['email'] for row in rows if 'email' in row]
+        owners = dict(db.session.execute(db.select(User.email, User.id).where(User.email.in_(emails))).all())
+        errors, seen = {}, set()
+        for position, row in enumerate(rows):
+            if 'email' not in row:
+                continue
+            owner = owners.get(row['email'])
+            if row['email'] in seen or (owner is not None and owner != row.get('id')):
+                errors[position] = (409, 'Email is already in use')
+            seen.add(row['email'])
+        return errors
+
+    def before_delete(self, ids):
+        # Their rentals, ratings and summaries go with them through the foreign keys' cascade.
+        MovieRatingStats.record_ratings(Rating.user_id.in_(ids), sign=-1)
+        RatingRollup.record_ratings(Rating.user_id.in_(ids), sign=-1)
+
+class MoviesBulk(BulkResource):
+    model = Movie
+    schema = MOVIE_SCHEMA
+    user_ids = frozenset()
+    genres = {}
+
+    def before_update(self, ids):
+        self.genres = dict(db.session.execute(db.select(Movie.id, Movie.genre).where(Movie.id.in_(ids))).all())
+
+    def after_update(self, ids):
+        GenreRatingRollup.move(self.genres)
+        db.session.execute(
+            db.update(MovieRatingStats)
+            .where(MovieRatingStats.movie_id.in_(ids))
+            .values(genre=db.select(Movie.genre).where(Movie.id == MovieRatingStats.movie_id).scalar_subquery())
+        )
+
+    def before_delete(self, ids):
+        # Their rentals, ratings, stats and inventory go with them through the foreign keys' cascade.
+        self.user_ids = UserSummary.users_of(Rating, Rating.movie_id.in_(ids)) | UserSummary.users_of(Rental, Rental.movie_id.in_(ids))
+        GenreRatingRollup.forget_movies(ids)
+
+    def after_delete(self, ids):
+        UserSummary.refresh(self.user_ids)
+
+class RentalsBulk(BulkResource):
+    model = Rental
+    schema = RENTAL_SCHEMA
+    user_ids = frozenset()
+    due_dates = {}
+    purge_filters = {
+        'due_before': lambda value: Rental.due_date < datetime.fromisoformat(value),
+        'movie_id': lambda value: Rental.movie_id == int(value),
+        'user_id': lambda value: Rental.user_id == int(value),
+    }
+
+    def check(self, rows):
+        errors = dangling_references(rows)
+        errors.update(self.unavailable(rows, errors))
+        return errors
+
+    def unavailable(self, rows, errors):
+        """Rows that would rent out more copies of a movie than it has, counting the rows before them.
+
+        An update that leaves a rental on its movie takes no new copy.
+        """
+        current = dict(db.session.execute(
+            db.select(Rental.id, Rental.movie_id).where(Rental.id.in_([row['id'] for row in rows if 'id' in row]))
+        ).all())
+        wanted = [
+            (position, row['movie_id']) for position, row in enumerate(rows)
+            if position not in errors and 'movie_id' in row and current.get(row.get('id')) != row['movie_id']
+        ]
+        movie_ids = {movie_id for _, movie_id in wanted}
+        if not movie_ids:
+            return {}
+        MovieInventory.lock(movie_ids)
+        free = {movie_id: counts['available'] for movie_id, counts in MovieInventory.availability(movie_ids).items()}
+        unavailable = {}
+        for position, movie_id in wanted:
+            if free.get(movie_id, 0) > 0:
+                free[movie_id] -= 1
+            else:
+                unavailable[position] = (409, 'No copies of this movie are available')
+        return unavailable
+
+    def after_insert(self, ids):
+        UserSummary.refresh(UserSummary.users_of(Rental, Rental.id.in_(ids)))
+
+    def before_update(self, ids):
+        self.user_ids = UserSummary.users_of(Rental, Rental.id.in_(ids))
+        self.due_dates = self.due_dates_of(ids)
+
+    def after_update(self, ids):
+        UserSummary.refresh(self.user_ids | UserSummary.users_of(Rental, Rental.id.in_(ids)))
+        # Only a new due date retires an overdue record; the scan only looks past the latest one it recorded.
+        OverdueRental.forget([id for id, due_date in self.due_dates_of(ids).items() if due_date != self.due_dates.get(id)])
+
+    @staticmethod
+    def due_dates_of(ids):
+        return dict(db.session.execute(db.select(Rental.id, Rental.due_date).where(Rental.id.in_(ids))).all())
+
+    def before_delete(self, ids):
+        self.user_ids = UserSummary.users_of(Rental, Rental.id.in_(ids))
+
+    def after_delete(self, ids):
+        UserSummary.refresh(self.user_ids)
+
+class RatingsBulk(BulkResource):
+    model = Rating
+    schema = RATING_SCHEMA
+    user_ids = frozenset()
+    purge_filters = {
+        'before': lambda value: Rating.created_at < datetime.fromisoformat(value),
+        'movie_id': lambda value: Rating.movie_id == int(value),
+        'user_id': lambda value: Rating.user_id == int(value),
+    }
+
+    def check(self, rows):
+        return dangling_references(rows)
+
+    def after_insert(self, ids):
+        MovieRatingStats.record_ratings(Rating.id.in_(ids))
+        RatingRollup.record_ratings(Rating.id.in_(ids))
+        UserSummary.refresh(UserSummary.users_of(Rating, Rating.id.in_(ids)))
+
+    def before_update(self, ids):
+        MovieRatingStats.record_ratings(Rating.id.in_(ids), sign=-1)
+        RatingRollup.record_ratings(Rating.id.in_(ids), sign=-1)
+        self.user_ids = UserSummary.users_of(Rating, Rating.id.in_(ids))
+
+    def after_update(self, ids):
+        MovieRatingStats.record_ratings(Rating.id.in_(ids))
+        RatingRollup.record_ratings(Rating.id.in_(ids))
+        UserSummary.refresh(self.user_ids | UserSummary.users_of(Rating, Rating.id.in_(ids)))
+
+    def before_delete(self, ids):
+        MovieRatingStats.record_ratings(Rating.id.in_(ids), sign=-1)
+        RatingRollup.record_ratings(Rating.id.in_(ids), sign=-1)
+        self.user_ids = UserSummary.users_of(Rating, Rating.id.in_(ids))
+
+    def after_delete(self, ids):
+        UserSummary.refresh(self.user_ids)
+
 api.add_resource(Users, '/users')
 api.add_resource(UsersById, "/users/<int:id>")
+api.add_resource(UserSummaryById, "/users/<int:id>/summary")
+api.add_resource(UserRentals, "/users/<int:id>/rentals")
+api.add_resource(UserRatings, "/users/<int:id>/ratings")
+api.add_resource(UserRecommendations, "/users/<int:id>/recommendations")
+api.add_resource(UsersBulk, '/users/bulk')
 
 api.add_resource(Movies, '/movies')
 api.add_resource(MoviesById, "/movies/<int:id>")
+api.add_resource(MoviesTop, '/movies/top')
+api.add_resource(MoviesSearch, '/movies/search')
+api.add_resource(MovieRentals, "/movies/<int:id>/rentals")
+api.add_resource(MovieRatings, "/movies/<int:id>/ratings")
+api.add_resource(MovieRatingsTimeseries, "/movies/<int:id>/ratings/timeseries")
+api.add_resource(MovieInventoryById, "/movies/<int:id>/inventory")
+api.add_resource(MovieSimilar, "/movies/<int:id>/similar")
+api.add_resource(MoviesBulk, '/movies/bulk')
+
+api.add_resource(GenreStats, '/genres/<string:genre>/stats')
 
 api.add_resource(Rentals, '/rentals')
 api.add_resource(RentalsById, "/rentals/<int:id>")
+api.add_resource(RentalsBulk, '/rentals/bulk')
 
 api.add_resource(Ratings, '/ratings')
 api.add_resource(RatingsById, '/ratings/<int:id>')
+api.add_resource(RatingsBulk, '/ratings/bulk')
+
+api.add_resource(Export, '/export/<string:table>')
+api.add_resource(Changes, '/changes')
+
+@app.route('/cache/stats')
+def cache_stats():
+    return make_response({**cache.stats(), 'compression': compressor.stats()}, 200)
+
+@app.route('/metrics')
+def prometheus_metrics():
+    stats = cache.stats()['namespaces']
+    extra = ['# HELP app_cache_requests_total Response cache lookups.', '# TYPE app_cache_requests_total counter']
+    for namespace, counts in sorted(stats.items()):
+        extra.append(f'app_cache_requests_total{{namespace="{namespace}",result="hit"}} {counts["hits"]}')
+        extra.append(f'app_cache_requests_total{{namespace="{namespace}",result="miss"}} {counts["misses"]}')
+    compression = compressor.stats()
+    extra += ['# HELP app_compression_store_requests_total Lookups of stored compressed bodies.', '# TYPE app_compression_store_requests_total counter']
+    extra.append(f'app_compression_store_requests_total{{result="hit"}} {compression["hits"]}')
+    extra.append(f'app_compression_store_requests_total{{result="miss"}} {compression["misses"]}')
+    return app.response_class(metrics.metrics.render(extra), mimetype='text/plain; version=0.0.4')
 
 
 
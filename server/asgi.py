@@ -0,0 +1,547 @@
+#!/usr/bin/env python3
+"""ASGI entry point serving the REST API with async handlers.
+
+    uvicorn asgi:app --port 5555 --workers 1
+
+Reads and creates on the `users`, `movies`, `rentals` and `ratings` collections
+(`GET /<collection>`, `GET /<collection>/<id>` and `POST /<collection>`) run on
+SQLAlchemy's asyncio engine (aiosqlite for SQLite), so a single process keeps
+thousands of client connections open while it waits on the database. They
+answer with the same bodies, cursors and ETags as the Flask resources in
+`app.py`, compressed the same way. So does the `GET /changes` event stream
+(uncompressed), with every subscriber in the process fed by a single poll of
+the change log. Every other route is handed to the Flask app through a WSGI
+adapter.
+"""
+
+# Standard library imports
+import asyncio
+import json
+import logging
+import os
+import re
+import time
+from email.utils import format_datetime, parsedate_to_datetime
+from urllib.parse import parse_qsl, urlencode
+
+# Remote library imports
+from asgiref.wsgi import WsgiToAsgi
+from sqlalchemy import event
+from sqlalchemy.engine import make_url
+from sqlalchemy.exc import OperationalError, SQLAlchemyError
+from sqlalchemy.pool import AsyncAdaptedQueuePool
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
+from werkzeug.http import parse_etags
+
+# Local imports
+from app import app as flask_app, page_args, rental_criteria, version_stamp, change_args, change_feed_opening, sse_message
+from config import db, compressor, apply_sqlite_pragmas
+from models import User, Movie, Rental, Rating, MovieRatingStats, TableVersion, MovieInventory, ChangeLog, RatingRollup
+from serializers import serializer_for, dumps
+from validation import USER_SCHEMA, MOVIE_SCHEMA, RENTAL_SCHEMA, RATING_SCHEMA
+import routing
+
+logger = logging.getLogger(__name__)
+
+ASYNC_DRIVERS = {'sqlite': 'sqlite+aiosqlite', 'postgresql': 'postgresql+asyncpg', 'mysql': 'mysql+aiomysql'}
+
+
+def async_database_url():
+    """`ASYNC_DATABASE_URL`, or the Flask app's database URL with its async driver swapped in."""
+    if os.environ.get('ASYNC_DATABASE_URL'):
+        return make_url(os.environ['ASYNC_DATABASE_URL'])
+    with flask_app.app_context():
+        url = db.engine.url
+    backend = url.get_backend_name()
+    if backend not in ASYNC_DRIVERS:
+        raise RuntimeError(f'No async driver known for {backend!r}; set ASYNC_DATABASE_URL')
+    return url.set(drivername=ASYNC_DRIVERS[backend])
+
+
+def create_engine():
+    url = async_database_url()
+    engine = create_async_engine(
+        url,
+        # aiosqlite defaults to NullPool, which would open a connection (and its thread) per request.
+        poolclass=AsyncAdaptedQueuePool,
+        pool_size=int(os.environ.get('DB_POOL_SIZE', 10)),
+        max_overflow=int(os.environ.get('DB_MAX_OVERFLOW', 20)),
+        pool_timeout=int(os.environ.get('DB_POOL_TIMEOUT', 30)),
+        pool_pre_ping=url.get_backend_name() != 'sqlite',
+    )
+    if url.get_backend_name() == 'sqlite':
+        event.listen(engine.sync_engine, 'connect', apply_sqlite_pragmas)
+    return engine
+
+
+engine = create_engine()
+Session = async_sessionmaker(engine, expire_on_commit=False)
+
+
+class HTTPError(Exception):
+    def __init__(self, status, body, headers=()):
+        self.status = status
+        self.body = body
+        self.headers = list(headers)
+
+
+class Request:
+    def __init__(self, scope, body):
+        self.method = scope['method']
+        self.path = scope['path']
+        self.query_string = scope['query_string'].decode('latin-1')
+        self.headers = {name.decode('latin-1').lower(): value.decode('latin-1') for name, value in scope['headers']}
+        self.body = body
+        self.args = {}
+        for name, value in parse_qsl(self.query_string, keep_blank_values=True):
+            self.args.setdefault(name, value)
+        host = self.headers.get('host', 'localhost')
+        self.base_url = f"{scope.get('scheme', 'http')}://{host}{self.path}"
+        # Same shape as Flask's `request.full_path`, so both servers hash the same ETags.
+        self.full_path = f'{self.path}?{self.query_string}'
+
+    def json(self):
+        try:
+            body = json.loads(self.body or b'null')
+        except ValueError:
+            raise HTTPError(400, {'errors': 'Body must be valid JSON'})
+        if not isinstance(body, dict):
+            raise HTTPError(400, {'errors': 'Body must be a JSON object'})
+        return body
+
+    def not_modified(self, etag, modified):
+        if 'if-none-match' in self.headers:
+            # Weakly, like Flask's `versioned`: a compressed response's tag is the weak form.
+            return parse_etags(self.headers['if-none-match']).contains_weak(etag)
+        if modified and 'if-modified-since' in self.headers:
+            try:
+                return modified <= parsedate_to_datetime(self.headers['if-modified-since'])
+            except (TypeError, ValueError):
+                return False
+        return False
+
+
+class Collection:
+    """Async list, detail and create handlers for one model, mirroring its Flask resources.
+
+    `tables` and `detail_tables` name the tables whose versions make up the
+    ETag, as `@versioned` does in `app.py`; `schema` validates a create
+    request's body, and `references` maps foreign-key fields to the model
+    that must already have a row with that id. List requests with any of
+    `flask_args` are left to the Flask resource.
+    """
+
+    model = None
+    tables = ()
+    detail_tables = None
+    volatile_args = ()
+    flask_args = ()
+    schema = None
+    references = {}
+
+    def criteria(self, args):
+        return []
+
+    async def detail(self, session, item):
+        return item
+
+    async def created(self, session, instance):
+        """Runs after the new row is added and before the commit; the place to keep derived data in step."""
+        pass
+
+    @property
+    def not_found(self):
+        return {'error': f'{self.model.__name__} not found'}
+
+    async def conditional(self, session, request, tables):
+        """Return (etag, modified, 304 response or None) for a GET reading `tables`."""
+        if any(arg in request.args for arg in self.volatile_args):
+            return None, None, None
+        versions = await session.run_sync(lambda sync_session: TableVersion.current(tables, session=sync_session))
+        etag, modified = version_stamp(request.full_path, tables, versions)
+        if request.not_modified(etag, modified):
+            return etag, modified, (304, stamp_headers(etag, modified), b'')
+        return etag, modified, None
+
+    async def list(self, request):
+        try:
+            limit, after, fields = page_args(request.args, self.model)
+            criteria = self.criteria(request.args)
+        except ValueError as e:
+            raise HTTPError(400, {'errors': str(e)})
+
+        async with Session() as session:
+            etag, modified, response = await self.conditional(session, request, self.tables)
+            if response:
+                return response
+            serializer = serializer_for(self.model, fields)
+            statement = serializer.statement.where(self.model.id > after, *criteria).order_by(self.model.id).limit(limit + 1)
+            rows = (await session.execute(statement)).all()
+
+        items = serializer.serialize_rows(rows[:limit])
+        headers = stamp_headers(etag, modified)
+        if len(rows) > limit:
+            cursor = items[-1]['id']
+            args = {**request.args, 'after': cursor, 'limit': limit}
+            headers += [('X-Next-Cursor', str(cursor)), ('Link', f'<{request.base_url}?{urlencode(args)}>; rel="next"')]
+        return 200, headers, dumps(items).encode()
+
+    async def get(self, request, id):
+        async with Session() as session:
+            etag, modified, response = await self.conditional(session, request, self.detail_tables or self.tables)
+            if response:
+                return response
+            serializer = serializer_for(self.model)
+            row = (await session.execute(serializer.statement.where(self.model.id == id))).first()
+            if row is None:
+                raise HTTPError(404, self.not_found)
+            item = await self.detail(session, serializer.serialize(row))
+        return 200, stamp_headers(etag, modified), json_body(item)
+
+    async def post(self, request):
+        body = request.json()
+        row, errors = self.schema.validate(body)
+        if errors:
+            raise HTTPError(400, {'errors': errors})
+        instance = self.model(**row)
+
+        async with Session() as session:
+            for field, target in self.references.items():
+                if await session.get(target, getattr(instance, field)) is None:
+                    raise HTTPError(404, {'error': 'Movie or User not found'})
+            try:
+                session.add(instance)
+                await self.created(session, instance)
+                await session.commit()
+            except SQLAlchemyError as e:
+                await session.rollback()
+                raise HTTPError(500, {'errors': f'Failed to add {self.model.__name__.lower()}', 'message': str(e)})
+            serializer = serializer_for(self.model)
+            row = (await session.execute(serializer.statement.where(self.model.id == instance.id))).one()
+        return 201, write_headers(), json_body(serializer.serialize(row))
+
+
+class Users(Collection):
+    model = User
+    tables = ('users',)
+    flask_args = ('include',)
+    schema = USER_SCHEMA
+
+
+class Movies(Collection):
+    model = Movie
+    tables = ('movies',)
+    detail_tables = ('movies', 'movie_rating_stats')
+    schema = MOVIE_SCHEMA
+
+    async def detail(self, session, item):
+        stats = await session.get(MovieRatingStats, item['id'])
+        return {**item, 'rating_stats': stats.to_dict() if stats else MovieRatingStats.EMPTY}
+
+
+class Rentals(Collection):
+    model = Rental
+    tables = ('rentals', 'overdue_rentals')
+    detail_tables = ('rentals',)
+    volatile_args = ('overdue',)
+    schema = RENTAL_SCHEMA
+
+    def criteria(self, args):
+        if args.get('status', 'overdue') != 'overdue':
+            raise ValueError('`status` must be `overdue`')
+        try:
+            return rental_criteria(args)
+        except ValueError:
+            raise ValueError('Ids must be integers and dates ISO 8601 strings')
+
+    async def post(self, request):
+        """Check out a copy through `MovieInventory.checkout`, as the Flask resource does."""
+        row, errors = self.schema.validate(request.json())
+        if errors:
+            raise HTTPError(400, {'errors': errors})
+
+        async with Session() as session:
+            try:
+                rental_id = await session.run_sync(
+                    lambda sync_session: MovieInventory.checkout(row['user_id'], row['movie_id'], row['due_date'], session=sync_session)
+                )
+                if rental_id is None:
+                    found = await session.get(Movie, row['movie_id']) is not None and await session.get(User, row['user_id']) is not None
+                    await session.rollback()
+                    if not found:
+                        raise HTTPError(404, {'error': 'Movie or User not found'})
+                    raise HTTPError(409, {'error': 'No copies of this movie are available'})
+                await session.commit()
+            except OperationalError:
+                await session.rollback()
+                raise HTTPError(503, {'error': 'Too many checkouts at once; try again shortly'}, [('Retry-After', '1')])
+            except SQLAlchemyError as e:
+                await session.rollback()
+                raise HTTPError(500, {'errors': 'Failed to add rental', 'message': str(e)})
+            serializer = serializer_for(self.model)
+            row = (await session.execute(serializer.statement.where(self.model.id == rental_id))).one()
+        return 201, write_headers(), json_body(serializer.serialize(row))
+
+
+class Ratings(Collection):
+    model = Rating
+    tables = ('ratings', 'movies', 'users')
+    schema = RATING_SCHEMA
+    references = {'movie_id': Movie, 'user_id': User}
+
+    async def created(self, session, instance):
+        def record(sync_session):
+            MovieRatingStats.record(instance.movie_id, instance.rating, session=sync_session)
+            sync_session.flush()
+            RatingRollup.record_ratings(Rating.id == instance.id, session=sync_session)
+        await session.run_sync(record)
+
+
+class ChangeFeed:
+    """`GET /changes` for every subscriber in the process, fed by one poll of the change log.
+
+    While anyone is subscribed, a single task reads the entries logged since
+    its last poll every `CHANGE_FEED_POLL_INTERVAL` seconds, encodes each once
+    and queues it for every subscriber. An idle subscriber costs a queue and a
+    suspended coroutine, not a connection or a query of its own. A new
+    subscriber replays what it missed from the log before following its
+    queue; one that falls `CHANGE_FEED_QUEUE_SIZE` messages behind is sent
+    what's queued and disconnected, and resumes from the log when its
+    EventSource reconnects.
+    """
+
+    def __init__(self):
+        self.subscribers = set()
+        self.task = None
+
+    async def poll(self):
+        """Feed the subscribers until there are none left.
+
+        A failed poll is logged and retried after the interval, whatever
+        went wrong, and the task always clears itself on the way out so the
+        next subscriber starts a new one.
+        """
+        config = flask_app.config
+        cursor = None
+        try:
+            while self.subscribers:
+                try:
+                    if cursor is None:
+                        async with Session() as session:
+                            cursor, _ = await session.run_sync(lambda sync_session: ChangeLog.resume_point(None, sync_session))
+                    else:
+                        cursor = await self.publish(cursor)
+                except SQLAlchemyError:
+                    logger.exception('polling the change log failed')
+                except Exception:
+                    logger.exception('unexpected error while polling the change log')
+                await asyncio.sleep(config['CHANGE_FEED_POLL_INTERVAL'])
+        finally:
+            self.task = None
+
+    async def publish(self, cursor):
+        """Queue every entry logged after `cursor` for the subscribers; return the new cursor."""
+        config = flask_app.config
+        while True:
+            async with Session() as session:
+                entries = await session.run_sync(
+                    lambda sync_session: ChangeLog.since(cursor, config['CHANGE_FEED_BATCH_SIZE'], session=sync_session)
+                )
+                messages = [(entry.id, entry.table_name, sse_message(entry.to_dict(), id=entry.id).encode()) for entry in entries]
+            for message in messages:
+                for subscriber in list(self.subscribers):
+                    subscriber.push(message)
+                    if subscriber.dropped:
+                        self.subscribers.discard(subscriber)
+            if messages:
+                cursor = messages[-1][0]
+            if len(messages) < config['CHANGE_FEED_BATCH_SIZE']:
+                return cursor
+
+    async def stream(self, scope, receive, send):
+        config = flask_app.config
+        request = Request(scope, b'')
+        try:
+            after, tables = change_args(request.args, {'Last-Event-ID': request.headers.get('last-event-id')})
+        except ValueError as e:
+            return await send_response(send, request.method, 400, [], json_body({'errors': str(e)}))
+
+        subscriber = Subscriber(config['CHANGE_FEED_QUEUE_SIZE'])
+        self.subscribers.add(subscriber)
+        if self.task is None:
+            self.task = asyncio.ensure_future(self.poll())
+        disconnected = asyncio.ensure_future(wait_for_disconnect(receive))
+        try:
+            await send({'type': 'http.response.start', 'status': 200, 'headers': [
+                (b'content-type', b'text/event-stream; charset=utf-8'), (b'cache-control', b'no-cache'), (b'x-accel-buffering', b'no'),
+            ]})
+            async with Session() as session:
+                cursor, opening = await session.run_sync(lambda sync_session: change_feed_opening(after, sync_session))
+            await send({'type': 'http.response.body', 'body': ''.join(opening).encode(), 'more_body': True})
+
+            # Catch up from the log; the queue fills meanwhile, repeating some of it.
+            while True:
+                async with Session() as session:
+                    entries = await session.run_sync(
+                        lambda sync_session: ChangeLog.since(cursor, config['CHANGE_FEED_BATCH_SIZE'], tables, sync_session)
+                    )
+                if entries:
+                    cursor = entries[-1].id
+                    body = ''.join(sse_message(entry.to_dict(), id=entry.id) for entry in entries).encode()
+                    await send({'type': 'http.response.body', 'body': body, 'more_body': True})
+                if len(entries) < config['CHANGE_FEED_BATCH_SIZE']:
+                    break
+
+            while not disconnected.done() and not (subscriber.dropped and subscriber.queue.empty()):
+                message = asyncio.ensure_future(subscriber.queue.get())
+                await asyncio.wait({message, disconnected}, timeout=config['CHANGE_FEED_HEARTBEAT'], return_when=asyncio.FIRST_COMPLETED)
+                if not message.done():
+                    message.cancel()
+                    if not disconnected.done():
+                        await send({'type': 'http.response.body', 'body': b': keep-alive\n\n', 'more_body': True})
+                    continue
+                id, table, body = message.result()
+                if id > cursor and (tables is None or table in tables):
+                    cursor = id
+                    await send({'type': 'http.response.body', 'body': body, 'more_body': True})
+            if not disconnected.done():
+                await send({'type': 'http.response.body', 'body': b''})
+        finally:
+            self.subscribers.discard(subscriber)
+            disconnected.cancel()
+
+
+class Subscriber:
+    """One `/changes` stream's queue of (id, table, encoded message); dropped once it overflows."""
+
+    def __init__(self, size):
+        self.queue = asyncio.Queue(size)
+        self.dropped = False
+
+    def push(self, message):
+        try:
+            self.queue.put_nowait(message)
+        except asyncio.QueueFull:
+            self.dropped = True
+
+
+async def wait_for_disconnect(receive):
+    while (await receive())['type'] != 'http.disconnect':
+        pass
+
+
+COLLECTIONS = {'users': Users(), 'movies': Movies(), 'rentals': Rentals(), 'ratings': Ratings()}
+changes = ChangeFeed()
+ROUTE = re.compile(r'^/(?P<collection>users|movies|rentals|ratings)(?:/(?P<id>\d+))?/?$')
+
+
+def json_body(obj):
+    """`obj` encoded as the Flask resources' `make_response` encodes it, so both serve the same bytes under an ETag.
+
+    That's Flask's JSON provider: keys sorted, compact outside debug mode, and a trailing newline.
+    """
+    return flask_app.json.response(obj).get_data()
+
+
+def stamp_headers(etag, modified):
+    headers = []
+    if etag:
+        headers.append(('ETag', f'"{etag}"'))
+    if modified:
+        headers.append(('Last-Modified', format_datetime(modified, usegmt=True)))
+    return headers
+
+
+def write_headers():
+    """The `last_write` cookie `routing` uses to keep a client's reads on the primary after it writes."""
+    if not routing.replica_keys(flask_app):
+        return []
+    max_age = int(flask_app.config['REPLICA_MAX_STALENESS']) + 1
+    return [('Set-Cookie', f'{routing.LAST_WRITE_COOKIE}={time.time()}; Max-Age={max_age}; HttpOnly; Path=/; SameSite=Lax')]
+
+
+def route(method, path, query_string):
+    """The async handler for `method` on `path`, or None to hand the request to Flask."""
+    match = ROUTE.match(path)
+    if not match:
+        return None
+    collection = COLLECTIONS[match['collection']]
+    if match['id'] is not None:
+        id = int(match['id'])
+        return (lambda request: collection.get(request, id)) if method in ('GET', 'HEAD') else None
+    if method in ('GET', 'HEAD'):
+        args = {name for name, _ in parse_qsl(query_string.decode('latin-1'), keep_blank_values=True)}
+        return None if args & set(collection.flask_args) else collection.list
+    if method == 'POST':
+        return collection.post
+    return None
+
+
+async def read_body(receive):
+    body = bytearray()
+    while True:
+        message = await receive()
+        body += message.get('body', b'')
+        if not message.get('more_body'):
+            return bytes(body)
+
+
+def compress(request, status, headers, body):
+    """(headers, body) of a response compressed for `request` the way the Flask app's `compressor` hook would."""
+    etag = next((value for name, value in headers if name == 'ETag'), None)
+    etag = etag and etag.strip('"')
+    if status == 304:
+        if etag and parse_etags(request.headers.get('if-none-match')).is_weak(etag):
+            headers = [(name, f'W/{value}' if name == 'ETag' else value) for name, value in headers]
+        return headers, body
+    if status != 200:
+        return headers, body
+
+    headers = headers + [('Vary', 'Accept-Encoding')]
+    body, encoding = compressor.compress(body, request.headers.get('accept-encoding', ''), etag)
+    if encoding is not None:
+        headers = [(name, f'W/{value}' if name == 'ETag' else value) for name, value in headers] + [('Content-Encoding', encoding)]
+    return headers, body
+
+
+async def send_response(send, method, status, headers, body):
+    headers = [(name.encode('latin-1'), value.encode('latin-1')) for name, value in headers]
+    if status != 304:
+        headers += [(b'content-type', b'application/json'), (b'content-length', str(len(body)).encode())]
+    await send({'type': 'http.response.start', 'status': status, 'headers': headers})
+    await send({'type': 'http.response.body', 'body': b'' if method == 'HEAD' else body})
+
+
+async def lifespan(receive, send):
+    while True:
+        message = await receive()
+        if message['type'] == 'lifespan.startup':
+            await send({'type': 'lifespan.startup.complete'})
+        elif message['type'] == 'lifespan.shutdown':
+            await engine.dispose()
+            await send({'type': 'lifespan.shutdown.complete'})
+            return
+
+
+flask = WsgiToAsgi(flask_app)
+
+
+async def app(scope, receive, send):
+    if scope['type'] == 'lifespan':
+        return await lifespan(receive, send)
+    if scope['type'] != 'http':
+        return
+
+    if scope['path'].rstrip('/') == '/changes' and scope['method'] == 'GET':
+        return await changes.stream(scope, receive, send)
+    handler = route(scope['method'], scope['path'], scope['query_string'])
+    if handler is None:
+        return await flask(scope, receive, send)
+
+    request = Request(scope, await read_body(receive))
+    try:
+        status, headers, body = await handler(request)
+    except HTTPError as e:
+        status, headers, body = e.status, e.headers, json_body(e.body)
+    headers, body = compress(request, status, headers, body)
+    await send_response(send, request.method, status, headers, body)
@@ -0,0 +1,34 @@
+#!/usr/bin/env python3
+"""Backfill the daily and weekly rating rollups from the ratings already recorded.
+
+    python backfill.py [--batch-size 1000]
+
+Run it once after upgrading to the migration that adds the rollup tables;
+ratings written from then on are recorded as they come. It rebuilds every
+movie's rollups from `ratings`, `--batch-size` movies per transaction, and
+then sums the genres' from them, so it's safe to rerun at any time and the
+API can keep taking writes meanwhile.
+"""
+
+# Standard library imports
+import argparse
+import time
+
+# Local imports
+from app import app
+from models import RatingRollup
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--batch-size', type=int, default=1000, help='movies per transaction')
+    args = parser.parse_args()
+
+    with app.app_context():
+        started = time.perf_counter()
+        written = RatingRollup.rebuild(args.batch_size)
+        print(f'{written:,} rating rollup rows in {time.perf_counter() - started:.1f}s')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,184 @@
+#!/usr/bin/env python3
+"""Compare gunicorn sync workers (app.py) with uvicorn (asgi.py) under many concurrent connections.
+
+Run from the server directory:
+
+    python -m benchmarks.asgi_vs_wsgi [--connections 1000] [--seconds 10] [--workers 4]
+
+Both servers run as subprocesses against the same freshly populated SQLite
+database. An asyncio client holds `--connections` keep-alive connections open
+at once, each issuing a read mix (pages, details and nested pages) with one
+write in every `--write-every` requests, and reports throughput, latency
+percentiles and failures per server.
+"""
+
+# Standard library imports
+import argparse
+import asyncio
+import json
+import os
+import random
+import resource
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+
+HOST = '127.0.0.1'
+
+
+def percentile(values, fraction):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * fraction))] if values else 0.0
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind((HOST, 0))
+        return sock.getsockname()[1]
+
+
+def populate_database(args, env):
+    code = (
+        'from app import app\n'
+        'from benchmarks.common import populate\n'
+        'with app.app_context():\n'
+        f'    populate(users={args.users}, movies={args.movies}, ratings={args.ratings})\n'
+    )
+    subprocess.run([sys.executable, '-c', code], env=env, check=True)
+
+
+def server_command(name, port, args):
+    if name == 'wsgi':
+        return [sys.executable, '-m', 'gunicorn', 'app:app', '--bind', f'{HOST}:{port}',
+                '--workers', str(args.workers), '--backlog', str(args.connections * 2), '--log-level', 'warning']
+    return [sys.executable, '-m', 'uvicorn', 'asgi:app', '--host', HOST, '--port', str(port),
+            '--workers', '1', '--backlog', str(args.connections * 2), '--log-level', 'warning', '--no-access-log']
+
+
+async def wait_until_up(port, timeout=30):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            _, writer = await asyncio.open_connection(HOST, port)
+            writer.close()
+            return
+        except OSError:
+            await asyncio.sleep(0.2)
+    raise RuntimeError(f'Server on port {port} did not start')
+
+
+async def request(reader, writer, method, path, body=None):
+    """Send one HTTP/1.1 request on an open connection; return (status, keep_alive)."""
+    payload = json.dumps(body).encode() if body is not None else b''
+    head = f'{method} {path} HTTP/1.1\r\nHost: {HOST}\r\nContent-Length: {len(payload)}\r\n'
+    if body is not None:
+        head += 'Content-Type: application/json\r\n'
+    writer.write(head.encode() + b'\r\n' + payload)
+    await writer.drain()
+
+    status = int((await reader.readline()).split()[1])
+    length, keep_alive = 0, True
+    while (line := await reader.readline()) not in (b'\r\n', b''):
+        name, _, value = line.decode('latin-1').partition(':')
+        name, value = name.strip().lower(), value.strip().lower()
+        if name == 'content-length':
+            length = int(value)
+        elif name == 'connection' and value == 'close':
+            keep_alive = False
+    await reader.readexactly(length)
+    return status, keep_alive
+
+
+async def client(port, seed, args, stop, latencies, failures):
+    rng = random.Random(seed)
+    connection = None
+    count = 0
+    while not stop.is_set():
+        count += 1
+        if count % args.write_every == 0:
+            method, path = 'POST', '/ratings'
+            body = {'user_id': rng.randint(1, args.users), 'movie_id': rng.randint(1, args.movies),
+                    'rating': rng.randint(1, 10), 'review': 'Load test review.'}
+        else:
+            method, body = 'GET', None
+            path = rng.choice([
+                f'/ratings?limit=50&after={rng.randint(0, args.ratings)}',
+                f'/movies/{rng.randint(1, args.movies)}',
+                f'/users/{rng.randint(1, args.users)}',
+                f'/rentals?user_id={rng.randint(1, args.users)}',
+            ])
+        started = time.perf_counter()
+        try:
+            if connection is None:
+                connection = await asyncio.open_connection(HOST, port)
+            status, keep_alive = await asyncio.wait_for(request(*connection, method, path, body), args.timeout)
+        except (OSError, asyncio.TimeoutError, asyncio.IncompleteReadError, ValueError, IndexError):
+            failures.append(path)
+            if connection:
+                connection[1].close()
+            connection = None
+            continue
+        latencies.append(time.perf_counter() - started)
+        if status >= 500:
+            failures.append(path)
+        if not keep_alive:
+            connection[1].close()
+            connection = None
+    if connection:
+        connection[1].close()
+
+
+async def load(port, args):
+    await wait_until_up(port)
+    stop = asyncio.Event()
+    latencies, failures = [], []
+    tasks = [asyncio.create_task(client(port, seed, args, stop, latencies, failures)) for seed in range(args.connections)]
+    await asyncio.sleep(args.seconds)
+    stop.set()
+    await asyncio.wait(tasks, timeout=args.timeout + 5)
+    for task in tasks:
+        task.cancel()
+    return {
+        'requests_per_second': len(latencies) / args.seconds,
+        'p50_ms': percentile(latencies, 0.50) * 1000,
+        'p99_ms': percentile(latencies, 0.99) * 1000,
+        'failures': len(failures),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--connections', type=int, default=1000)
+    parser.add_argument('--seconds', type=float, default=10)
+    parser.add_argument('--workers', type=int, default=4, help='gunicorn sync workers')
+    parser.add_argument('--write-every', type=int, default=20)
+    parser.add_argument('--timeout', type=float, default=30, help='per-request client timeout in seconds')
+    parser.add_argument('--users', type=int, default=2000)
+    parser.add_argument('--movies', type=int, default=2000)
+    parser.add_argument('--ratings', type=int, default=50000)
+    args = parser.parse_args()
+
+    soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+    resource.setrlimit(resource.RLIMIT_NOFILE, (hard, hard))
+
+    directory = tempfile.mkdtemp()
+    env = {**os.environ, 'DATABASE_URL': f"sqlite:///{os.path.join(directory, 'asgi.db')}", 'CACHE_BACKEND': 'none'}
+    populate_database(args, env)
+
+    print(f'{args.connections} connections, {args.seconds:g}s per server, gunicorn with {args.workers} sync workers')
+    for name in ('wsgi', 'asgi'):
+        port = free_port()
+        server = subprocess.Popen(server_command(name, port, args), env=env)
+        try:
+            result = asyncio.run(load(port, args))
+        finally:
+            server.terminate()
+            server.wait()
+        print(f"{name}  req/s {result['requests_per_second']:8.1f}  p50 {result['p50_ms']:8.1f} ms  "
+              f"p99 {result['p99_ms']:8.1f} ms  failures {result['failures']}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,158 @@
+#!/usr/bin/env python3
+"""Hold thousands of idle `/changes` subscribers on one uvicorn process and time the fan-out of writes to them.
+
+Run from the server directory:
+
+    python -m benchmarks.change_feed [--subscribers 2000] [--writes 20] [--idle 10]
+
+The ASGI app runs as a subprocess against a freshly populated SQLite
+database. `--subscribers` event streams are opened and left idle for
+`--idle` seconds while the server's memory and CPU time are sampled (Linux
+only); then `--writes` users are created one after another, and the report
+gives how long each change took to reach every subscriber and whether any
+subscriber missed one.
+"""
+
+# Standard library imports
+import argparse
+import asyncio
+import json
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+
+from benchmarks.asgi_vs_wsgi import HOST, percentile, free_port, populate_database, request, wait_until_up
+
+
+def process_stats(pid):
+    """(resident MiB, CPU seconds) of process `pid`, or (None, None) off Linux."""
+    try:
+        with open(f'/proc/{pid}/status') as file:
+            rss = next(int(line.split()[1]) / 1024 for line in file if line.startswith('VmRSS:'))
+        with open(f'/proc/{pid}/stat') as file:
+            fields = file.read().rsplit(')', 1)[1].split()
+        return rss, (int(fields[11]) + int(fields[12])) / os.sysconf('SC_CLK_TCK')
+    except OSError:
+        return None, None
+
+
+async def subscribe(port, received, ready):
+    """Open one event stream and record when each user insert arrives, by user id."""
+    reader, writer = await asyncio.open_connection(HOST, port)
+    writer.write(f'GET /changes?tables=users HTTP/1.1\r\nHost: {HOST}\r\nAccept: text/event-stream\r\n\r\n'.encode())
+    await writer.drain()
+    while (await reader.readline()) not in (b'\r\n', b''):
+        pass
+    try:
+        while True:
+            line = await reader.readline()
+            if not line:
+                return
+            if line.startswith(b'event: ready'):
+                ready.release()
+            elif line.startswith(b'data: {"id"'):
+                change = json.loads(line[6:])
+                received.setdefault(change['row']['id'], []).append(time.perf_counter())
+    finally:
+        writer.close()
+
+
+async def run(port, server, args):
+    await wait_until_up(port)
+    ready = asyncio.Semaphore(0)
+    received = {}
+    baseline_rss, _ = process_stats(server.pid)
+    tasks = [asyncio.create_task(subscribe(port, received, ready)) for _ in range(args.subscribers)]
+    started = time.perf_counter()
+    for _ in range(args.subscribers):
+        await ready.acquire()
+    connect_seconds = time.perf_counter() - started
+
+    _, cpu_before = process_stats(server.pid)
+    await asyncio.sleep(args.idle)
+    rss, cpu_after = process_stats(server.pid)
+
+    connection = await asyncio.open_connection(HOST, port)
+    sent = []
+    for i in range(args.writes):
+        before = time.perf_counter()
+        body = {'name': 'Feed Bench', 'email': f'feed{i}.{time.time_ns()}@example.com'}
+        reader, writer = connection
+        status, _ = await request(reader, writer, 'POST', '/users', body)
+        if status != 201:
+            raise RuntimeError(f'POST /users answered {status}')
+        sent.append(before)
+        await asyncio.sleep(args.interval)
+    connection[1].close()
+    await asyncio.sleep(args.settle)
+
+    for task in tasks:
+        task.cancel()
+    await asyncio.gather(*tasks, return_exceptions=True)
+
+    # Users are created one at a time, so the n-th new id belongs to the n-th write.
+    arrivals = sorted(received.items())
+    delays, missed = [], 0
+    for (_, times), started in zip(arrivals, sent):
+        missed += args.subscribers - len(times)
+        delays.append(max(times) - started)
+    missed += (args.writes - len(arrivals)) * args.subscribers
+    return {
+        'connect_seconds': connect_seconds,
+        'rss_mib': rss,
+        'rss_per_subscriber_kib': (rss - baseline_rss) * 1024 / args.subscribers if rss and baseline_rss else None,
+        'idle_cpu_percent': (cpu_after - cpu_before) / args.idle * 100 if cpu_after is not None else None,
+        'fanout_p50_ms': percentile(delays, 0.50) * 1000,
+        'fanout_max_ms': max(delays, default=0.0) * 1000,
+        'missed': missed,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--subscribers', type=int, default=2000)
+    parser.add_argument('--writes', type=int, default=20)
+    parser.add_argument('--idle', type=float, default=10, help='seconds to hold the subscribers idle while sampling CPU')
+    parser.add_argument('--interval', type=float, default=0.5, help='seconds between writes')
+    parser.add_argument('--settle', type=float, default=3, help='seconds to wait for the last change to arrive')
+    parser.add_argument('--users', type=int, default=1000)
+    parser.add_argument('--movies', type=int, default=1000)
+    parser.add_argument('--ratings', type=int, default=0)
+    args = parser.parse_args()
+
+    soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+    resource.setrlimit(resource.RLIMIT_NOFILE, (hard, hard))
+
+    directory = tempfile.mkdtemp()
+    env = {**os.environ, 'DATABASE_URL': f"sqlite:///{os.path.join(directory, 'feed.db')}", 'CACHE_BACKEND': 'none'}
+    populate_database(args, env)
+
+    port = free_port()
+    server = subprocess.Popen(
+        [sys.executable, '-m', 'uvicorn', 'asgi:app', '--host', HOST, '--port', str(port), '--workers', '1',
+         '--backlog', str(args.subscribers * 2), '--log-level', 'warning', '--no-access-log'],
+        env=env,
+    )
+    try:
+        result = asyncio.run(run(port, server, args))
+    finally:
+        server.terminate()
+        server.wait()
+
+    def show(value, format):
+        return 'n/a' if value is None else format.format(value)
+
+    print(f"{args.subscribers} subscribers connected in {result['connect_seconds']:.1f}s; "
+          f"server RSS {show(result['rss_mib'], '{:.0f}')} MiB ({show(result['rss_per_subscriber_kib'], '{:.1f}')} KiB each), "
+          f"idle CPU {show(result['idle_cpu_percent'], '{:.1f}')}%")
+    print(f"{args.writes} changes fanned out: p50 {result['fanout_p50_ms']:.0f} ms, max {result['fanout_max_ms']:.0f} ms "
+          f"to reach every subscriber; {result['missed']} deliveries missed")
+    if result['missed']:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,133 @@
+#!/usr/bin/env python3
+"""Fire hundreds of concurrent checkouts at a few scarce movies and check none is oversold.
+
+Run from the server directory:
+
+    python -m benchmarks.checkout_stress [--processes 4] [--threads 50] [--movies 5] [--copies 20] [--attempts 2000]
+
+Every movie gets `--copies` copies and no rentals, then `--processes` x
+`--threads` clients (separate processes, so separate SQLite connections and
+locks, each with its own threads) race to check out random movies until
+`--attempts` requests have been made. Demand is set well above supply, so
+the run passes only if every copy was checked out exactly once: each
+movie's rentals equal its copies, and the 201s match the rentals written.
+A 503 means the write lock wasn't free in time and nothing was written, so
+it counts against neither. Exits with status 1 otherwise.
+"""
+
+# Standard library imports
+import argparse
+import multiprocessing
+import os
+import random
+import sys
+import tempfile
+import threading
+import time
+from datetime import datetime, timedelta
+
+DATABASE = os.path.join(tempfile.mkdtemp(), 'checkout.db')
+os.environ['DATABASE_URL'] = f'sqlite:///{DATABASE}'
+os.environ['CACHE_BACKEND'] = 'none'
+
+
+def percentile(values, fraction):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * fraction))] if values else 0.0
+
+
+def client_process(seed, args, start, results):
+    from app import app
+    from models import db
+
+    with app.app_context():
+        # Connections forked from the parent's pool mustn't be shared with it.
+        db.engine.dispose(close=False)
+
+    due = (datetime.now() + timedelta(days=7)).isoformat()
+    latencies, statuses = [], {}
+    lock = threading.Lock()
+
+    def client(thread_seed):
+        rng = random.Random(thread_seed)
+        test_client = app.test_client()
+        start.wait()
+        for _ in range(args.attempts // (args.processes * args.threads)):
+            body = {'user_id': rng.randint(1, args.users), 'movie_id': rng.randint(1, args.movies), 'due_date': due}
+            started = time.perf_counter()
+            status = test_client.post('/rentals', json=body).status_code
+            elapsed = time.perf_counter() - started
+            with lock:
+                latencies.append(elapsed)
+                statuses[status] = statuses.get(status, 0) + 1
+
+    threads = [threading.Thread(target=client, args=(seed * 1000 + i,)) for i in range(args.threads)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    results.put((latencies, statuses))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--processes', type=int, default=4)
+    parser.add_argument('--threads', type=int, default=50)
+    parser.add_argument('--movies', type=int, default=5)
+    parser.add_argument('--copies', type=int, default=20)
+    parser.add_argument('--users', type=int, default=100)
+    parser.add_argument('--attempts', type=int, default=2000, help='checkout requests in total')
+    args = parser.parse_args()
+
+    from app import app
+    from models import db, Rental, MovieInventory
+    from benchmarks.common import populate
+
+    with app.app_context():
+        populate(users=args.users, movies=args.movies, rentals=0, ratings=0)
+        db.session.execute(db.insert(MovieInventory), [{'movie_id': id, 'copies': args.copies} for id in range(1, args.movies + 1)])
+        db.session.commit()
+
+    context = multiprocessing.get_context('fork' if 'fork' in multiprocessing.get_all_start_methods() else 'spawn')
+    start, results = context.Event(), context.Queue()
+    processes = [context.Process(target=client_process, args=(i, args, start, results)) for i in range(args.processes)]
+    for process in processes:
+        process.start()
+    time.sleep(1)
+    started = time.perf_counter()
+    start.set()
+    latencies, statuses = [], {}
+    for _ in processes:
+        process_latencies, process_statuses = results.get()
+        latencies += process_latencies
+        for status, count in process_statuses.items():
+            statuses[status] = statuses.get(status, 0) + count
+    elapsed = time.perf_counter() - started
+    for process in processes:
+        process.join()
+
+    with app.app_context():
+        rented = dict(db.session.execute(db.select(Rental.movie_id, db.func.count()).group_by(Rental.movie_id)).all())
+
+    print(f'{len(latencies)} checkouts from {args.processes * args.threads} concurrent clients in {elapsed:.1f}s '
+          f'({len(latencies) / elapsed:.0f}/s)  p50 {percentile(latencies, 0.50) * 1000:.1f} ms  '
+          f'p95 {percentile(latencies, 0.95) * 1000:.1f} ms  p99 {percentile(latencies, 0.99) * 1000:.1f} ms')
+    print(f'statuses {dict(sorted(statuses.items()))}')
+    print(f'rentals per movie {dict(sorted(rented.items()))} (copies {args.copies} each)')
+
+    oversold = {movie_id: count for movie_id, count in rented.items() if count > args.copies}
+    failures = []
+    if oversold:
+        failures.append(f'oversold movies: {oversold}')
+    if statuses.get(201, 0) != sum(rented.values()):
+        failures.append(f"{statuses.get(201, 0)} checkouts succeeded but {sum(rented.values())} rentals were written")
+    if len(latencies) >= 2 * args.movies * args.copies and sum(rented.values()) != args.movies * args.copies:
+        failures.append('demand exceeded supply but not every copy was checked out')
+    if failures:
+        print('FAIL: ' + '; '.join(failures))
+        sys.exit(1)
+    print('OK: no movie was oversold')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,9 @@
+# Local imports
+from models import db
+import seed as seeder
+
+
+def populate(users=1000, movies=5000, rentals=5000, ratings=20000, seed=0):
+    """Fill an empty database with the seeder's deterministic rows."""
+    db.create_all()
+    seeder.populate(users=users, movies=movies, rentals=rentals, ratings=ratings, seed=seed)
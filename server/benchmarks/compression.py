@@ -0,0 +1,115 @@
+#!/usr/bin/env python3
+"""Measure the bytes and CPU that compact JSON and negotiated compression save on each GET endpoint.
+
+Run from the server directory:
+
+    python -m benchmarks.compression [--scale small|medium] [--requests 50]
+
+Every read case of `benchmarks.endpoints` sends the same `--requests` seeded
+requests pretty-printed (as `app.json.compact = False` had every response built
+from a dict), compact, and then once more per coding the compressor offers (brotli only with the `brotli`
+package installed). The mean body size of each is printed, and for each coding
+the CPU spent compressing per request: when every response is compressed
+afresh, and when the same requests come again and responses with a strong
+ETag are served from the compressor's store.
+"""
+
+# Standard library imports
+import argparse
+import os
+import random
+import tempfile
+import time
+
+DATABASE = os.path.join(tempfile.mkdtemp(), 'compression.db')
+os.environ['DATABASE_URL'] = f'sqlite:///{DATABASE}'
+# Off, or the pretty-printed bodies it stored would be served to the compact pass.
+os.environ['CACHE_BACKEND'] = 'none'
+
+# Local imports
+from app import app
+from config import compressor
+from models import db, Movie
+from benchmarks.common import populate
+from benchmarks.endpoints import SCALES, cases
+
+SCALE_CHOICES = ('small', 'medium')
+
+
+class EncodeTimer:
+    """Wraps `compressor.encode`, adding up the CPU time it takes."""
+
+    def __init__(self, encode):
+        self.encode = encode
+        self.spent = 0.0
+
+    def __call__(self, body, encoding):
+        started = time.process_time()
+        try:
+            return self.encode(body, encoding)
+        finally:
+            self.spent += time.process_time() - started
+
+
+def mean_size(client, paths, encoding):
+    return sum(len(client.get(path, headers={'Accept-Encoding': encoding}).data) for path in paths) / len(paths)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--scale', choices=SCALE_CHOICES, default='small')
+    parser.add_argument('--requests', type=int, default=50, help='requests per endpoint and encoding')
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    sizes = SCALES[args.scale]
+    with app.app_context():
+        populate(**sizes, seed=args.seed)
+        titles = db.session.scalars(db.select(Movie.title).where(Movie.id <= 1000)).all() or ['Movie']
+        db.session.remove()
+
+    client = app.test_client()
+    timer = compressor.encode = EncodeTimer(compressor.encode)
+    print(f'{args.scale} scale, {args.requests} requests per endpoint; codings {", ".join(compressor.encodings)}; '
+          f'bodies under {compressor.min_size} bytes go uncompressed')
+    header = f'{"endpoint":<32} {"pretty":>8} {"compact":>8}'
+    for encoding in compressor.encodings:
+        header += f' {encoding:>8} {"saved":>6} {"cpu/req":>9} {"repeat":>9}'
+    print(header)
+
+    totals = {'pretty': 0.0, 'compact': 0.0, **{encoding: [0.0, 0.0, 0.0] for encoding in compressor.encodings}}
+    for name, build, runs in cases(sizes, titles):
+        if not name.startswith('GET ') or runs is not None:
+            continue
+        rng = random.Random(f'{args.seed}:{name}')
+        paths = [build(rng)[0] for _ in range(args.requests)]
+
+        app.json.compact = False
+        pretty = mean_size(client, paths, 'identity')
+        app.json.compact = None
+        compact = mean_size(client, paths, 'identity')
+        totals['pretty'] += pretty
+        totals['compact'] += compact
+        line = f'{name:<32} {pretty:>8.0f} {compact:>8.0f}'
+
+        for encoding in compressor.encodings:
+            timer.spent = 0.0
+            compressed = mean_size(client, paths, encoding)
+            fresh = timer.spent / len(paths)
+            timer.spent = 0.0
+            mean_size(client, paths, encoding)
+            repeat = timer.spent / len(paths)
+            for index, value in enumerate((compressed, fresh, repeat)):
+                totals[encoding][index] += value
+            line += f' {compressed:>8.0f} {1 - compressed / pretty:>6.0%} {fresh * 1e6:>7.0f}us {repeat * 1e6:>7.0f}us'
+        print(line)
+
+    line = f'{"total per request of each":<32} {totals["pretty"]:>8.0f} {totals["compact"]:>8.0f}'
+    for encoding in compressor.encodings:
+        compressed, fresh, repeat = totals[encoding]
+        line += f' {compressed:>8.0f} {1 - compressed / totals["pretty"]:>6.0%} {fresh * 1e6:>7.0f}us {repeat * 1e6:>7.0f}us'
+    print(line)
+
+
+if __name__ == '__main__':
+    main()
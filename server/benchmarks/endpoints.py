@@ -0,0 +1,246 @@
+#!/usr/bin/env python3
+"""Drive every endpoint through the Flask test client at a chosen data scale and write a JSON report.
+
+Run from the server directory:
+
+    python -m benchmarks.endpoints [--scale small|medium|large] [--requests 200] [--output report.json]
+    python -m benchmarks.endpoints --database /tmp/large.db --scale large   # seed once, reuse after
+    python -m benchmarks.endpoints --baseline before.json --output after.json
+
+The database is seeded by `seed.populate` (bulk inserts, fixed seed), and
+each case's requests come from its own seeded generator, so two runs at the
+same scale send identical requests against identical data. Reads run before
+writes so they all see the seeded rows. For each case the report records
+throughput, latency percentiles, SQL statements per request, response size
+and status codes; with `--baseline` the p50, p95 and throughput are printed
+side by side with an earlier report's.
+"""
+
+# Standard library imports
+import argparse
+import json
+import os
+import platform
+import random
+import re
+import sqlite3
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+SCALES = {
+    'small': {'users': 1000, 'movies': 1000, 'rentals': 5000, 'ratings': 20000},
+    'medium': {'users': 100000, 'movies': 10000, 'rentals': 50000, 'ratings': 1000000},
+    'large': {'users': 1000000, 'movies': 100000, 'rentals': 500000, 'ratings': 10000000},
+}
+WARMUP = 5
+BULK_ITEMS = 100
+
+
+def percentile(values, fraction):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * fraction))] if values else 0.0
+
+
+def cases(sizes, titles):
+    """(name, request builder, timed runs) for every endpoint, the method being the name's first word.
+
+    A request builder takes a seeded Random and returns (path, JSON body or
+    None). Runs of None mean `--requests`; exports stream whole tables, so
+    they run once each.
+    """
+    users, movies, rentals, ratings = (sizes[key] for key in ('users', 'movies', 'rentals', 'ratings'))
+    due = (datetime.now() + timedelta(days=14)).isoformat()
+
+    def prefix(rng):
+        title = rng.choice(titles)
+        return title[:rng.randint(2, len(title))]
+
+    def rating(rng):
+        return {'user_id': rng.randint(1, users), 'movie_id': rng.randint(1, movies), 'rating': rng.randint(1, 10), 'review': 'Benchmark review.'}
+
+    reads = [
+        ('GET /users', lambda rng: (f'/users?after={rng.randint(0, users)}', None)),
+        ('GET /users?include=summary', lambda rng: (f'/users?include=summary&after={rng.randint(0, users)}', None)),
+        ('GET /users/<id>', lambda rng: (f'/users/{rng.randint(1, users)}', None)),
+        ('GET /users/<id>/summary', lambda rng: (f'/users/{rng.randint(1, users)}/summary', None)),
+        ('GET /users/<id>/rentals', lambda rng: (f'/users/{rng.randint(1, users)}/rentals', None)),
+        ('GET /users/<id>/ratings', lambda rng: (f'/users/{rng.randint(1, users)}/ratings', None)),
+        ('GET /users/<id>/recommendations', lambda rng: (f'/users/{rng.randint(1, users)}/recommendations', None)),
+        ('GET /movies', lambda rng: (f'/movies?after={rng.randint(0, movies)}', None)),
+        ('GET /movies/<id>', lambda rng: (f'/movies/{rng.randint(1, movies)}', None)),
+        ('GET /movies/top', lambda rng: (f"/movies/top?genre={rng.choice(['Drama', 'Action', 'Thriller', 'Comedy', 'Sci-Fi'])}", None)),
+        ('GET /movies/search', lambda rng: (f'/movies/search?q={prefix(rng)}&limit=10', None)),
+        ('GET /movies/<id>/rentals', lambda rng: (f'/movies/{rng.randint(1, movies)}/rentals', None)),
+        ('GET /movies/<id>/ratings', lambda rng: (f'/movies/{rng.randint(1, movies)}/ratings', None)),
+        ('GET /movies/<id>/similar', lambda rng: (f'/movies/{rng.randint(1, movies)}/similar', None)),
+        ('GET /movies/<id>/ratings/timeseries', lambda rng: (f"/movies/{rng.randint(1, movies)}/ratings/timeseries?period={rng.choice(['day', 'week'])}", None)),
+        ('GET /genres/<genre>/stats', lambda rng: (f"/genres/{rng.choice(['Drama', 'Action', 'Thriller', 'Comedy', 'Sci-Fi'])}/stats?period=week", None)),
+        ('GET /rentals', lambda rng: (f'/rentals?after={rng.randint(0, rentals)}', None)),
+        ('GET /rentals?overdue=true', lambda rng: ('/rentals?overdue=true', None)),
+        ('GET /rentals/<id>', lambda rng: (f'/rentals/{rng.randint(1, rentals)}', None)),
+        ('GET /ratings', lambda rng: (f'/ratings?after={rng.randint(0, ratings)}', None)),
+        ('GET /ratings/<id>', lambda rng: (f'/ratings/{rng.randint(1, ratings)}', None)),
+        ('GET /cache/stats', lambda rng: ('/cache/stats', None)),
+        ('GET /metrics', lambda rng: ('/metrics', None)),
+    ]
+    exports = [(f'GET /export/{table}', lambda rng, table=table: (f'/export/{table}', None)) for table in ('users', 'movies', 'rentals', 'ratings')]
+    writes = [
+        ('POST /users', lambda rng: ('/users', {'name': 'Bench User', 'email': f'bench{rng.getrandbits(48)}@example.com'})),
+        ('POST /movies', lambda rng: ('/movies', {'title': 'Bench Movie', 'genre': 'Drama', 'release_year': 2000, 'image': 'https://example.com/b.jpg'})),
+        ('POST /rentals', lambda rng: ('/rentals', {'user_id': rng.randint(1, users), 'movie_id': rng.randint(1, movies), 'due_date': due})),
+        ('POST /ratings', lambda rng: ('/ratings', rating(rng))),
+        ('POST /ratings/bulk', lambda rng: ('/ratings/bulk', [rating(rng) for _ in range(BULK_ITEMS)])),
+        ('POST /rentals/bulk', lambda rng: ('/rentals/bulk', [
+            {'user_id': rng.randint(1, users), 'movie_id': rng.randint(1, movies), 'due_date': due} for _ in range(BULK_ITEMS)
+        ])),
+    ]
+    return [(name, build, None) for name, build in reads] + [(name, build, 1) for name, build in exports] + [(name, build, None) for name, build in writes]
+
+
+def run_case(client, observed, name, build, count, seed):
+    rng = random.Random(f'{seed}:{name}')
+    method = name.split()[0]
+    latencies, statuses, sizes, queries = [], {}, [], []
+    warmup = min(WARMUP, count)
+    for i in range(warmup + count):
+        path, body = build(rng)
+        del observed[:]
+        started = time.perf_counter()
+        response = client.open(path, method=method, json=body)
+        data = response.get_data()
+        elapsed = time.perf_counter() - started
+        if i < warmup:
+            continue
+        latencies.append(elapsed)
+        statuses[str(response.status_code)] = statuses.get(str(response.status_code), 0) + 1
+        sizes.append(len(data))
+        queries.extend(observed)
+    total = sum(latencies)
+    return {
+        'method': method,
+        'requests': len(latencies),
+        'errors': sum(count for status, count in statuses.items() if status.startswith('5')),
+        'status': statuses,
+        'throughput_rps': len(latencies) / total if total else 0.0,
+        'latency_ms': {
+            'mean': total / len(latencies) * 1000 if latencies else 0.0,
+            'p50': percentile(latencies, 0.50) * 1000,
+            'p95': percentile(latencies, 0.95) * 1000,
+            'p99': percentile(latencies, 0.99) * 1000,
+            'max': max(latencies, default=0.0) * 1000,
+        },
+        'queries_mean': sum(queries) / len(queries) if queries else 0.0,
+        'bytes_mean': sum(sizes) / len(sizes) if sizes else 0.0,
+    }
+
+
+def git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', 'HEAD'], capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(report, baseline):
+    print(f"\n{'endpoint':<30} {'p50 ms':>17} {'p95 ms':>17} {'req/s':>19}")
+    for name, result in report['endpoints'].items():
+        before = baseline['endpoints'].get(name)
+        if before is None:
+            continue
+        cells = []
+        for old, new in (
+            (before['latency_ms']['p50'], result['latency_ms']['p50']),
+            (before['latency_ms']['p95'], result['latency_ms']['p95']),
+            (before['throughput_rps'], result['throughput_rps']),
+        ):
+            change = f'{(new - old) / old:+.0%}' if old else 'n/a'
+            cells.append(f'{old:7.1f} → {new:7.1f} {change:>5}')
+        print(f'{name:<30} ' + '  '.join(cells))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--scale', choices=SCALES, default='small')
+    parser.add_argument('--users', type=int)
+    parser.add_argument('--movies', type=int)
+    parser.add_argument('--rentals', type=int)
+    parser.add_argument('--ratings', type=int)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--requests', type=int, default=200, help='timed requests per endpoint')
+    parser.add_argument('--only', help='regex; run only the endpoints whose name matches')
+    parser.add_argument('--database', help='SQLite file to use; seeded if it does not exist yet, reused as is otherwise')
+    parser.add_argument('--cache', action='store_true', help='keep the configured response cache (off by default)')
+    parser.add_argument('--output', default='benchmark-report.json')
+    parser.add_argument('--baseline', help='an earlier report to compare against')
+    args = parser.parse_args()
+
+    sizes = {key: getattr(args, key) if getattr(args, key) is not None else value for key, value in SCALES[args.scale].items()}
+    database = args.database or os.path.join(tempfile.mkdtemp(), 'endpoints.db')
+    seeded = os.path.exists(database)
+    os.environ['DATABASE_URL'] = f'sqlite:///{os.path.abspath(database)}'
+    if not args.cache:
+        os.environ['CACHE_BACKEND'] = 'none'
+
+    from app import app
+    from flask import g
+    from models import db, User, Movie, Rental, Rating
+    import seed
+
+    seed_seconds = None
+    with app.app_context():
+        if not seeded:
+            print(f'seeding {sizes}')
+            started = time.perf_counter()
+            db.create_all()
+            seed.populate(**sizes, seed=args.seed)
+            seed_seconds = time.perf_counter() - started
+        # The ids the cases draw from must exist, so a reused database sets the sizes.
+        sizes = {key: db.session.scalar(db.select(db.func.max(model.id))) or 0
+                 for key, model in (('users', User), ('movies', Movie), ('rentals', Rental), ('ratings', Rating))}
+        titles = db.session.scalars(db.select(Movie.title).where(Movie.id <= 1000)).all() or ['Movie']
+
+    observed = []
+
+    @app.after_request
+    def observe_queries(response):
+        observed.append(g.get('query_count', 0))
+        return response
+
+    client = app.test_client()
+    pattern = re.compile(args.only) if args.only else None
+    results = {}
+    for name, build, runs in cases(sizes, titles):
+        if pattern and not pattern.search(name):
+            continue
+        results[name] = result = run_case(client, observed, name, build, runs or args.requests, args.seed)
+        print(f"{name:<30} {result['throughput_rps']:9.1f} req/s  p50 {result['latency_ms']['p50']:8.2f} ms  "
+              f"p95 {result['latency_ms']['p95']:8.2f} ms  {result['queries_mean']:4.1f} queries  "
+              f"{result['bytes_mean']:9.0f} B  {result['status']}")
+
+    report = {
+        'generated_at': datetime.now().isoformat(timespec='seconds'),
+        'git_commit': git_commit(),
+        'environment': {
+            'python': platform.python_version(),
+            'sqlite': sqlite3.sqlite_version,
+            'platform': platform.platform(),
+            'cpus': os.cpu_count(),
+        },
+        'dataset': {**sizes, 'seed': args.seed, 'seed_seconds': seed_seconds},
+        'settings': {'requests': args.requests, 'warmup': WARMUP, 'cache': args.cache, 'argv': sys.argv[1:]},
+        'endpoints': results,
+    }
+    with open(args.output, 'w') as file:
+        json.dump(report, file, indent=2)
+    print(f'report written to {args.output}')
+
+    if args.baseline:
+        with open(args.baseline) as file:
+            compare(report, json.load(file))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,139 @@
+#!/usr/bin/env python3
+"""Measure read throughput under concurrent writes, with SQLite defaults and with the tuned pragmas.
+
+Run from the server directory:
+
+    python -m benchmarks.mixed_load [--seconds 10] [--readers 8] [--writers 2]
+
+Each profile runs in its own process against a fresh database, since the
+pragmas are applied as the engine opens connections.
+"""
+
+# Standard library imports
+import argparse
+import json
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+PROFILES = {
+    # What SQLite and pysqlite do out of the box.
+    'defaults': {
+        'SQLITE_JOURNAL_MODE': 'DELETE',
+        'SQLITE_SYNCHRONOUS': 'FULL',
+        'SQLITE_BUSY_TIMEOUT_MS': '5000',
+        'SQLITE_MMAP_SIZE': '0',
+        'SQLITE_CACHE_SIZE': '-2000',
+    },
+    # Whatever config.py applies when nothing is overridden.
+    'tuned': {},
+}
+
+
+def percentile(values, fraction):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * fraction))] if values else 0.0
+
+
+def run_profile(args):
+    from app import app
+    from models import db
+    from benchmarks.common import populate
+
+    with app.app_context():
+        populate(users=args.users, movies=args.movies, ratings=args.ratings)
+        journal_mode = db.session.execute(db.text('PRAGMA journal_mode')).scalar()
+
+    stop = threading.Event()
+    reads, writes, errors = [], [], []
+
+    def reader(seed):
+        rng = random.Random(seed)
+        client = app.test_client()
+        while not stop.is_set():
+            path = rng.choice([
+                f'/ratings?limit=50&after={rng.randint(0, args.ratings)}',
+                f'/users/{rng.randint(1, args.users)}/rentals',
+                f'/movies/{rng.randint(1, args.movies)}/ratings',
+            ])
+            started = time.perf_counter()
+            response = client.get(path)
+            reads.append(time.perf_counter() - started)
+            if response.status_code >= 500:
+                errors.append(path)
+
+    def writer(seed):
+        rng = random.Random(seed)
+        client = app.test_client()
+        while not stop.is_set():
+            started = time.perf_counter()
+            response = client.post('/ratings', json={
+                'user_id': rng.randint(1, args.users),
+                'movie_id': rng.randint(1, args.movies),
+                'rating': rng.randint(1, 10),
+                'review': 'Load test review.',
+            })
+            writes.append(time.perf_counter() - started)
+            if response.status_code >= 500:
+                errors.append('POST /ratings')
+
+    threads = [threading.Thread(target=reader, args=(i,)) for i in range(args.readers)]
+    threads += [threading.Thread(target=writer, args=(1000 + i,)) for i in range(args.writers)]
+    for thread in threads:
+        thread.start()
+    time.sleep(args.seconds)
+    stop.set()
+    for thread in threads:
+        thread.join()
+
+    print(json.dumps({
+        'journal_mode': journal_mode,
+        'reads_per_second': len(reads) / args.seconds,
+        'writes_per_second': len(writes) / args.seconds,
+        'read_p50_ms': percentile(reads, 0.50) * 1000,
+        'read_p95_ms': percentile(reads, 0.95) * 1000,
+        'write_p95_ms': percentile(writes, 0.95) * 1000,
+        'errors': len(errors),
+    }))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--seconds', type=float, default=10)
+    parser.add_argument('--readers', type=int, default=8)
+    parser.add_argument('--writers', type=int, default=2)
+    parser.add_argument('--users', type=int, default=2000)
+    parser.add_argument('--movies', type=int, default=2000)
+    parser.add_argument('--ratings', type=int, default=50000)
+    parser.add_argument('--profile', choices=PROFILES, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.profile:
+        return run_profile(args)
+
+    print(f'{args.readers} readers, {args.writers} writers, {args.seconds:g}s per profile')
+    for name, overrides in PROFILES.items():
+        directory = tempfile.mkdtemp()
+        env = {
+            **os.environ,
+            **overrides,
+            'DATABASE_URL': f"sqlite:///{os.path.join(directory, 'load.db')}",
+            'CACHE_BACKEND': 'none',
+        }
+        output = subprocess.run(
+            [sys.executable, '-m', 'benchmarks.mixed_load', '--profile', name, *sys.argv[1:]],
+            env=env, capture_output=True, text=True, check=True,
+        ).stdout
+        result = json.loads(output.strip().splitlines()[-1])
+        print(f"{name:<9} journal={result['journal_mode']:<7} "
+              f"reads/s {result['reads_per_second']:8.1f}  read p50 {result['read_p50_ms']:6.1f} ms  "
+              f"read p95 {result['read_p95_ms']:6.1f} ms  writes/s {result['writes_per_second']:6.1f}  "
+              f"write p95 {result['write_p95_ms']:6.1f} ms  errors {result['errors']}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,109 @@
+#!/usr/bin/env python3
+"""Time the similar-movies index: a full build, incremental refreshes after writes, and the endpoints reading it.
+
+Run from the server directory:
+
+    python -m benchmarks.recommendations [--users 5000] [--movies 1000] [--ratings 200000] [--writes 100] [--rounds 3]
+
+After each round of `--writes` ratings (posted through the API, so they land
+in the change log) the index is refreshed incrementally, and the stored
+neighbours are checked against a full rebuild's; the run exits with status 1
+if they differ. Then `--requests` reads of `/movies/<id>/similar` and
+`/users/<id>/recommendations` are timed.
+"""
+
+# Standard library imports
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+
+DATABASE = os.path.join(tempfile.mkdtemp(), 'recommendations.db')
+os.environ['DATABASE_URL'] = f'sqlite:///{DATABASE}'
+os.environ['CACHE_BACKEND'] = 'none'
+
+# Local imports
+from app import app
+from models import db, MovieSimilarity
+from recommender import SimilarityIndex
+from benchmarks.common import populate
+
+
+def percentile(values, fraction):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * fraction))] if values else 0.0
+
+
+def stored_neighbours():
+    rows = db.session.execute(db.select(MovieSimilarity.movie_id, MovieSimilarity.similar_movie_id, MovieSimilarity.score)).all()
+    db.session.remove()
+    return {(movie_id, similar_movie_id): score for movie_id, similar_movie_id, score in rows}
+
+
+def mismatches(stored, rebuilt):
+    """How many neighbour pairs one side has and the other hasn't, or has with another score."""
+    differing = set(stored) ^ set(rebuilt)
+    return len(differing) + sum(1 for pair in set(stored) & set(rebuilt) if abs(stored[pair] - rebuilt[pair]) > 1e-9)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--users', type=int, default=5000)
+    parser.add_argument('--movies', type=int, default=1000)
+    parser.add_argument('--ratings', type=int, default=200000)
+    parser.add_argument('--writes', type=int, default=100, help='ratings posted before each refresh')
+    parser.add_argument('--rounds', type=int, default=3)
+    parser.add_argument('--requests', type=int, default=500, help='timed reads of each endpoint')
+    args = parser.parse_args()
+
+    client = app.test_client()
+    rng = random.Random(0)
+    with app.app_context():
+        populate(users=args.users, movies=args.movies, rentals=0, ratings=args.ratings)
+        index = SimilarityIndex(app.config['RECOMMENDER_NEIGHBOURS'])
+        started = time.perf_counter()
+        listed = index.refresh(full=True)
+        db.session.remove()
+        print(f'full build: {listed} movies with neighbours in {(time.perf_counter() - started) * 1000:.0f} ms')
+
+        failed = False
+        for round in range(args.rounds):
+            for _ in range(args.writes):
+                body = {'user_id': rng.randint(1, args.users), 'movie_id': rng.randint(1, args.movies), 'rating': rng.randint(1, 10), 'review': None}
+                if client.post('/ratings', json=body).status_code != 201:
+                    raise RuntimeError('POST /ratings failed')
+            started = time.perf_counter()
+            rewritten = index.refresh()
+            refresh_ms = (time.perf_counter() - started) * 1000
+            stored = stored_neighbours()
+
+            started = time.perf_counter()
+            SimilarityIndex(index.k).refresh(full=True)
+            rebuild_ms = (time.perf_counter() - started) * 1000
+            differing = mismatches(stored, stored_neighbours())
+            failed = failed or bool(differing)
+            print(f'round {round + 1}: {args.writes} ratings -> refresh rewrote {rewritten} lists in {refresh_ms:.0f} ms '
+                  f'(full rebuild {rebuild_ms:.0f} ms); {differing} pairs differ from the rebuild')
+
+    for name, path in (
+        ('GET /movies/<id>/similar', lambda: f'/movies/{rng.randint(1, args.movies)}/similar'),
+        ('GET /users/<id>/recommendations', lambda: f'/users/{rng.randint(1, args.users)}/recommendations'),
+    ):
+        latencies, empty = [], 0
+        for _ in range(args.requests):
+            started = time.perf_counter()
+            response = client.get(path())
+            latencies.append(time.perf_counter() - started)
+            empty += response.json == []
+        print(f'{name:<32} p50 {percentile(latencies, 0.50) * 1000:.2f} ms  p95 {percentile(latencies, 0.95) * 1000:.2f} ms  '
+              f'p99 {percentile(latencies, 0.99) * 1000:.2f} ms  empty {empty}')
+
+    if failed:
+        print('FAIL: incremental refreshes drifted from a full rebuild')
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
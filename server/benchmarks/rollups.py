@@ -0,0 +1,172 @@
+#!/usr/bin/env python3
+"""Time the rating rollups: the backfill, their upkeep on every kind of write, and the trend endpoints reading them.
+
+Run from the server directory:
+
+    python -m benchmarks.rollups [--users 5000] [--movies 1000] [--ratings 200000] [--rounds 3] [--requests 300]
+
+Each round writes through the API in every way that touches the rollups
+(ratings added, changed and deleted singly and in bulk, a purge, movies
+changing genre or deleted, a user deleted); the stored rollups are then
+checked against a backfill from scratch, and the run exits with status 1 if
+they differ. Finally `--requests` reads of each endpoint are timed against
+the same question answered straight from `ratings`.
+"""
+
+# Standard library imports
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+
+DATABASE = os.path.join(tempfile.mkdtemp(), 'rollups.db')
+os.environ['DATABASE_URL'] = f'sqlite:///{DATABASE}'
+os.environ['CACHE_BACKEND'] = 'none'
+
+# Remote library imports
+from sqlalchemy import func
+
+# Local imports
+from app import app
+from models import db, Movie, Rating, RatingRollup, GenreRatingRollup
+from benchmarks.common import populate
+
+GENRES = ['Drama', 'Action', 'Thriller', 'Comedy', 'Sci-Fi']
+
+
+def percentile(values, fraction):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * fraction))] if values else 0.0
+
+
+def stored_rollups():
+    rows = {}
+    for model in (RatingRollup, GenreRatingRollup):
+        key_columns = list(model.__table__.primary_key.columns)
+        for row in db.session.execute(db.select(*key_columns, model.count, model.sum)):
+            rows[(model.__tablename__, *row[:-2])] = tuple(row[-2:])
+    db.session.remove()
+    return rows
+
+
+def mismatches(stored, rebuilt):
+    return sum(1 for key in set(stored) | set(rebuilt) if stored.get(key) != rebuilt.get(key))
+
+
+def write_round(client, rng, args, ids):
+    """Write through every API path that keeps the rollups; return how many requests failed."""
+    def rating():
+        return {'user_id': rng.choice(ids['users']), 'movie_id': rng.choice(ids['movies']), 'rating': rng.randint(1, 10), 'review': None}
+
+    def sample(values, count):
+        return rng.sample(values, min(count, len(values)))
+
+    responses = []
+    for _ in range(args.writes):
+        responses.append(client.post('/ratings', json=rating()))
+    for id in sample(ids['ratings'], 10):
+        ids['ratings'].remove(id)
+        responses.append(client.delete(f'/ratings/{id}'))
+    created = client.post('/ratings/bulk', json=[rating() for _ in range(args.writes)])
+    responses.append(created)
+    ids['ratings'].extend(result['id'] for result in created.json['results'] if result['status'] == 201)
+    responses.append(client.patch('/ratings/bulk', json=[
+        {'id': id, 'movie_id': rng.choice(ids['movies']), 'rating': rng.randint(1, 10)} for id in sample(ids['ratings'], args.writes)
+    ]))
+    deleted = sample(ids['ratings'], args.writes)
+    for id in deleted:
+        ids['ratings'].remove(id)
+    responses.append(client.delete('/ratings/bulk', json=deleted))
+    responses.append(client.delete(f"/ratings/bulk?movie_id={rng.choice(ids['movies'])}"))
+
+    for id in sample(ids['movies'], 3):
+        movie = client.get(f'/movies/{id}').json
+        body = {key: movie[key] for key in ('title', 'release_year', 'image')}
+        responses.append(client.patch(f'/movies/{id}', json={**body, 'genre': rng.choice(GENRES)}))
+    responses.append(client.patch('/movies/bulk', json=[{'id': id, 'genre': rng.choice(GENRES)} for id in sample(ids['movies'], 20)]))
+    movie_id, user_id = rng.choice(ids['movies']), rng.choice(ids['users'])
+    ids['movies'].remove(movie_id)
+    ids['users'].remove(user_id)
+    responses.append(client.delete(f'/movies/{movie_id}'))
+    responses.append(client.delete(f'/users/{user_id}'))
+    responses.append(client.delete('/movies/bulk', json=[ids['movies'].pop()]))
+
+    with app.app_context():
+        ids['ratings'] = db.session.scalars(db.select(Rating.id)).all()
+        db.session.remove()
+    return sum(1 for response in responses if response.status_code >= 400)
+
+
+def time_reads(label, requests, read):
+    latencies = []
+    for _ in range(requests):
+        started = time.perf_counter()
+        read()
+        latencies.append(time.perf_counter() - started)
+    print(f'{label:<52} p50 {percentile(latencies, 0.50) * 1000:.2f} ms  p95 {percentile(latencies, 0.95) * 1000:.2f} ms')
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--users', type=int, default=5000)
+    parser.add_argument('--movies', type=int, default=1000)
+    parser.add_argument('--ratings', type=int, default=200000)
+    parser.add_argument('--writes', type=int, default=50, help='ratings per kind of rating write in each round')
+    parser.add_argument('--rounds', type=int, default=3)
+    parser.add_argument('--requests', type=int, default=300, help='timed reads of each endpoint and raw query')
+    args = parser.parse_args()
+
+    client = app.test_client()
+    rng = random.Random(0)
+    with app.app_context():
+        populate(users=args.users, movies=args.movies, rentals=0, ratings=args.ratings)
+        started = time.perf_counter()
+        written = RatingRollup.rebuild()
+        print(f'backfill: {written:,} rollup rows from {args.ratings:,} ratings in {(time.perf_counter() - started) * 1000:.0f} ms')
+        ids = {
+            'users': list(range(1, args.users + 1)),
+            'movies': list(range(1, args.movies + 1)),
+            'ratings': db.session.scalars(db.select(Rating.id)).all(),
+        }
+        db.session.remove()
+
+    failed = False
+    for round in range(args.rounds):
+        started = time.perf_counter()
+        errors = write_round(client, rng, args, ids)
+        writes_ms = (time.perf_counter() - started) * 1000
+        with app.app_context():
+            stored = stored_rollups()
+            RatingRollup.rebuild()
+            differing = mismatches(stored, stored_rollups())
+        failed = failed or bool(differing) or bool(errors)
+        print(f'round {round + 1}: writes in {writes_ms:.0f} ms ({errors} failed); {differing} rollup rows differ from a backfill')
+
+    def movie_id():
+        return rng.choice(ids['movies'])
+
+    with app.app_context():
+        day = func.date(Rating.created_at)
+        time_reads('GET /movies/<id>/ratings/timeseries', args.requests,
+                   lambda: client.get(f'/movies/{movie_id()}/ratings/timeseries'))
+        time_reads('  the same 90 days from ratings', args.requests, lambda: db.session.execute(
+            db.select(day, func.count(), func.sum(Rating.rating)).where(Rating.movie_id == movie_id())
+            .group_by(day).order_by(day.desc()).limit(90)
+        ).all())
+        time_reads('GET /genres/<genre>/stats?period=week', args.requests,
+                   lambda: client.get(f'/genres/{rng.choice(GENRES)}/stats?period=week'))
+        time_reads('  the same totals and weeks (as days) from ratings', max(1, args.requests // 30), lambda: db.session.execute(
+            db.select(day, func.count(), func.sum(Rating.rating)).join(Movie, Movie.id == Rating.movie_id)
+            .where(Movie.genre == rng.choice(GENRES)).group_by(day)
+        ).all())
+        db.session.remove()
+
+    if failed:
+        print('FAIL: the rollups drifted from a backfill, or a write failed')
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,72 @@
+#!/usr/bin/env python3
+"""Measure `/movies/search` latency for type-ahead queries.
+
+Run from the server directory:
+
+    python -m benchmarks.search [--movies 20000] [--ratings 100000] [--queries 2000]
+
+Movies get titles of one to four words from a synthetic vocabulary, and each
+query is a growing prefix of a random title ("d", "du", ..., "dunel kar"),
+the way a search box sends them while someone types.
+"""
+
+# Standard library imports
+import argparse
+import os
+import random
+import tempfile
+import time
+
+DATABASE = os.path.join(tempfile.mkdtemp(), 'search.db')
+os.environ['DATABASE_URL'] = f'sqlite:///{DATABASE}'
+os.environ['CACHE_BACKEND'] = 'none'
+
+# Local imports
+from app import app
+from models import db, Movie
+from benchmarks.common import populate
+
+SYLLABLES = ['ka', 'lo', 'mi', 'ra', 'shen', 'tor', 'vel', 'dun', 'bri', 'sa', 'no', 'el', 'quin', 'ar', 'pe', 'zu']
+
+
+def percentile(values, fraction):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * fraction))] if values else 0.0
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--movies', type=int, default=20000)
+    parser.add_argument('--ratings', type=int, default=100000)
+    parser.add_argument('--queries', type=int, default=2000)
+    args = parser.parse_args()
+
+    with app.app_context():
+        started = time.perf_counter()
+        populate(movies=args.movies, ratings=args.ratings)
+        rng = random.Random(0)
+        vocabulary = [''.join(rng.choices(SYLLABLES, k=rng.randint(2, 3))) for _ in range(4000)]
+        titles = [' '.join(rng.choices(vocabulary, k=rng.randint(1, 4))).title() for _ in range(args.movies)]
+        db.session.execute(db.update(Movie), [{'id': id, 'title': title} for id, title in enumerate(titles, 1)])
+        db.session.commit()
+        print(f'populated {args.movies} movies and {args.ratings} ratings in {time.perf_counter() - started:.1f}s')
+
+    client = app.test_client()
+    latencies, empty = [], 0
+    while len(latencies) < args.queries:
+        title = rng.choice(titles)
+        for end in range(1, len(title) + 1):
+            if not title[:end].strip():
+                continue
+            started = time.perf_counter()
+            response = client.get('/movies/search', query_string={'q': title[:end], 'limit': 10})
+            latencies.append(time.perf_counter() - started)
+            empty += response.json == []
+
+    print(f'{len(latencies)} queries: p50 {percentile(latencies, 0.50) * 1000:.2f} ms  '
+          f'p95 {percentile(latencies, 0.95) * 1000:.2f} ms  p99 {percentile(latencies, 0.99) * 1000:.2f} ms  '
+          f'empty {empty}')
+
+
+if __name__ == '__main__':
+    main()
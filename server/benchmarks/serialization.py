@@ -0,0 +1,59 @@
+#!/usr/bin/env python3
+"""Compare SerializerMixin.to_dict() with the precompiled row serializers.
+
+Run from the server directory:
+
+    python -m benchmarks.serialization [--movies 5000] [--ratings 20000]
+"""
+
+# Standard library imports
+import argparse
+import os
+import tempfile
+import timeit
+
+DATABASE = os.path.join(tempfile.mkdtemp(), 'bench.db')
+os.environ['DATABASE_URL'] = f'sqlite:///{DATABASE}'
+
+# Local imports
+from app import app, MAX_PAGE_SIZE
+from models import db, Movie, Rating
+from serializers import serializer_for, dumps
+from benchmarks.common import populate
+
+
+def legacy_page(model):
+    db.session.expunge_all()
+    items = [row.to_dict() for row in model.query.order_by(model.id).limit(MAX_PAGE_SIZE).all()]
+    return app.json.dumps(items)
+
+
+def compiled_page(model):
+    serializer = serializer_for(model)
+    return dumps(serializer.serialize_rows(serializer.rows(db.session, limit=MAX_PAGE_SIZE)))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--movies', type=int, default=5000)
+    parser.add_argument('--ratings', type=int, default=20000)
+    parser.add_argument('--repeat', type=int, default=20)
+    args = parser.parse_args()
+
+    with app.app_context():
+        populate(movies=args.movies, ratings=args.ratings)
+        client = app.test_client()
+
+        print(f'{MAX_PAGE_SIZE}-row page, best of {args.repeat} runs')
+        for path, model in (('/movies', Movie), ('/ratings', Rating)):
+            legacy = min(timeit.repeat(lambda: legacy_page(model), number=1, repeat=args.repeat))
+            compiled = min(timeit.repeat(lambda: compiled_page(model), number=1, repeat=args.repeat))
+            endpoint = min(timeit.repeat(lambda: client.get(f'{path}?limit={MAX_PAGE_SIZE}'), number=1, repeat=args.repeat))
+            print(f'GET {path:<9} to_dict {legacy * 1000:8.2f} ms   compiled {compiled * 1000:8.2f} ms   '
+                  f'speedup {legacy / compiled:5.1f}x   endpoint {endpoint * 1000:8.2f} ms')
+
+    os.remove(DATABASE)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,82 @@
+#!/usr/bin/env python3
+"""Compare validating bulk items through transient model instances with batch schema validation.
+
+Run from the server directory:
+
+    python -m benchmarks.validation [--records 100000] [--invalid 0.1]
+
+The instance path is what the bulk endpoints used to do: build a model per
+item so its `@validates` hooks run, stopping at the first bad field. The
+schema path validates the whole list in one pass and reports every bad field.
+"""
+
+# Standard library imports
+import argparse
+import random
+import time
+from datetime import datetime, timedelta
+
+# Local imports
+from models import User, Movie, Rental, Rating
+from validation import USER_SCHEMA, MOVIE_SCHEMA, RENTAL_SCHEMA, RATING_SCHEMA
+
+SCHEMAS = {User: USER_SCHEMA, Movie: MOVIE_SCHEMA, Rental: RENTAL_SCHEMA, Rating: RATING_SCHEMA}
+
+
+def records(model, count, invalid, rng):
+    due = (datetime.now() + timedelta(days=30)).isoformat()
+    for i in range(count):
+        if model is User:
+            item = {'name': f'User {i}', 'email': f'user{i}@example.com'}
+        elif model is Movie:
+            item = {'title': f'Movie {i}', 'genre': 'Drama', 'release_year': 1950 + i % 70, 'image': f'https://example.com/{i}.jpg'}
+        elif model is Rental:
+            item = {'user_id': 1 + i % 1000, 'movie_id': 1 + i % 5000, 'due_date': due}
+        else:
+            item = {'user_id': 1 + i % 1000, 'movie_id': 1 + i % 5000, 'rating': 1 + i % 10, 'review': 'Fine.'}
+        if rng.random() < invalid:
+            # Break every field, so the collected errors outnumber the first-error ones.
+            item = {field: -1 for field in item}
+        yield item
+
+
+def with_instances(model, items):
+    fields = SCHEMAS[model].fields
+    results = []
+    for item in items:
+        try:
+            instance = model(**item)
+            results.append(({field: getattr(instance, field) for field in fields}, {}))
+        except (ValueError, TypeError) as e:
+            results.append((None, str(e)))
+    return results
+
+
+def with_schema(model, items):
+    return SCHEMAS[model].validate_batch(items)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--records', type=int, default=100000)
+    parser.add_argument('--invalid', type=float, default=0.1, help='fraction of records with bad fields')
+    args = parser.parse_args()
+
+    rng = random.Random(0)
+    print(f'{args.records} records per model, {args.invalid:.0%} invalid')
+    for model in SCHEMAS:
+        items = list(records(model, args.records, args.invalid, rng))
+        timings = {}
+        for name, validate in (('instances', with_instances), ('schema', with_schema)):
+            started = time.perf_counter()
+            results = validate(model, items)
+            timings[name] = time.perf_counter() - started
+            errors = sum(len(errors) if isinstance(errors, dict) else 1 for _, errors in results if errors)
+            timings[f'{name} errors'] = errors
+        print(f"{model.__name__:<7} instances {timings['instances'] * 1000:8.1f} ms ({timings['instances errors']} errors)  "
+              f"schema {timings['schema'] * 1000:8.1f} ms ({timings['schema errors']} errors)  "
+              f"{timings['instances'] / timings['schema']:5.1f}x")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,245 @@
+# Standard library imports
+import json
+from itertools import islice
+
+# Remote library imports
+from flask import request, make_response
+from flask_restful import Resource
+from sqlalchemy.exc import SQLAlchemyError
+
+# Local imports
+from config import db
+
+BULK_CHUNK_SIZE = 1000
+PURGE_BATCH_SIZE = 1000
+
+
+def read_items():
+    """Yield the items of a bulk request body, sent as a JSON array or as NDJSON.
+
+    NDJSON bodies are read line by line, so a stream of any length is never
+    held in memory at once. A line that isn't valid JSON is yielded as a
+    `ValueError` so it can be reported against its own index.
+    """
+    if request.mimetype == 'application/x-ndjson':
+        for line in request.stream:
+            if not line.strip():
+                continue
+            try:
+                yield json.loads(line)
+            except ValueError as e:
+                yield ValueError(f'Invalid JSON: {e}')
+    else:
+        items = request.get_json(silent=True)
+        if not isinstance(items, list):
+            raise ValueError('Body must be a JSON array or an NDJSON stream')
+        yield from items
+
+
+def chunked(iterable, size):
+    iterator = iter(iterable)
+    while chunk := list(islice(iterator, size)):
+        yield chunk
+
+
+def missing_ids(model, ids):
+    """The integer ids among `ids` with no row of `model`; anything that isn't an integer is left to the schema to reject."""
+    ids = {id for id in ids if isinstance(id, int)}
+    found = set(db.session.scalars(db.select(model.id).where(model.id.in_(ids))))
+    return ids - found
+
+
+class BulkResource(Resource):
+    """Create, update or delete many rows of `model` per request.
+
+    Each chunk of `BULK_CHUNK_SIZE` items is validated in one pass by the
+    model's `schema` (the rules its `@validates` hooks use), with every
+    invalid field reported per item, then written with one executemany
+    statement and committed. The response carries one result per item, in order.
+
+    `DELETE` with query args instead purges every row matching them; each
+    arg named in `purge_filters` maps to a function building its criterion
+    from the arg's value.
+    """
+
+    model = None
+    schema = None
+    purge_filters = {}
+
+    def check(self, rows):
+        """Return {position: error} for valid-looking rows that can't be written (e.g. dangling ids)."""
+        return {}
+
+    def after_insert(self, ids):
+        pass
+
+    def before_update(self, ids):
+        pass
+
+    def after_update(self, ids):
+        pass
+
+    def before_delete(self, ids):
+        pass
+
+    def after_delete(self, ids):
+        pass
+
+    def run(self, write, partial=False):
+        try:
+            items = read_items()
+            results = []
+            for chunk in chunked(enumerate(items), BULK_CHUNK_SIZE):
+                results.extend(self.run_chunk(chunk, write, partial))
+        except ValueError as e:
+            db.session.rollback()
+            return make_response({'errors': str(e)}, 400)
+
+        failed = sum(1 for result in results if 'errors' in result)
+        return make_response({'succeeded': len(results) - failed, 'failed': failed, 'results': results}, 200)
+
+    def run_chunk(self, chunk, write, partial):
+        results = {}
+        objects = []
+        for index, item in chunk:
+            if isinstance(item, Exception):
+                results[index] = {'index': index, 'status': 400, 'errors': str(item)}
+            elif not isinstance(item, dict):
+                results[index] = {'index': index, 'status': 400, 'errors': 'Each item must be a JSON object'}
+            else:
+                objects.append((index, item))
+
+        rows, positions = [], []
+        validated = self.schema.validate_batch([item for _, item in objects], partial)
+        for (index, item), (row, errors) in zip(objects, validated):
+            if partial:
+                if isinstance(item.get('id'), int):
+                    row['id'] = item['id']
+                else:
+                    errors['id'] = 'Each item must have an integer `id`'
+            if errors:
+                results[index] = {'index': index, 'status': 400, 'errors': errors}
+                continue
+            rows.append(row)
+            positions.append(index)
+
+        if rows:
+            errors = self.check(rows)
+            for position, (status, message) in errors.items():
+                index = positions[position]
+                results[index] = {'index': index, 'status': status, 'errors': message}
+            keep = [position for position in range(len(rows)) if position not in errors]
+            rows = [rows[position] for position in keep]
+            positions = [positions[position] for position in keep]
+
+        if rows:
+            try:
+                for index, result in zip(positions, write(rows)):
+                    results[index] = {'index': index, **result}
+                db.session.commit()
+            except SQLAlchemyError as e:
+                db.session.rollback()
+                for index in positions:
+                    results[index] = {'index': index, 'status': 500, 'errors': 'Failed to write batch', 'message': str(e.orig if hasattr(e, 'orig') else e)}
+
+        return [results[index] for index, _ in chunk]
+
+    def insert(self, rows):
+        ids = db.session.execute(
+            db.insert(self.model).returning(self.model.id, sort_by_parameter_order=True),
+            rows,
+        ).scalars().all()
+        self.after_insert(ids)
+        return [{'status': 201, 'id': id} for id in ids]
+
+    def update(self, rows):
+        missing = missing_ids(self.model, [row['id'] for row in rows])
+        present = [row for row in rows if row['id'] not in missing]
+        if present:
+            ids = [row['id'] for row in present]
+            self.before_update(ids)
+            db.session.execute(db.update(self.model), present)
+            self.after_update(ids)
+        return [
+            {'status': 404, 'id': row['id'], 'errors': f'{self.model.__name__} not found'} if row['id'] in missing
+            else {'status': 202, 'id': row['id']}
+            for row in rows
+        ]
+
+    def post(self):
+        return self.run(self.insert)
+
+    def patch(self):
+        return self.run(self.update, partial=True)
+
+    def delete(self):
+        if request.args:
+            return self.purge()
+        ids = request.get_json(silent=True)
+        if not isinstance(ids, list) or not all(isinstance(id, int) for id in ids):
+            return make_response({'errors': 'Body must be a JSON array of integer ids'}, 400)
+
+        results = []
+        for chunk in chunked(ids, BULK_CHUNK_SIZE):
+            missing = missing_ids(self.model, chunk)
+            present = [id for id in chunk if id not in missing]
+            if present:
+                self.delete_batch(present)
+            results.extend(
+                {'id': id, 'status': 404, 'errors': f'{self.model.__name__} not found'} if id in missing
+                else {'id': id, 'status': 204}
+                for id in chunk
+            )
+
+        failed = sum(1 for result in results if 'errors' in result)
+        return make_response({'succeeded': len(results) - failed, 'failed': failed, 'results': results}, 200)
+
+    def delete_batch(self, ids):
+        """Delete the rows with `ids` in one statement, between the delete hooks, and commit.
+
+        Rows that reference them go with them through their foreign keys' ON DELETE CASCADE.
+        """
+        self.before_delete(ids)
+        db.session.execute(db.delete(self.model).where(self.model.id.in_(ids)))
+        self.after_delete(ids)
+        db.session.commit()
+
+    def purge_criteria(self, args):
+        if not self.purge_filters:
+            raise ValueError(f'{self.model.__name__}s cannot be purged by filter')
+        unknown = sorted(set(args) - set(self.purge_filters))
+        if unknown:
+            raise ValueError(f"Unknown filters: {', '.join(unknown)}; expected some of {', '.join(self.purge_filters)}")
+        try:
+            return [self.purge_filters[name](value) for name, value in args.items()]
+        except ValueError:
+            raise ValueError('Ids must be integers and dates ISO 8601 strings')
+
+    def purge(self):
+        """Delete every row matching the query args, `PURGE_BATCH_SIZE` at a time.
+
+        Batches are read in id order and each goes through `delete_batch`, so
+        derived data is kept in step as with a delete by ids, and no write
+        transaction stays open for long. If one fails, the batches before it
+        stay deleted and the request can simply be repeated.
+        """
+        try:
+            criteria = self.purge_criteria(request.args.to_dict())
+        except ValueError as e:
+            return make_response({'errors': str(e)}, 400)
+
+        deleted, after = 0, 0
+        while True:
+            ids = db.session.scalars(
+                db.select(self.model.id).where(self.model.id > after, *criteria).order_by(self.model.id).limit(PURGE_BATCH_SIZE)
+            ).all()
+            if not ids:
+                break
+            try:
+                self.delete_batch(ids)
+            except SQLAlchemyError as e:
+                db.session.rollback()
+                return make_response({'errors': 'Failed to purge', 'deleted': deleted, 'message': str(e.orig if hasattr(e, 'orig') else e)}, 500)
+            deleted += len(ids)
+            after = ids[-1]
+        return make_response({'deleted': deleted}, 200)
@@ -0,0 +1,151 @@
+# Standard library imports
+import json
+import threading
+import time
+from collections import OrderedDict, Counter
+from functools import wraps
+
+# Remote library imports
+from flask import request, make_response, current_app
+
+CACHED_HEADERS = ('Link', 'X-Next-Cursor')
+
+
+class MemoryBackend:
+    """Bounded in-process LRU with a per-entry TTL. Each worker process has its own."""
+
+    name = 'memory'
+
+    def __init__(self, max_entries=1024):
+        self.max_entries = max_entries
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+
+    def get(self, key):
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                return None
+            value, expires_at = entry
+            if expires_at is not None and expires_at < time.monotonic():
+                del self.entries[key]
+                return None
+            self.entries.move_to_end(key)
+            return value
+
+    def set(self, key, value, ttl=None):
+        with self.lock:
+            self.entries[key] = (value, time.monotonic() + ttl if ttl else None)
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+
+    def size(self):
+        return len(self.entries)
+
+
+class RedisBackend:
+    """Redis (or any server speaking its protocol) shared by every worker process."""
+
+    name = 'redis'
+
+    def __init__(self, url):
+        try:
+            import redis
+        except ImportError:
+            raise RuntimeError("CACHE_BACKEND=redis needs the `redis` package (pip install redis)")
+        self.client = redis.Redis.from_url(url)
+
+    def get(self, key):
+        value = self.client.get(key)
+        return None if value is None else json.loads(value)
+
+    def set(self, key, value, ttl=None):
+        self.client.set(key, json.dumps(value), ex=ttl or None)
+
+    def size(self):
+        return self.client.dbsize()
+
+
+class Cache:
+    """Read-through cache for GET responses, keyed by the versions of the tables they read.
+
+    Every write bumps the versions of the tables it touches in the database
+    (`models.TableVersion`), which every worker process reads alike, so an
+    entry is never read again once a write it depends on commits, whichever
+    worker served it or took the write; stale entries simply age out of the
+    backend. `versions` is set by the app to a function returning
+    `{table: (version, updated_at)}` for a list of tables. Hits and misses
+    are counted per namespace for tuning.
+    """
+
+    def __init__(self, backend=None, ttl=300, versions=None):
+        self.backend = backend
+        self.ttl = ttl
+        self.versions = versions
+        self.hits = Counter()
+        self.misses = Counter()
+
+    @classmethod
+    def from_config(cls, config):
+        name = config.get('CACHE_BACKEND', 'memory')
+        if name == 'memory':
+            backend = MemoryBackend(config.get('CACHE_MAX_ENTRIES', 1024))
+        elif name == 'redis':
+            backend = RedisBackend(config['CACHE_REDIS_URL'])
+        elif name == 'none':
+            backend = None
+        else:
+            raise ValueError(f'Unknown CACHE_BACKEND {name!r}; expected memory, redis or none')
+        return cls(backend, config.get('CACHE_TTL', 300))
+
+    def key(self, namespace, tables):
+        """The key of this request's response in `namespace`, given it reads `tables`.
+
+        Versions go in with the time they were bumped, so a database rebuilt
+        from scratch, whose counters start over, doesn't hit old entries.
+        """
+        versions = self.versions(tables)
+        state = ','.join(f'{table}.{versions[table][0]}.{versions[table][1]}' for table in tables)
+        return f'{namespace}:{state}:{request.full_path}'
+
+    def cached(self, namespace, tables=None):
+        """Cache a GET handler's 200 responses under `namespace`, kept until a write to one of `tables` (by default the namespace's own)."""
+        tables = tuple(tables or (namespace,))
+
+        def decorator(get):
+            @wraps(get)
+            def wrapper(*args, **kwargs):
+                if self.backend is None:
+                    return get(*args, **kwargs)
+
+                key = self.key(namespace, tables)
+                entry = self.backend.get(key)
+                if entry is not None:
+                    self.hits[namespace] += 1
+                    body, headers = entry
+                    return current_app.response_class(body, status=200, headers=headers, mimetype='application/json')
+
+                self.misses[namespace] += 1
+                response = make_response(get(*args, **kwargs))
+                if response.status_code == 200:
+                    headers = {name: response.headers[name] for name in CACHED_HEADERS if name in response.headers}
+                    self.backend.set(key, [response.get_data(as_text=True), headers], self.ttl)
+                return response
+            return wrapper
+        return decorator
+
+    def stats(self):
+        namespaces = sorted(set(self.hits) | set(self.misses))
+        return {
+            'backend': self.backend.name if self.backend else 'none',
+            'entries': self.backend.size() if self.backend else 0,
+            'namespaces': {
+                namespace: {
+                    'hits': self.hits[namespace],
+                    'misses': self.misses[namespace],
+                    'hit_rate': self.hits[namespace] / ((self.hits[namespace] + self.misses[namespace]) or 1),
+                }
+                for namespace in namespaces
+            },
+        }
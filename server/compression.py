@@ -0,0 +1,114 @@
+# Standard library imports
+import zlib
+
+# Remote library imports
+from flask import request
+from werkzeug.http import parse_accept_header
+
+# Local imports
+from cache import MemoryBackend
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+COMPRESSIBLE_TYPES = ('application/json', 'application/x-ndjson', 'text/plain', 'text/html')
+
+
+class Compressor:
+    """Compresses response bodies with the best coding the client accepts: brotli, when the `brotli` package is installed, or gzip.
+
+    Bodies shorter than `min_size` go out as they are, since below about a
+    packet compression saves nothing on the wire. A body with a strong ETag
+    is the same bytes for as long as the ETag stands, so its compressed form
+    is kept in a per-process LRU under the ETag and coding, and repeat reads
+    (notably of list pages, which are both the largest bodies and the ones
+    the response cache serves) skip the compressor. Compressed responses
+    carry the ETag weakened, since their bytes differ from the identity
+    response's; conditional GETs compare tags weakly, so either form revalidates.
+    """
+
+    def __init__(self, min_size=1024, gzip_level=6, brotli_quality=5, max_entries=1024):
+        self.min_size = min_size
+        self.gzip_level = gzip_level
+        self.brotli_quality = brotli_quality
+        self.encodings = ('br', 'gzip') if brotli else ('gzip',)
+        self.store = MemoryBackend(max_entries) if max_entries else None
+        self.hits = self.misses = 0
+
+    @classmethod
+    def from_config(cls, config):
+        return cls(
+            config.get('COMPRESSION_MIN_SIZE', 1024),
+            config.get('COMPRESSION_GZIP_LEVEL', 6),
+            config.get('COMPRESSION_BROTLI_QUALITY', 5),
+            config.get('COMPRESSION_CACHE_ENTRIES', 1024),
+        )
+
+    def negotiate(self, accept_encoding):
+        """The coding to answer an `Accept-Encoding` header with, or None for the identity."""
+        return parse_accept_header(accept_encoding).best_match(self.encodings)
+
+    def encode(self, body, encoding):
+        if encoding == 'br':
+            return brotli.compress(body, quality=self.brotli_quality)
+        compressor = zlib.compressobj(self.gzip_level, zlib.DEFLATED, 31)
+        return compressor.compress(body) + compressor.flush()
+
+    def compress(self, body, accept_encoding, etag=None):
+        """(body, coding) for a 200 response's `body`, compressed when it's large enough and the client accepts a coding.
+
+        `etag`, the response's strong ETag if it has one, keys the stored compressed body.
+        """
+        encoding = self.negotiate(accept_encoding) if len(body) >= self.min_size else None
+        if encoding is None:
+            return body, None
+        if etag is None or self.store is None:
+            return self.encode(body, encoding), encoding
+
+        key = f'{etag}:{encoding}'
+        compressed = self.store.get(key)
+        if compressed is None:
+            self.misses += 1
+            compressed = self.encode(body, encoding)
+            self.store.set(key, compressed)
+        else:
+            self.hits += 1
+        return compressed, encoding
+
+    def stats(self):
+        return {
+            'encodings': list(self.encodings),
+            'min_size': self.min_size,
+            'entries': self.store.size() if self.store else 0,
+            'hits': self.hits,
+            'misses': self.misses,
+        }
+
+    def init_app(self, app):
+        """Compress the app's 200 responses of a text type that aren't streamed or already encoded.
+
+        Initialize it after the other extensions, so its hook runs first and
+        the request metrics include the time spent compressing.
+        """
+        @app.after_request
+        def compress_response(response):
+            etag, weak = response.get_etag()
+            if response.status_code == 304:
+                # Answer a client revalidating a compressed copy with the tag it holds.
+                if etag and not weak and request.if_none_match.is_weak(etag):
+                    response.set_etag(etag, weak=True)
+                return response
+            if (response.status_code != 200 or response.is_streamed or response.direct_passthrough
+                    or 'Content-Encoding' in response.headers or not (response.mimetype or '').startswith(COMPRESSIBLE_TYPES)):
+                return response
+
+            response.vary.add('Accept-Encoding')
+            body, encoding = self.compress(response.get_data(), request.headers.get('Accept-Encoding', ''), None if weak else etag)
+            if encoding is not None:
+                response.set_data(body)
+                response.headers['Content-Encoding'] = encoding
+                if etag:
+                    response.set_etag(etag, weak=True)
+            return response
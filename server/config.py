@@ -1,25 +1,100 @@
 # Standard library imports
+import os
+import sqlite3
+
 # Remote library imports
 from flask import Flask
 from flask_cors import CORS
 from flask_migrate import Migrate
 from flask_restful import Api
 from flask_sqlalchemy import SQLAlchemy
-from sqlalchemy import MetaData
+from sqlalchemy import MetaData, event
+from sqlalchemy.engine import Engine
+
+# Local imports
+from cache import Cache
+from compression import Compressor
+from metrics import TimedJSONProvider
+from routing import RoutingSession
 
 # Instantiate app, set attributes
 app = Flask(__name__)
-app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///app.db'
+app.config['SQLALCHEMY_DATABASE_URI'] = os.environ.get('DATABASE_URL', 'sqlite:///app.db')
 app.config["JWT_SECRET_KEY"] = "your_secret_key"
 app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
-app.json.compact = False
+app.config['SQLALCHEMY_BINDS'] = {
+    f'replica_{index}': url
+    for index, url in enumerate(url for url in os.environ.get('DATABASE_REPLICA_URLS', '').split(',') if url)
+}
+app.config['REPLICA_MAX_STALENESS'] = float(os.environ.get('REPLICA_MAX_STALENESS', 5))
+# Flask's provider pretty-prints in debug mode only; in production bodies are compact.
+app.json = TimedJSONProvider(app)
+app.config['CACHE_BACKEND'] = os.environ.get('CACHE_BACKEND', 'memory')
+app.config['CACHE_REDIS_URL'] = os.environ.get('CACHE_REDIS_URL', 'redis://localhost:6379/0')
+app.config['CACHE_MAX_ENTRIES'] = int(os.environ.get('CACHE_MAX_ENTRIES', 1024))
+app.config['CACHE_TTL'] = int(os.environ.get('CACHE_TTL', 300))
+app.config['COMPRESSION_MIN_SIZE'] = int(os.environ.get('COMPRESSION_MIN_SIZE', 1024))
+app.config['COMPRESSION_GZIP_LEVEL'] = int(os.environ.get('COMPRESSION_GZIP_LEVEL', 6))
+app.config['COMPRESSION_BROTLI_QUALITY'] = int(os.environ.get('COMPRESSION_BROTLI_QUALITY', 5))
+app.config['COMPRESSION_CACHE_ENTRIES'] = int(os.environ.get('COMPRESSION_CACHE_ENTRIES', 1024))
+app.config['PROFILE_EVERY'] = int(os.environ.get('PROFILE_EVERY', 0))
+app.config['PROFILE_SLOW_MS'] = float(os.environ.get('PROFILE_SLOW_MS', 100))
+app.config['PROFILE_DIR'] = os.environ.get('PROFILE_DIR', 'profiles')
+app.config['RUN_SCHEDULER'] = os.environ.get('RUN_SCHEDULER', '').lower() in ('1', 'true', 'yes')
+app.config['OVERDUE_SCAN_INTERVAL'] = float(os.environ.get('OVERDUE_SCAN_INTERVAL', 60))
+app.config['OVERDUE_SCAN_BATCH_SIZE'] = int(os.environ.get('OVERDUE_SCAN_BATCH_SIZE', 500))
+app.config['CHANGE_FEED_POLL_INTERVAL'] = float(os.environ.get('CHANGE_FEED_POLL_INTERVAL', 1))
+app.config['CHANGE_FEED_HEARTBEAT'] = float(os.environ.get('CHANGE_FEED_HEARTBEAT', 15))
+app.config['CHANGE_FEED_BATCH_SIZE'] = int(os.environ.get('CHANGE_FEED_BATCH_SIZE', 500))
+app.config['CHANGE_FEED_QUEUE_SIZE'] = int(os.environ.get('CHANGE_FEED_QUEUE_SIZE', 1000))
+app.config['CHANGE_FEED_RETRY_MS'] = int(os.environ.get('CHANGE_FEED_RETRY_MS', 3000))
+app.config['CHANGE_LOG_RETENTION_HOURS'] = float(os.environ.get('CHANGE_LOG_RETENTION_HOURS', 7 * 24))
+app.config['CHANGE_LOG_PRUNE_INTERVAL'] = float(os.environ.get('CHANGE_LOG_PRUNE_INTERVAL', 3600))
+app.config['RECOMMENDER_NEIGHBOURS'] = int(os.environ.get('RECOMMENDER_NEIGHBOURS', 20))
+app.config['RECOMMENDER_REFRESH_INTERVAL'] = float(os.environ.get('RECOMMENDER_REFRESH_INTERVAL', 60))
+app.config['RECOMMENDER_REBUILD_INTERVAL'] = float(os.environ.get('RECOMMENDER_REBUILD_INTERVAL', 24 * 3600))
+
+# Database engine tuning. SQLite gets per-connection pragmas (WAL lets readers
+# run alongside a writer, and foreign keys, with their ON DELETE CASCADE, are
+# only enforced when switched on); server databases get a sized, self-healing pool.
+SQLITE_PRAGMAS = {
+    'foreign_keys': 'ON',
+    'journal_mode': os.environ.get('SQLITE_JOURNAL_MODE', 'WAL'),
+    'synchronous': os.environ.get('SQLITE_SYNCHRONOUS', 'NORMAL'),
+    'busy_timeout': int(os.environ.get('SQLITE_BUSY_TIMEOUT_MS', 5000)),
+    'mmap_size': int(os.environ.get('SQLITE_MMAP_SIZE', 256 * 1024 * 1024)),
+    'cache_size': int(os.environ.get('SQLITE_CACHE_SIZE', -64 * 1024)),
+}
+if not app.config['SQLALCHEMY_DATABASE_URI'].startswith('sqlite'):
+    app.config['SQLALCHEMY_ENGINE_OPTIONS'] = {
+        'pool_size': int(os.environ.get('DB_POOL_SIZE', 10)),
+        'max_overflow': int(os.environ.get('DB_MAX_OVERFLOW', 20)),
+        'pool_timeout': int(os.environ.get('DB_POOL_TIMEOUT', 30)),
+        'pool_recycle': int(os.environ.get('DB_POOL_RECYCLE', 1800)),
+        'pool_pre_ping': True,
+    }
+
+def apply_sqlite_pragmas(dbapi_connection, connection_record=None):
+    cursor = dbapi_connection.cursor()
+    for name, value in SQLITE_PRAGMAS.items():
+        cursor.execute(f'PRAGMA {name}={value}')
+    cursor.close()
+
+@event.listens_for(Engine, 'connect')
+def set_sqlite_pragmas(dbapi_connection, connection_record):
+    if isinstance(dbapi_connection, sqlite3.Connection):
+        apply_sqlite_pragmas(dbapi_connection)
 
 # Define metadata, instantiate db
 metadata = MetaData(naming_convention={
     "fk": "fk_%(table_name)s_%(column_0_name)s_%(referred_table_name)s",
 })
-db = SQLAlchemy(metadata=metadata)
-migrate = Migrate(app, db)
+db = SQLAlchemy(metadata=metadata, session_options={'class_': RoutingSession})
+def include_object(object, name, type_, reflected, compare_to):
+    """Keep autogenerate away from the FTS5 search table and its shadow tables, which migrations manage by hand."""
+    return not (type_ == 'table' and reflected and name.startswith('movie_search'))
+
+migrate = Migrate(app, db, include_object=include_object)
 db.init_app(app)
 
 
@@ -28,3 +103,9 @@ api = Api(app)
 
 # Instantiate CORS
 CORS(app)
+
+# Instantiate response cache
+cache = Cache.from_config(app.config)
+
+# Instantiate response compression
+compressor = Compressor.from_config(app.config)
@@ -0,0 +1,54 @@
+# Standard library imports
+import logging
+
+# Remote library imports
+from flask import g, request, has_request_context
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+logger = logging.getLogger(__name__)
+
+
+class QueryBudgetExceeded(Exception):
+    pass
+
+
+def count_query(conn, cursor, statement, parameters, context, executemany):
+    if has_request_context():
+        g.query_count = g.get('query_count', 0) + 1
+
+
+def query_budget(app):
+    """Return the query budget the current resource declares for this request's method."""
+    view = app.view_functions.get(request.endpoint)
+    budgets = getattr(getattr(view, 'view_class', None), 'query_budget', {})
+    return budgets.get(request.method.lower())
+
+
+def init_app(app):
+    """Count SQL statements per request and check them against each resource's `query_budget`.
+
+    The check only runs in debug or testing mode. Under testing a request that
+    goes over budget raises `QueryBudgetExceeded` so the test fails; in debug
+    mode it is logged and the count is echoed in an `X-Query-Count` header.
+    """
+    event.listen(Engine, 'before_cursor_execute', count_query)
+
+    @app.before_request
+    def reset_query_count():
+        g.query_count = 0
+
+    @app.after_request
+    def check_query_budget(response):
+        if not (app.debug or app.testing):
+            return response
+
+        count = g.get('query_count', 0)
+        budget = query_budget(app)
+        response.headers['X-Query-Count'] = str(count)
+        if budget is not None and count > budget:
+            message = f'{request.method} {request.path} ran {count} queries (budget {budget})'
+            if app.testing:
+                raise QueryBudgetExceeded(message)
+            logger.warning(message)
+        return response
@@ -0,0 +1,124 @@
+# Standard library imports
+import logging
+import threading
+import time
+from datetime import datetime, timedelta
+
+# Local imports
+from models import db, OverdueRental, ChangeLog
+from recommender import SimilarityIndex
+
+logger = logging.getLogger(__name__)
+
+
+def scan_overdue_rentals(app, full=False):
+    recorded = OverdueRental.scan(batch_size=app.config['OVERDUE_SCAN_BATCH_SIZE'], full=full)
+    if recorded:
+        logger.info('recorded %d overdue rentals', recorded)
+
+
+def prune_change_log(app):
+    pruned = ChangeLog.prune(datetime.utcnow() - timedelta(hours=app.config['CHANGE_LOG_RETENTION_HOURS']))
+    if pruned:
+        logger.info('pruned %d change log entries', pruned)
+
+
+def refresh_recommendations(app, full=False):
+    """Bring the similar-movies index up to date, rebuilding it when `full`.
+
+    The index keeps its rating matrix in this process between runs, so only
+    the first run (and each `full` one) reads every rating.
+    """
+    index = app.extensions.get('similarity_index')
+    if index is None:
+        index = app.extensions['similarity_index'] = SimilarityIndex(app.config['RECOMMENDER_NEIGHBOURS'])
+    rewritten = index.refresh(full=full)
+    if rewritten:
+        logger.info('rewrote the similar movies of %d movies', rewritten)
+
+
+class Scheduler:
+    """Run jobs at fixed intervals, one after another, on a single thread.
+
+    Each run gets its own app context and session, and an exception is
+    logged without stopping the schedule. Jobs must be idempotent: with the
+    scheduler running in several processes they'll run in each.
+    """
+
+    def __init__(self, app):
+        self.app = app
+        self.jobs = []
+        self.stopping = threading.Event()
+        self.thread = None
+
+    def every(self, seconds, job, delay=0.0, **kwargs):
+        """Run `job(app, **kwargs)` every `seconds`, the first time after `delay`."""
+        self.jobs.append({'interval': seconds, 'job': job, 'kwargs': kwargs, 'next_run': time.monotonic() + delay})
+
+    def once(self, job, **kwargs):
+        self.jobs.append({'interval': None, 'job': job, 'kwargs': kwargs, 'next_run': time.monotonic()})
+
+    def run_pending(self):
+        for entry in list(self.jobs):
+            if entry['next_run'] > time.monotonic():
+                continue
+            with self.app.app_context():
+                try:
+                    entry['job'](self.app, **entry['kwargs'])
+                except Exception:
+                    logger.exception('job %s failed', entry['job'].__name__)
+                    db.session.rollback()
+                finally:
+                    db.session.remove()
+            if entry['interval'] is None:
+                self.jobs.remove(entry)
+            else:
+                entry['next_run'] = time.monotonic() + entry['interval']
+
+    def run(self):
+        """Run jobs until `stop` is called; blocks the calling thread."""
+        while not self.stopping.is_set():
+            self.run_pending()
+            next_run = min((entry['next_run'] for entry in self.jobs), default=time.monotonic() + 1)
+            self.stopping.wait(max(0.0, next_run - time.monotonic()))
+
+    def start(self):
+        self.thread = threading.Thread(target=self.run, name='scheduler', daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        self.stopping.set()
+        if self.thread is not None:
+            self.thread.join()
+
+
+def scheduler_for(app):
+    """A scheduler with the app's jobs.
+
+    A full overdue scan and a full build of the similar-movies index run
+    straight away, then incremental ones every `OVERDUE_SCAN_INTERVAL` and
+    `RECOMMENDER_REFRESH_INTERVAL` seconds, with the index rebuilt every
+    `RECOMMENDER_REBUILD_INTERVAL`; the change log is pruned every
+    `CHANGE_LOG_PRUNE_INTERVAL` seconds.
+    """
+    interval = app.config['OVERDUE_SCAN_INTERVAL']
+    scheduler = Scheduler(app)
+    scheduler.once(scan_overdue_rentals, full=True)
+    scheduler.every(interval, scan_overdue_rentals, delay=interval)
+    scheduler.every(app.config['CHANGE_LOG_PRUNE_INTERVAL'], prune_change_log)
+    refresh, rebuild = app.config['RECOMMENDER_REFRESH_INTERVAL'], app.config['RECOMMENDER_REBUILD_INTERVAL']
+    scheduler.once(refresh_recommendations, full=True)
+    scheduler.every(refresh, refresh_recommendations, delay=refresh)
+    scheduler.every(rebuild, refresh_recommendations, delay=rebuild, full=True)
+    return scheduler
+
+
+def init_app(app):
+    """Start the scheduler on a daemon thread in this process when `RUN_SCHEDULER` is set.
+
+    With several web workers prefer one `python worker.py` process instead,
+    so the scans run once rather than in every worker.
+    """
+    if app.config['RUN_SCHEDULER']:
+        app.extensions['scheduler'] = scheduler = scheduler_for(app)
+        scheduler.start()
@@ -0,0 +1,222 @@
+# Standard library imports
+import cProfile
+import itertools
+import os
+import threading
+import time
+from bisect import bisect_left
+from collections import defaultdict
+from contextlib import contextmanager
+
+# Remote library imports
+from flask import g, request, has_request_context
+from flask.json.provider import DefaultJSONProvider
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+QUERY_COUNT_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100)
+QUANTILES = (0.5, 0.95, 0.99)
+
+
+class Histogram:
+    """Cumulative-bucket histogram, as Prometheus expects, with quantiles estimated from the buckets."""
+
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def quantile(self, q):
+        """Interpolate within the bucket holding the q-th observation, like PromQL's `histogram_quantile`."""
+        if not self.count:
+            return None
+        rank = q * self.count
+        seen = 0
+        for index, count in enumerate(self.counts):
+            if seen + count >= rank and count:
+                if index == len(self.buckets):
+                    return self.buckets[-1]
+                lower = self.buckets[index - 1] if index else 0.0
+                return lower + (self.buckets[index] - lower) * (rank - seen) / count
+            seen += count
+        return self.buckets[-1]
+
+    def lines(self, name, labels):
+        cumulative = 0
+        for bound, count in zip((*self.buckets, '+Inf'), self.counts):
+            cumulative += count
+            yield f'{name}_bucket{format_labels({**labels, "le": bound})} {cumulative}'
+        yield f'{name}_sum{format_labels(labels)} {self.sum}'
+        yield f'{name}_count{format_labels(labels)} {self.count}'
+
+
+def format_labels(labels):
+    if not labels:
+        return ''
+    escaped = (str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n') for value in labels.values())
+    return '{' + ','.join(f'{key}="{value}"' for key, value in zip(labels, escaped)) + '}'
+
+
+class Metrics:
+    """Per-process request metrics, keyed by route rule and method.
+
+    Each worker process keeps its own; Prometheus adds them up across the
+    scraped instances.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.requests = defaultdict(int)
+        self.latency = defaultdict(lambda: Histogram(LATENCY_BUCKETS))
+        self.db_time = defaultdict(lambda: Histogram(LATENCY_BUCKETS))
+        self.serialization_time = defaultdict(lambda: Histogram(LATENCY_BUCKETS))
+        self.query_count = defaultdict(lambda: Histogram(QUERY_COUNT_BUCKETS))
+
+    def record(self, endpoint, method, status, duration, queries, db_time, serialization_time):
+        key = (endpoint, method)
+        with self.lock:
+            self.requests[(endpoint, method, status)] += 1
+            self.latency[key].observe(duration)
+            self.db_time[key].observe(db_time)
+            self.serialization_time[key].observe(serialization_time)
+            self.query_count[key].observe(queries)
+
+    def render(self, extra=()):
+        """All metrics in the Prometheus text exposition format."""
+        lines = []
+        with self.lock:
+            lines += ['# HELP app_requests_total Requests served.', '# TYPE app_requests_total counter']
+            for (endpoint, method, status), count in sorted(self.requests.items()):
+                lines.append(f'app_requests_total{format_labels({"endpoint": endpoint, "method": method, "status": status})} {count}')
+
+            histograms = (
+                ('app_request_duration_seconds', 'Time from routing a request to returning its response.', self.latency),
+                ('app_request_db_seconds', 'Time spent executing SQL per request.', self.db_time),
+                ('app_request_serialization_seconds', 'Time spent serializing rows and encoding JSON per request.', self.serialization_time),
+                ('app_request_queries', 'SQL statements executed per request.', self.query_count),
+            )
+            for name, description, series in histograms:
+                lines += [f'# HELP {name} {description}', f'# TYPE {name} histogram']
+                for (endpoint, method), histogram in sorted(series.items()):
+                    lines += histogram.lines(name, {'endpoint': endpoint, 'method': method})
+
+            lines += [
+                '# HELP app_request_duration_quantile_seconds Request latency quantiles estimated from app_request_duration_seconds.',
+                '# TYPE app_request_duration_quantile_seconds gauge',
+            ]
+            for (endpoint, method), histogram in sorted(self.latency.items()):
+                for q in QUANTILES:
+                    lines.append(
+                        f'app_request_duration_quantile_seconds'
+                        f'{format_labels({"endpoint": endpoint, "method": method, "quantile": q})} {histogram.quantile(q)}'
+                    )
+        lines += extra
+        return '\n'.join(lines) + '\n'
+
+
+metrics = Metrics()
+
+
+def add_time(name, seconds):
+    if has_request_context():
+        setattr(g, name, g.get(name, 0.0) + seconds)
+
+
+@contextmanager
+def timed(name):
+    """Add the time spent in the block to the current request's `name` total."""
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        add_time(name, time.perf_counter() - started)
+
+
+class TimedJSONProvider(DefaultJSONProvider):
+    """Flask's JSON provider, counting the time spent encoding toward the request's serialization time."""
+
+    def dumps(self, obj, **kwargs):
+        with timed('serialization_time'):
+            return super().dumps(obj, **kwargs)
+
+
+def start_query(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault('query_started', []).append(time.perf_counter())
+
+
+def finish_query(conn, cursor, statement, parameters, context, executemany):
+    add_time('db_time', time.perf_counter() - conn.info['query_started'].pop())
+
+
+def fail_query(exception_context):
+    started = exception_context.connection.info.get('query_started') if exception_context.connection else None
+    if started:
+        add_time('db_time', time.perf_counter() - started.pop())
+
+
+def profile_dump_path(directory, duration):
+    endpoint = (request.url_rule.rule if request.url_rule else 'unmatched').strip('/').replace('/', '_').replace('<', '').replace('>', '').replace(':', '-')
+    return os.path.join(directory, f'{time.strftime("%Y%m%dT%H%M%S")}-{request.method}-{endpoint or "index"}-{duration * 1000:.0f}ms.pstats')
+
+
+def init_app(app):
+    """Record latency, SQL count, DB time and serialization time per request, for `/metrics` to render.
+
+    With `PROFILE_EVERY` set to N > 0, every N-th request runs under cProfile,
+    and it's written to `PROFILE_DIR` as a `.pstats` file if it took at least
+    `PROFILE_SLOW_MS`. The SQL count comes from `instrumentation`, which must
+    also be initialized.
+    """
+    event.listen(Engine, 'before_cursor_execute', start_query)
+    event.listen(Engine, 'after_cursor_execute', finish_query)
+    event.listen(Engine, 'handle_error', fail_query)
+
+    profile_every = app.config.get('PROFILE_EVERY', 0)
+    profile_slow = app.config.get('PROFILE_SLOW_MS', 100) / 1000
+    profile_dir = app.config.get('PROFILE_DIR', 'profiles')
+    request_numbers = itertools.count(1)
+
+    @app.before_request
+    def start_request():
+        g.request_started = time.perf_counter()
+        if profile_every and next(request_numbers) % profile_every == 0:
+            profiler = cProfile.Profile()
+            try:
+                profiler.enable()
+            except ValueError:
+                # Another profiler is already running in this process (Python 3.12+ allows one).
+                return
+            g.profiler = profiler
+
+    @app.after_request
+    def record_request(response):
+        finish_request(response.status_code)
+        return response
+
+    @app.teardown_request
+    def record_failed_request(exception):
+        if exception is not None and not g.get('request_recorded'):
+            finish_request(500)
+
+    def finish_request(status):
+        g.request_recorded = True
+        duration = time.perf_counter() - g.get('request_started', time.perf_counter())
+        endpoint = request.url_rule.rule if request.url_rule else 'unmatched'
+        metrics.record(
+            endpoint, request.method, status, duration,
+            g.get('query_count', 0), g.get('db_time', 0.0), g.get('serialization_time', 0.0),
+        )
+
+        profiler = g.pop('profiler', None)
+        if profiler is not None:
+            profiler.disable()
+            if duration >= profile_slow:
+                os.makedirs(profile_dir, exist_ok=True)
+                profiler.dump_stats(profile_dump_path(profile_dir, duration))
@@ -97,6 +97,12 @@ def run_migrations_online():
     connectable = get_engine()
 
     with connectable.connect() as connection:
+        if connection.dialect.name == 'sqlite':
+            # Batch migrations rebuild a SQLite table by copying it and dropping
+            # the original, which with enforcement on would cascade into its children.
+            connection.exec_driver_sql('PRAGMA foreign_keys=OFF')
+            # End the transaction the pragma began, or Alembic would run inside it and never commit.
+            connection.commit()
         context.configure(
             connection=connection,
             target_metadata=get_metadata(),
@@ -0,0 +1,58 @@
+"""change log
+
+Revision ID: 026694dbada6
+Revises: e72da8e43625
+Create Date: 2026-10-18 19:55:28.201096
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '026694dbada6'
+down_revision = 'e72da8e43625'
+branch_labels = None
+depends_on = None
+
+# The columns each trigger logs, as they are at this revision.
+COLUMNS = {
+    'users': ('id', 'name', 'email'),
+    'movies': ('id', 'title', 'genre', 'release_year', 'image'),
+    'rentals': ('id', 'user_id', 'movie_id', 'due_date'),
+    'ratings': ('id', 'user_id', 'movie_id', 'rating', 'review', 'created_at'),
+}
+ACTIONS = (('insert', 'INSERT', 'new'), ('update', 'UPDATE', 'new'), ('delete', 'DELETE', 'old'))
+
+
+def upgrade():
+    op.create_table('change_log',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('table_name', sa.String(length=50), nullable=False),
+    sa.Column('row_id', sa.Integer(), nullable=False),
+    sa.Column('action', sa.String(length=10), nullable=False),
+    sa.Column('data', sa.JSON(), nullable=False),
+    sa.Column('created_at', sa.DateTime(), nullable=False),
+    sa.PrimaryKeyConstraint('id'),
+    sqlite_autoincrement=True
+    )
+
+    # The triggers that fill the log are SQLite-only, like the search index's.
+    if op.get_bind().dialect.name != 'sqlite':
+        return
+    for table, columns in COLUMNS.items():
+        for action, statement, row in ACTIONS:
+            values = ', '.join(f"'{column}', {row}.{column}" for column in columns)
+            op.execute(
+                f"CREATE TRIGGER change_log_{table}_{action} AFTER {statement} ON {table} BEGIN "
+                f"INSERT INTO change_log (table_name, row_id, action, data, created_at) "
+                f"VALUES ('{table}', {row}.id, '{action}', json_object({values}), datetime('now')); END"
+            )
+
+
+def downgrade():
+    if op.get_bind().dialect.name == 'sqlite':
+        for table in COLUMNS:
+            for action, _, _ in ACTIONS:
+                op.execute(f'DROP TRIGGER IF EXISTS change_log_{table}_{action}')
+    op.drop_table('change_log')
@@ -0,0 +1,35 @@
+"""overdue rentals
+
+Revision ID: 0f3869a47b40
+Revises: cd51db899578
+Create Date: 2026-10-18 19:41:15.222147
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0f3869a47b40'
+down_revision = 'cd51db899578'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('overdue_rentals',
+    sa.Column('rental_id', sa.Integer(), autoincrement=False, nullable=False),
+    sa.Column('user_id', sa.Integer(), nullable=False),
+    sa.Column('due_date', sa.DateTime(), nullable=False),
+    sa.Column('detected_at', sa.DateTime(), nullable=False),
+    sa.ForeignKeyConstraint(['rental_id'], ['rentals.id'], name=op.f('fk_overdue_rentals_rental_id_rentals')),
+    sa.PrimaryKeyConstraint('rental_id')
+    )
+    op.create_index('ix_overdue_rentals_due_date', 'overdue_rentals', ['due_date'], unique=False)
+    op.create_index('ix_overdue_rentals_user_id', 'overdue_rentals', ['user_id'], unique=False)
+
+
+def downgrade():
+    op.drop_index('ix_overdue_rentals_user_id', table_name='overdue_rentals')
+    op.drop_index('ix_overdue_rentals_due_date', table_name='overdue_rentals')
+    op.drop_table('overdue_rentals')
@@ -0,0 +1,72 @@
+"""movie search
+
+Revision ID: 32c877f86c4b
+Revises: 3f1c9a7d2e64
+Create Date: 2026-10-18 19:40:12.104257
+
+"""
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision = '32c877f86c4b'
+down_revision = '3f1c9a7d2e64'
+branch_labels = None
+depends_on = None
+
+TRIGGERS = (
+    'movie_search_movies_insert', 'movie_search_movies_update', 'movie_search_movies_delete',
+    'movie_search_ratings_insert', 'movie_search_ratings_update', 'movie_search_ratings_delete',
+)
+
+
+def upgrade():
+    # FTS5 is SQLite-only; other databases go without the search index.
+    if op.get_bind().dialect.name != 'sqlite':
+        return
+    op.execute(
+        "CREATE VIRTUAL TABLE movie_search USING fts5("
+        "title, genre, reviews, tokenize = 'unicode61 remove_diacritics 2', prefix = '2 3 4')"
+    )
+    op.execute("INSERT INTO movie_search (movie_search, rank) VALUES ('rank', 'bm25(10.0, 5.0, 1.0)')")
+    op.execute(
+        "CREATE TRIGGER movie_search_movies_insert AFTER INSERT ON movies BEGIN "
+        "INSERT INTO movie_search (rowid, title, genre, reviews) VALUES (new.id, new.title, new.genre, ''); END"
+    )
+    op.execute(
+        "CREATE TRIGGER movie_search_movies_update AFTER UPDATE OF title, genre ON movies BEGIN "
+        "UPDATE movie_search SET title = new.title, genre = new.genre WHERE rowid = new.id; END"
+    )
+    op.execute(
+        "CREATE TRIGGER movie_search_movies_delete AFTER DELETE ON movies BEGIN "
+        "DELETE FROM movie_search WHERE rowid = old.id; END"
+    )
+    op.execute(
+        "CREATE TRIGGER movie_search_ratings_insert AFTER INSERT ON ratings WHEN new.review IS NOT NULL BEGIN "
+        "UPDATE movie_search SET reviews = reviews || ' ' || new.review WHERE rowid = new.movie_id; END"
+    )
+    op.execute(
+        "CREATE TRIGGER movie_search_ratings_update AFTER UPDATE OF review, movie_id ON ratings BEGIN "
+        "UPDATE movie_search SET reviews = (SELECT coalesce(group_concat(review, ' '), '') FROM ratings WHERE movie_id = old.movie_id) WHERE rowid = old.movie_id; "
+        "UPDATE movie_search SET reviews = (SELECT coalesce(group_concat(review, ' '), '') FROM ratings WHERE movie_id = new.movie_id) WHERE rowid = new.movie_id; END"
+    )
+    op.execute(
+        "CREATE TRIGGER movie_search_ratings_delete AFTER DELETE ON ratings WHEN old.review IS NOT NULL BEGIN "
+        "UPDATE movie_search SET reviews = (SELECT coalesce(group_concat(review, ' '), '') FROM ratings WHERE movie_id = old.movie_id) WHERE rowid = old.movie_id; END"
+    )
+    # Backfill the movies and reviews already in the database.
+    op.execute(
+        "INSERT INTO movie_search (rowid, title, genre, reviews) "
+        "SELECT movies.id, movies.title, movies.genre, "
+        "coalesce((SELECT group_concat(review, ' ') FROM ratings WHERE ratings.movie_id = movies.id), '') "
+        "FROM movies"
+    )
+    op.execute("INSERT INTO movie_search (movie_search) VALUES ('optimize')")
+
+
+def downgrade():
+    if op.get_bind().dialect.name != 'sqlite':
+        return
+    for trigger in TRIGGERS:
+        op.execute(f'DROP TRIGGER IF EXISTS {trigger}')
+    op.execute('DROP TABLE IF EXISTS movie_search')
@@ -0,0 +1,36 @@
+"""table versions
+
+Revision ID: 3f1c9a7d2e64
+Revises: ca70a5151fd4
+Create Date: 2026-10-18 11:20:05.581934
+
+"""
+from datetime import datetime
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '3f1c9a7d2e64'
+down_revision = 'ca70a5151fd4'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    table_versions = op.create_table('table_versions',
+    sa.Column('name', sa.String(length=50), nullable=False),
+    sa.Column('version', sa.Integer(), nullable=False),
+    sa.Column('updated_at', sa.DateTime(), nullable=False),
+    sa.PrimaryKeyConstraint('name')
+    )
+    now = datetime.utcnow()
+    op.bulk_insert(table_versions, [
+        {'name': name, 'version': 1, 'updated_at': now}
+        for name in ('users', 'movies', 'rentals', 'ratings', 'movie_rating_stats')
+    ])
+
+
+def downgrade():
+    op.drop_table('table_versions')
@@ -0,0 +1,33 @@
+"""movie similarities
+
+Revision ID: 47cd011466b4
+Revises: ad5ff29045b5
+Create Date: 2026-10-18 20:08:49.917145
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '47cd011466b4'
+down_revision = 'ad5ff29045b5'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('movie_similarities',
+    sa.Column('movie_id', sa.Integer(), autoincrement=False, nullable=False),
+    sa.Column('similar_movie_id', sa.Integer(), autoincrement=False, nullable=False),
+    sa.Column('score', sa.Float(), nullable=False),
+    sa.ForeignKeyConstraint(['movie_id'], ['movies.id'], name=op.f('fk_movie_similarities_movie_id_movies'), ondelete='CASCADE'),
+    sa.ForeignKeyConstraint(['similar_movie_id'], ['movies.id'], name=op.f('fk_movie_similarities_similar_movie_id_movies'), ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('movie_id', 'similar_movie_id')
+    )
+    op.create_index('ix_movie_similarities_similar_movie_id', 'movie_similarities', ['similar_movie_id'], unique=False)
+
+
+def downgrade():
+    op.drop_index('ix_movie_similarities_similar_movie_id', table_name='movie_similarities')
+    op.drop_table('movie_similarities')
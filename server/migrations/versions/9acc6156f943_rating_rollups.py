@@ -0,0 +1,42 @@
+"""rating rollups
+
+Revision ID: 9acc6156f943
+Revises: 47cd011466b4
+Create Date: 2026-10-18 20:25:42.657751
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '9acc6156f943'
+down_revision = '47cd011466b4'
+branch_labels = None
+depends_on = None
+
+
+# The tables start empty; `python backfill.py` fills them from the ratings already recorded.
+def upgrade():
+    op.create_table('genre_rating_rollups',
+    sa.Column('genre', sa.String(length=50), nullable=False),
+    sa.Column('period', sa.String(length=4), nullable=False),
+    sa.Column('start', sa.Date(), nullable=False),
+    sa.Column('count', sa.Integer(), nullable=False),
+    sa.Column('sum', sa.Integer(), nullable=False),
+    sa.PrimaryKeyConstraint('genre', 'period', 'start')
+    )
+    op.create_table('rating_rollups',
+    sa.Column('movie_id', sa.Integer(), autoincrement=False, nullable=False),
+    sa.Column('period', sa.String(length=4), nullable=False),
+    sa.Column('start', sa.Date(), nullable=False),
+    sa.Column('count', sa.Integer(), nullable=False),
+    sa.Column('sum', sa.Integer(), nullable=False),
+    sa.ForeignKeyConstraint(['movie_id'], ['movies.id'], name=op.f('fk_rating_rollups_movie_id_movies'), ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('movie_id', 'period', 'start')
+    )
+
+
+def downgrade():
+    op.drop_table('rating_rollups')
+    op.drop_table('genre_rating_rollups')
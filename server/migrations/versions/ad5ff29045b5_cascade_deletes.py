@@ -0,0 +1,84 @@
+"""cascade deletes
+
+Revision ID: ad5ff29045b5
+Revises: 026694dbada6
+Create Date: 2026-10-18 20:00:20.958931
+
+"""
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision = 'ad5ff29045b5'
+down_revision = '026694dbada6'
+branch_labels = None
+depends_on = None
+
+# (table, column, referred table) of every foreign key that now cascades deletes.
+FOREIGN_KEYS = (
+    ('movie_inventory', 'movie_id', 'movies'),
+    ('movie_rating_stats', 'movie_id', 'movies'),
+    ('overdue_rentals', 'rental_id', 'rentals'),
+    ('ratings', 'movie_id', 'movies'),
+    ('ratings', 'user_id', 'users'),
+    ('rentals', 'movie_id', 'movies'),
+    ('rentals', 'user_id', 'users'),
+    ('user_summaries', 'user_id', 'users'),
+)
+
+# SQLite rebuilds `ratings` and `rentals` to change their foreign keys, which
+# drops their triggers; these put them back as they are at this revision.
+CHANGE_LOG_COLUMNS = {
+    'rentals': ('id', 'user_id', 'movie_id', 'due_date'),
+    'ratings': ('id', 'user_id', 'movie_id', 'rating', 'review', 'created_at'),
+}
+SEARCH_TRIGGERS = (
+    "CREATE TRIGGER movie_search_ratings_insert AFTER INSERT ON ratings WHEN new.review IS NOT NULL BEGIN "
+    "UPDATE movie_search SET reviews = reviews || ' ' || new.review WHERE rowid = new.movie_id; END",
+    "CREATE TRIGGER movie_search_ratings_update AFTER UPDATE OF review, movie_id ON ratings BEGIN "
+    "UPDATE movie_search SET reviews = (SELECT coalesce(group_concat(review, ' '), '') FROM ratings WHERE movie_id = old.movie_id) WHERE rowid = old.movie_id; "
+    "UPDATE movie_search SET reviews = (SELECT coalesce(group_concat(review, ' '), '') FROM ratings WHERE movie_id = new.movie_id) WHERE rowid = new.movie_id; END",
+)
+SEARCH_DELETE_TRIGGER = (
+    "CREATE TRIGGER movie_search_ratings_delete AFTER DELETE ON ratings WHEN old.review IS NOT NULL{condition} BEGIN "
+    "UPDATE movie_search SET reviews = (SELECT coalesce(group_concat(review, ' '), '') FROM ratings WHERE movie_id = old.movie_id) WHERE rowid = old.movie_id; END"
+)
+
+
+def alter_foreign_keys(ondelete):
+    for table in sorted({table for table, _, _ in FOREIGN_KEYS}):
+        with op.batch_alter_table(table, schema=None) as batch_op:
+            for _, column, referred in (key for key in FOREIGN_KEYS if key[0] == table):
+                name = f'fk_{table}_{column}_{referred}'
+                batch_op.drop_constraint(batch_op.f(name), type_='foreignkey')
+                batch_op.create_foreign_key(batch_op.f(name), referred, [column], ['id'], ondelete=ondelete)
+
+
+def recreate_triggers(search_delete_condition):
+    for table, columns in CHANGE_LOG_COLUMNS.items():
+        for action, statement, row in (('insert', 'INSERT', 'new'), ('update', 'UPDATE', 'new'), ('delete', 'DELETE', 'old')):
+            values = ', '.join(f"'{column}', {row}.{column}" for column in columns)
+            op.execute(f'DROP TRIGGER IF EXISTS change_log_{table}_{action}')
+            op.execute(
+                f"CREATE TRIGGER change_log_{table}_{action} AFTER {statement} ON {table} BEGIN "
+                f"INSERT INTO change_log (table_name, row_id, action, data, created_at) "
+                f"VALUES ('{table}', {row}.id, '{action}', json_object({values}), datetime('now')); END"
+            )
+    for action in ('insert', 'update', 'delete'):
+        op.execute(f'DROP TRIGGER IF EXISTS movie_search_ratings_{action}')
+    for statement in SEARCH_TRIGGERS:
+        op.execute(statement)
+    op.execute(SEARCH_DELETE_TRIGGER.format(condition=search_delete_condition))
+
+
+def upgrade():
+    alter_foreign_keys('CASCADE')
+    if op.get_bind().dialect.name == 'sqlite':
+        # A rating deleted along with its movie leaves nothing to re-index.
+        recreate_triggers(' AND EXISTS (SELECT 1 FROM movies WHERE id = old.movie_id)')
+
+
+def downgrade():
+    alter_foreign_keys(None)
+    if op.get_bind().dialect.name == 'sqlite':
+        recreate_triggers('')
@@ -0,0 +1,33 @@
+"""foreign key and filter indexes
+
+Revision ID: ca70a5151fd4
+Revises: ed8ef5897582
+Create Date: 2026-10-18 10:02:47.118530
+
+"""
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision = 'ca70a5151fd4'
+down_revision = 'ed8ef5897582'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_index('ix_movies_genre', 'movies', ['genre'], unique=False)
+    op.create_index('ix_rentals_user_id_due_date', 'rentals', ['user_id', 'due_date'], unique=False)
+    op.create_index('ix_rentals_movie_id', 'rentals', ['movie_id'], unique=False)
+    op.create_index('ix_rentals_due_date', 'rentals', ['due_date'], unique=False)
+    op.create_index('ix_ratings_movie_id_created_at', 'ratings', ['movie_id', 'created_at'], unique=False)
+    op.create_index('ix_ratings_user_id_movie_id', 'ratings', ['user_id', 'movie_id'], unique=False)
+
+
+def downgrade():
+    op.drop_index('ix_ratings_user_id_movie_id', table_name='ratings')
+    op.drop_index('ix_ratings_movie_id_created_at', table_name='ratings')
+    op.drop_index('ix_rentals_due_date', table_name='rentals')
+    op.drop_index('ix_rentals_movie_id', table_name='rentals')
+    op.drop_index('ix_rentals_user_id_due_date', table_name='rentals')
+    op.drop_index('ix_movies_genre', table_name='movies')
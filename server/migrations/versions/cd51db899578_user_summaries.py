@@ -0,0 +1,45 @@
+"""user summaries
+
+Revision ID: cd51db899578
+Revises: 32c877f86c4b
+Create Date: 2026-10-18 20:05:47.218530
+
+"""
+from datetime import datetime
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'cd51db899578'
+down_revision = '32c877f86c4b'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('user_summaries',
+    sa.Column('user_id', sa.Integer(), nullable=False),
+    sa.Column('active_rentals', sa.Integer(), nullable=False),
+    sa.Column('overdue_rentals', sa.Integer(), nullable=False),
+    sa.Column('next_due_date', sa.DateTime(), nullable=True),
+    sa.Column('ratings_count', sa.Integer(), nullable=False),
+    sa.Column('ratings_sum', sa.Integer(), nullable=False),
+    sa.ForeignKeyConstraint(['user_id'], ['users.id'], name=op.f('fk_user_summaries_user_id_users')),
+    sa.PrimaryKeyConstraint('user_id')
+    )
+
+    # Backfill from the rentals and ratings already recorded.
+    op.get_bind().execute(sa.text(
+        "INSERT INTO user_summaries (user_id, active_rentals, overdue_rentals, next_due_date, ratings_count, ratings_sum) "
+        "SELECT users.id, COALESCE(r.active, 0), COALESCE(r.overdue, 0), r.next_due, COALESCE(g.count, 0), COALESCE(g.sum, 0) "
+        "FROM users "
+        "LEFT JOIN (SELECT user_id, COUNT(*) AS active, SUM(CASE WHEN due_date < :now THEN 1 ELSE 0 END) AS overdue, "
+        "MIN(CASE WHEN due_date >= :now THEN due_date END) AS next_due FROM rentals GROUP BY user_id) AS r ON r.user_id = users.id "
+        "LEFT JOIN (SELECT user_id, COUNT(*) AS count, SUM(rating) AS sum FROM ratings GROUP BY user_id) AS g ON g.user_id = users.id"
+    ), {'now': str(datetime.now())})
+
+
+def downgrade():
+    op.drop_table('user_summaries')
@@ -0,0 +1,37 @@
+"""movie inventory
+
+Revision ID: e72da8e43625
+Revises: 0f3869a47b40
+Create Date: 2026-10-18 19:47:07.211007
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'e72da8e43625'
+down_revision = '0f3869a47b40'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('movie_inventory',
+    sa.Column('movie_id', sa.Integer(), autoincrement=False, nullable=False),
+    sa.Column('copies', sa.Integer(), nullable=False),
+    sa.CheckConstraint('copies >= 0', name='ck_movie_inventory_copies'),
+    sa.ForeignKeyConstraint(['movie_id'], ['movies.id'], name=op.f('fk_movie_inventory_movie_id_movies')),
+    sa.PrimaryKeyConstraint('movie_id')
+    )
+
+    # Movies without a row hold the default 5 copies; give the ones already
+    # rented out more often than that as many copies as they have rentals.
+    op.execute(
+        "INSERT INTO movie_inventory (movie_id, copies) "
+        "SELECT movie_id, COUNT(*) FROM rentals GROUP BY movie_id HAVING COUNT(*) > 5"
+    )
+
+
+def downgrade():
+    op.drop_table('movie_inventory')
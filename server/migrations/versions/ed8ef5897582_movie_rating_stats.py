@@ -0,0 +1,50 @@
+"""movie rating stats
+
+Revision ID: ed8ef5897582
+Revises: 0b863e093303
+Create Date: 2026-10-18 09:12:31.402118
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'ed8ef5897582'
+down_revision = '0b863e093303'
+branch_labels = None
+depends_on = None
+
+BUCKETS = [f'bucket_{score}' for score in range(1, 11)]
+
+
+def upgrade():
+    op.create_table('movie_rating_stats',
+    sa.Column('movie_id', sa.Integer(), nullable=False),
+    sa.Column('genre', sa.String(length=50), nullable=False),
+    sa.Column('count', sa.Integer(), nullable=False),
+    sa.Column('sum', sa.Integer(), nullable=False),
+    sa.Column('mean', sa.Float(), nullable=True),
+    *[sa.Column(bucket, sa.Integer(), nullable=False) for bucket in BUCKETS],
+    sa.ForeignKeyConstraint(['movie_id'], ['movies.id'], name=op.f('fk_movie_rating_stats_movie_id_movies')),
+    sa.PrimaryKeyConstraint('movie_id')
+    )
+    op.create_index('ix_movie_rating_stats_genre_mean', 'movie_rating_stats', ['genre', 'mean'], unique=False)
+    op.create_index('ix_movie_rating_stats_mean', 'movie_rating_stats', ['mean'], unique=False)
+
+    # Backfill from the ratings already recorded.
+    buckets = ', '.join(
+        f'SUM(CASE WHEN ratings.rating = {score} THEN 1 ELSE 0 END)' for score in range(1, 11)
+    )
+    op.execute(
+        f"INSERT INTO movie_rating_stats (movie_id, genre, count, sum, mean, {', '.join(BUCKETS)}) "
+        f"SELECT movies.id, movies.genre, COUNT(ratings.id), SUM(ratings.rating), AVG(ratings.rating), {buckets} "
+        "FROM movies JOIN ratings ON ratings.movie_id = movies.id "
+        "GROUP BY movies.id, movies.genre"
+    )
+
+
+def downgrade():
+    op.drop_index('ix_movie_rating_stats_mean', table_name='movie_rating_stats')
+    op.drop_index('ix_movie_rating_stats_genre_mean', table_name='movie_rating_stats')
+    op.drop_table('movie_rating_stats')
@@ -1,9 +1,12 @@
 from sqlalchemy_serializer import SerializerMixin
 from sqlalchemy.ext.associationproxy import association_proxy
-from sqlalchemy.orm import validates
-from sqlalchemy import func
+from sqlalchemy.orm import validates, Session
+from sqlalchemy import func, case, event, inspect, tuple_, bindparam
 from config import db
-from datetime import datetime
+from serializers import DATETIME_FORMAT
+from validation import USER_SCHEMA, MOVIE_SCHEMA, RENTAL_SCHEMA, RATING_SCHEMA
+from collections import defaultdict
+from datetime import datetime, timedelta
 import re
 
 class User(db.Model, SerializerMixin):
@@ -13,25 +16,16 @@ class User(db.Model, SerializerMixin):
     name = db.Column(db.String(100), nullable=False)
     email = db.Column(db.String(100), unique=True, nullable=False)
 
-    rentals = db.relationship('Rental', back_populates='user', cascade="all, delete-orphan")
-    ratings = db.relationship('Rating', back_populates='user', cascade="all, delete-orphan")
+    # The foreign keys cascade in the database, so deleting a user doesn't load its rows to delete them one by one.
+    rentals = db.relationship('Rental', back_populates='user', cascade="all, delete-orphan", passive_deletes=True)
+    ratings = db.relationship('Rating', back_populates='user', cascade="all, delete-orphan", passive_deletes=True)
+    summary = db.relationship('UserSummary', back_populates='user', uselist=False, cascade="all, delete-orphan", passive_deletes=True)
 
-    serialize_rules = ('-rentals', '-ratings')
+    serialize_rules = ('-rentals', '-ratings', '-summary')
 
-    @validates("name")
-    def validates_name(self, key, name):
-        if isinstance(name, str) and 0 <= len(name) <= 100:
-            return name.strip()
-        else:
-            raise ValueError("Name must be a string with 2 to 100 characters.")
-            
-    @validates("email")
-    def validates_email(self, key, email):
-        email_regex = r'^\b[A-Za-z0-9._%+-]+@[A-Za-z0-9.-]+\.[A-Z|a-z]{2,}\b'
-        if isinstance(email, str) and re.match(email_regex, email):
-            return email.strip().lower()
-        else:
-            raise ValueError("Email must be a valid email address.")
+    @validates(*USER_SCHEMA.fields)
+    def validates_field(self, key, value):
+        return USER_SCHEMA.validate_field(key, value)
 
     def __repr__(self):
         return f'<User {self.id}: {self.name}>'
@@ -46,40 +40,21 @@ class Movie(db.Model, SerializerMixin):
     release_year = db.Column(db.Integer, nullable=False)  
     image = db.Column(db.String)
 
-    rentals = db.relationship('Rental', back_populates='movie', cascade="all, delete-orphan")
-    ratings = db.relationship('Rating', back_populates='movie', cascade="all, delete-orphan")
-
-
-    serialize_rules = ('-rentals', '-ratings')  
-
-    @validates("title")
-    def validates_title(self, key, title):
-        if isinstance(title, str) and 1 < len(title) <= 100:
-            return title.strip()
-        else:
-            raise ValueError("Title must be a string with more than 1 character and up to 100 characters.")
+    rentals = db.relationship('Rental', back_populates='movie', cascade="all, delete-orphan", passive_deletes=True)
+    ratings = db.relationship('Rating', back_populates='movie', cascade="all, delete-orphan", passive_deletes=True)
+    rating_stats = db.relationship('MovieRatingStats', back_populates='movie', uselist=False, cascade="all, delete-orphan", passive_deletes=True)
+    inventory = db.relationship('MovieInventory', back_populates='movie', uselist=False, cascade="all, delete-orphan", passive_deletes=True)
 
-    @validates("genre")
-    def validates_genre(self, key, genre):
-        if isinstance(genre, str) and 1 < len(genre) <= 50:
-            return genre.strip()
-        else:
-            raise ValueError("Genre must be a string with more than 1 character and up to 50 characters.")
 
-    @validates("release_year")
-    def validates_release_year(self, key, release_year):
-        current_year = datetime.now().year
-        if isinstance(release_year, int) and 1800 <= release_year <= current_year:
-            return release_year
-        else:
-            raise ValueError(f"Release year must be an integer between 1800 and {current_year}.")
+    serialize_rules = ('-rentals', '-ratings', '-rating_stats', '-inventory')  
 
-    @validates("image")
-    def validates_image(self, key, image):
-        if not isinstance(image, str) or not image.strip():
-            raise ValueError("Image must be a non-empty string.")
-        return image
+    __table_args__ = (
+        db.Index('ix_movies_genre', 'genre'),
+    )
 
+    @validates(*MOVIE_SCHEMA.fields)
+    def validates_field(self, key, value):
+        return MOVIE_SCHEMA.validate_field(key, value)
 
     def __repr__(self):
         return f'<Movie {self.id}: {self.title}>'
@@ -90,8 +65,8 @@ class Rental(db.Model, SerializerMixin):
     __tablename__ = "rentals"
 
     id = db.Column(db.Integer, primary_key=True)
-    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
-    movie_id = db.Column(db.Integer, db.ForeignKey('movies.id'), nullable=False)
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id', ondelete='CASCADE'), nullable=False)
+    movie_id = db.Column(db.Integer, db.ForeignKey('movies.id', ondelete='CASCADE'), nullable=False)
     due_date = db.Column(db.DateTime, nullable=True)
 
     movie = db.relationship('Movie', back_populates='rentals')  
@@ -99,36 +74,15 @@ class Rental(db.Model, SerializerMixin):
 
     serialize_rules = ('-movie', '-user')  
 
-    @validates("user_id")
-    def validates_user_id(self, key, user_id):
-        if isinstance(user_id, int) and user_id > 0:
-            return user_id
-        else:
-            raise ValueError("User ID must be a positive integer.")
-
-    @validates('movie_id')
-    def validate_movie_id(self, key, movie_id):
-        if movie_id is None:
-            raise ValueError("Movie ID cannot be None.")
-        return movie_id
-
-    @validates("due_date")
-    def validates_due_date(self, key, due_date):
-        if due_date is None:
-            return None  
-        if isinstance(due_date, (datetime, str)):
-            if isinstance(due_date, str):
-                try:
-                    due_date = datetime.fromisoformat(due_date)
-                except ValueError:
-                    raise ValueError("Due date must be a valid ISO 8601 date string or a `datetime` object.")
-            if due_date > datetime.now():
-                return due_date
-            else:
-                raise ValueError("Due date must be in the future.")
-        else:
-            raise ValueError("Due date must be a valid `datetime` object or an ISO 8601 string.")
+    __table_args__ = (
+        db.Index('ix_rentals_user_id_due_date', 'user_id', 'due_date'),
+        db.Index('ix_rentals_movie_id', 'movie_id'),
+        db.Index('ix_rentals_due_date', 'due_date'),
+    )
 
+    @validates(*RENTAL_SCHEMA.fields)
+    def validates_field(self, key, value):
+        return RENTAL_SCHEMA.validate_field(key, value)
 
     def __repr__(self):
         return f'<Rental {self.id}>'
@@ -138,8 +92,8 @@ class Rating(db.Model, SerializerMixin):
     __tablename__ = "ratings"
 
     id = db.Column(db.Integer, primary_key=True)
-    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
-    movie_id = db.Column(db.Integer, db.ForeignKey('movies.id'), nullable=False)
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id', ondelete='CASCADE'), nullable=False)
+    movie_id = db.Column(db.Integer, db.ForeignKey('movies.id', ondelete='CASCADE'), nullable=False)
     rating = db.Column(db.Integer, nullable=False)
     review = db.Column(db.Text, nullable=True)
 
@@ -148,36 +102,989 @@ class Rating(db.Model, SerializerMixin):
     movie = db.relationship('Movie', back_populates='ratings')  
     user = db.relationship('User', back_populates='ratings') 
 
+    serialize_rules = ('-movie.rentals', '-movie.ratings', '-user.rentals', '-user.ratings')
 
-    @validates("user_id")
-    def validates_user_id(self, key, user_id):
-        if isinstance(user_id, int) and user_id > 0:
-            return user_id
-        else:
-            raise ValueError("User ID must be a positive integer.")
+    __table_args__ = (
+        db.Index('ix_ratings_movie_id_created_at', 'movie_id', 'created_at'),
+        db.Index('ix_ratings_user_id_movie_id', 'user_id', 'movie_id'),
+    )
 
-    @validates("movie_id")
-    def validates_movie_id(self, key, movie_id):
-        if isinstance(movie_id, int) and movie_id > 0:
-            return movie_id
-        else:
-            raise ValueError("Movie ID must be a positive integer.")
 
-    @validates("rating")
-    def validates_rating(self, key, rating):
-        if isinstance(rating, int) and 1 <= rating <= 10:
-            return rating
+    @validates(*RATING_SCHEMA.fields)
+    def validates_field(self, key, value):
+        return RATING_SCHEMA.validate_field(key, value)
+
+    def __repr__(self):
+        return f'<Rating {self.id}>'
+
+
+class MovieRatingStats(db.Model):
+    __tablename__ = "movie_rating_stats"
+
+    movie_id = db.Column(db.Integer, db.ForeignKey('movies.id', ondelete='CASCADE'), primary_key=True)
+    genre = db.Column(db.String(50), nullable=False)
+    count = db.Column(db.Integer, nullable=False, default=0)
+    sum = db.Column(db.Integer, nullable=False, default=0)
+    mean = db.Column(db.Float, nullable=True)
+
+    bucket_1 = db.Column(db.Integer, nullable=False, default=0)
+    bucket_2 = db.Column(db.Integer, nullable=False, default=0)
+    bucket_3 = db.Column(db.Integer, nullable=False, default=0)
+    bucket_4 = db.Column(db.Integer, nullable=False, default=0)
+    bucket_5 = db.Column(db.Integer, nullable=False, default=0)
+    bucket_6 = db.Column(db.Integer, nullable=False, default=0)
+    bucket_7 = db.Column(db.Integer, nullable=False, default=0)
+    bucket_8 = db.Column(db.Integer, nullable=False, default=0)
+    bucket_9 = db.Column(db.Integer, nullable=False, default=0)
+    bucket_10 = db.Column(db.Integer, nullable=False, default=0)
+
+    movie = db.relationship('Movie', back_populates='rating_stats')
+
+    __table_args__ = (
+        db.Index('ix_movie_rating_stats_genre_mean', 'genre', 'mean'),
+        db.Index('ix_movie_rating_stats_mean', 'mean'),
+    )
+
+    EMPTY = {'count': 0, 'sum': 0, 'mean': None, 'histogram': [0] * 10}
+
+    @classmethod
+    def record(cls, movie_id, rating, delta=1, session=None):
+        """Add (or with a negative `delta`, remove) `delta` ratings of `rating` for a movie.
+
+        The counters are bumped in a single UPDATE so concurrent writers never
+        lose increments; the row is created on a movie's first rating. Writes
+        go through `session`, which defaults to the request's `db.session`.
+        """
+        session = session or db.session
+        bucket = f'bucket_{rating}'
+        count = cls.count + delta
+        total = cls.sum + delta * rating
+        updated = session.execute(
+            db.update(cls)
+            .where(cls.movie_id == movie_id)
+            .values({
+                cls.count: count,
+                cls.sum: total,
+                cls.mean: case((count > 0, total * 1.0 / count), else_=None),
+                getattr(cls, bucket): getattr(cls, bucket) + delta,
+            })
+            .execution_options(synchronize_session=False)
+        )
+        if updated.rowcount == 0 and delta > 0:
+            movie = session.get(Movie, movie_id)
+            session.add(cls(movie=movie, genre=movie.genre, count=delta, sum=delta * rating, mean=float(rating), **{bucket: delta}))
+            session.flush()
+
+    @classmethod
+    def record_ratings(cls, *criteria, sign=1):
+        """Add (or with `sign=-1`, remove) every rating matching `criteria`, grouped in one query.
+
+        Returns the ids of the movies whose stats changed.
+        """
+        groups = db.session.execute(
+            db.select(Rating.movie_id, Rating.rating, func.count())
+            .where(*criteria)
+            .group_by(Rating.movie_id, Rating.rating)
+        ).all()
+        for movie_id, rating, count in groups:
+            cls.record(movie_id, rating, sign * count)
+        return {movie_id for movie_id, _, _ in groups}
+
+    @classmethod
+    def rebuild(cls):
+        """Recompute every movie's stats from `ratings` with one INSERT ... SELECT."""
+        buckets = [f'bucket_{score}' for score in range(1, 11)]
+        db.session.execute(db.delete(cls))
+        db.session.execute(db.insert(cls).from_select(
+            ['movie_id', 'genre', 'count', 'sum', 'mean', *buckets],
+            db.select(
+                Movie.id, Movie.genre, func.count(Rating.id), func.sum(Rating.rating), func.avg(Rating.rating),
+                *[func.sum(case((Rating.rating == score, 1), else_=0)) for score in range(1, 11)],
+            ).join(Rating, Rating.movie_id == Movie.id).group_by(Movie.id, Movie.genre),
+        ))
+
+    @classmethod
+    def forget_user(cls, user_id):
+        """Take every rating `user_id` has given back out of the stats; return the movies touched."""
+        return cls.record_ratings(Rating.user_id == user_id, sign=-1)
+
+    @property
+    def histogram(self):
+        return [getattr(self, f'bucket_{score}') for score in range(1, 11)]
+
+    def to_dict(self):
+        return {'count': self.count, 'sum': self.sum, 'mean': self.mean, 'histogram': self.histogram}
+
+    def __repr__(self):
+        return f'<MovieRatingStats {self.movie_id}: {self.mean}>'
+
+
+
+class MovieInventory(db.Model):
+    """How many copies of a movie the store holds; movies without a row have `DEFAULT_COPIES`.
+
+    A rental holds a copy until it's deleted, so the copies out are the
+    movie's rentals, counted off `ix_rentals_movie_id` (a count no bigger
+    than the copies held). Only the total is stored, so there's no counter
+    for the many rental write paths to keep in step.
+    """
+    __tablename__ = "movie_inventory"
+
+    DEFAULT_COPIES = 5
+
+    movie_id = db.Column(db.Integer, db.ForeignKey('movies.id', ondelete='CASCADE'), primary_key=True, autoincrement=False)
+    copies = db.Column(db.Integer, nullable=False)
+
+    movie = db.relationship('Movie', back_populates='inventory')
+
+    __table_args__ = (
+        db.CheckConstraint('copies >= 0', name='ck_movie_inventory_copies'),
+    )
+
+    @classmethod
+    def copies_of(cls, movie_id):
+        return func.coalesce(db.select(cls.copies).where(cls.movie_id == movie_id).scalar_subquery(), cls.DEFAULT_COPIES)
+
+    @staticmethod
+    def rented(movie_id):
+        return db.select(func.count()).select_from(Rental).where(Rental.movie_id == movie_id).scalar_subquery()
+
+    @classmethod
+    def availability(cls, movie_ids, session=None):
+        """{movie_id: {'copies', 'rented', 'available'}} for the movies in `movie_ids` that exist, in one query."""
+        rows = (session or db.session).execute(
+            db.select(Movie.id, cls.copies_of(Movie.id), cls.rented(Movie.id)).where(Movie.id.in_(movie_ids))
+        ).all()
+        return {id: {'copies': copies, 'rented': rented, 'available': max(copies - rented, 0)} for id, copies, rented in rows}
+
+    @staticmethod
+    def lock(movie_ids, session=None):
+        """Lock the movies' rows until the transaction ends, so concurrent checkouts of them queue up.
+
+        SQLite has no row locks and needs none: it runs one write transaction
+        at a time, and a transaction that read before another's commit can't
+        write after it.
+        """
+        session = session or db.session
+        if session.get_bind(Movie).dialect.name != 'sqlite':
+            session.execute(db.select(Movie.id).where(Movie.id.in_(movie_ids)).order_by(Movie.id).with_for_update())
+
+    @classmethod
+    def checkout(cls, user_id, movie_id, due_date, session=None):
+        """Rent a copy of `movie_id` to `user_id` if one is free; return the new rental's id, or None.
+
+        The availability check and the insert are one INSERT ... SELECT, so
+        there's no window between them for another checkout. On SQLite it's
+        the transaction's first statement, so it waits for the write lock
+        instead of failing on a stale read. None means the user or movie
+        doesn't exist or every copy is out.
+        """
+        session = session or db.session
+        cls.lock([movie_id], session)
+        rental_id = session.execute(
+            db.insert(Rental).from_select(
+                ['user_id', 'movie_id', 'due_date'],
+                db.select(
+                    db.literal(user_id, db.Integer), db.literal(movie_id, db.Integer), db.literal(due_date, db.DateTime),
+                ).where(
+                    db.select(User.id).where(User.id == user_id).exists(),
+                    db.select(Movie.id).where(Movie.id == movie_id).exists(),
+                    cls.rented(movie_id) < cls.copies_of(movie_id),
+                ),
+            ).returning(Rental.id)
+        ).scalar()
+        if rental_id is not None:
+            UserSummary.refresh([user_id], session)
+        return rental_id
+
+    def __repr__(self):
+        return f'<MovieInventory {self.movie_id}: {self.copies}>'
+
+
+class UserSummary(db.Model):
+    __tablename__ = "user_summaries"
+
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id', ondelete='CASCADE'), primary_key=True)
+    active_rentals = db.Column(db.Integer, nullable=False, default=0)
+    overdue_rentals = db.Column(db.Integer, nullable=False, default=0)
+    next_due_date = db.Column(db.DateTime, nullable=True)
+    ratings_count = db.Column(db.Integer, nullable=False, default=0)
+    ratings_sum = db.Column(db.Integer, nullable=False, default=0)
+
+    user = db.relationship('User', back_populates='summary')
+
+    EMPTY = {'active_rentals': 0, 'overdue_rentals': 0, 'next_due_date': None, 'ratings_count': 0, 'average_rating': None}
+
+    @staticmethod
+    def computed(user_ids, now):
+        """Select each user's summary columns from `rentals` and `ratings`, grouped in one statement.
+
+        Every rental counts as active (rentals have no returned state); the
+        overdue ones are those due before `now`.
+        """
+        rentals = (
+            db.select(
+                Rental.user_id,
+                func.count().label('active_rentals'),
+                func.sum(case((Rental.due_date < now, 1), else_=0)).label('overdue_rentals'),
+                func.min(case((Rental.due_date >= now, Rental.due_date))).label('next_due_date'),
+            )
+            .where(Rental.user_id.in_(user_ids))
+            .group_by(Rental.user_id)
+            .subquery()
+        )
+        ratings = (
+            db.select(Rating.user_id, func.count().label('ratings_count'), func.sum(Rating.rating).label('ratings_sum'))
+            .where(Rating.user_id.in_(user_ids))
+            .group_by(Rating.user_id)
+            .subquery()
+        )
+        return (
+            db.select(
+                User.id.label('user_id'),
+                func.coalesce(rentals.c.active_rentals, 0).label('active_rentals'),
+                func.coalesce(rentals.c.overdue_rentals, 0).label('overdue_rentals'),
+                rentals.c.next_due_date,
+                func.coalesce(ratings.c.ratings_count, 0).label('ratings_count'),
+                func.coalesce(ratings.c.ratings_sum, 0).label('ratings_sum'),
+            )
+            .outerjoin(rentals, rentals.c.user_id == User.id)
+            .outerjoin(ratings, ratings.c.user_id == User.id)
+            .where(User.id.in_(user_ids))
+        )
+
+    @classmethod
+    def refresh(cls, user_ids, connection=None):
+        """Recompute the summaries of `user_ids` from their rentals and ratings.
+
+        Users that no longer exist lose their row. Runs on `connection` when
+        given (as from a flush hook), else on `db.session`.
+        """
+        execute = (connection or db.session).execute
+        user_ids = sorted(user_ids)
+        for start in range(0, len(user_ids), 500):
+            chunk = user_ids[start:start + 500]
+            execute(db.delete(cls.__table__).where(cls.__table__.c.user_id.in_(chunk)))
+            execute(db.insert(cls.__table__).from_select(cls.__table__.columns.keys(), cls.computed(chunk, datetime.now())))
+
+    @classmethod
+    def rebuild(cls):
+        """Recompute every user's summary with one INSERT ... SELECT."""
+        db.session.execute(db.delete(cls))
+        db.session.execute(db.insert(cls).from_select(cls.__table__.columns.keys(), cls.computed(db.select(User.id), datetime.now())))
+
+    @staticmethod
+    def users_of(model, *criteria):
+        """The ids of the users owning the rentals or ratings matching `criteria`."""
+        return set(db.session.scalars(db.select(model.user_id).where(*criteria).distinct()))
+
+    @classmethod
+    def for_users(cls, user_ids):
+        """{user_id: summary dict} for `user_ids`, in one query.
+
+        A stored summary only goes stale without a write when a rental falls
+        due, which first happens at its `next_due_date`. Those rows are
+        recomputed for the response (in a single grouped query) rather than
+        written back from a read.
+        """
+        now = datetime.now()
+        rows = {row.user_id: row for row in db.session.execute(db.select(*cls.__table__.columns).where(cls.user_id.in_(user_ids)))}
+        stale = [row.user_id for row in rows.values() if row.next_due_date is not None and row.next_due_date <= now]
+        if stale:
+            rows.update((row.user_id, row) for row in db.session.execute(cls.computed(stale, now)))
+        return {user_id: cls.as_dict(row) for user_id, row in rows.items()}
+
+    @staticmethod
+    def as_dict(row):
+        return {
+            'active_rentals': row.active_rentals,
+            'overdue_rentals': row.overdue_rentals,
+            'next_due_date': row.next_due_date.strftime(DATETIME_FORMAT) if row.next_due_date else None,
+            'ratings_count': row.ratings_count,
+            'average_rating': row.ratings_sum / row.ratings_count if row.ratings_count else None,
+        }
+
+    def __repr__(self):
+        return f'<UserSummary {self.user_id}>'
+
+
+class OverdueRental(db.Model):
+    """A rental found past its due date by the background scan, with when it was found.
+
+    `scan` fills the table; reads of overdue rentals come from here rather
+    than from a range over every rental's due date. A rental leaves the table
+    when it's deleted (through the foreign key's cascade) or its due date
+    changes (write paths call `forget`), and is picked up again by the next
+    scan if it's still overdue.
+    """
+    __tablename__ = "overdue_rentals"
+
+    rental_id = db.Column(db.Integer, db.ForeignKey('rentals.id', ondelete='CASCADE'), primary_key=True, autoincrement=False)
+    user_id = db.Column(db.Integer, nullable=False)
+    due_date = db.Column(db.DateTime, nullable=False)
+    detected_at = db.Column(db.DateTime, nullable=False)
+
+    __table_args__ = (
+        db.Index('ix_overdue_rentals_user_id', 'user_id'),
+        db.Index('ix_overdue_rentals_due_date', 'due_date'),
+    )
+
+    @classmethod
+    def scan(cls, now=None, batch_size=500, full=False):
+        """Record every rental that has fallen due by `now`; return how many were newly recorded.
+
+        Rentals are read off `ix_rentals_due_date` in keyset-paged batches of
+        `batch_size`, each committed on its own so no transaction stays open
+        for long. Due dates are validated to be in the future when written, so
+        a rental only becomes overdue as time passes: an incremental scan
+        starts from the latest due date already recorded. A `full` scan reads
+        from the beginning and also drops rows whose rental no longer exists.
+        """
+        now = now or datetime.now()
+        criteria = [Rental.due_date < now]
+        if full:
+            db.session.execute(db.delete(cls).where(cls.rental_id.not_in(db.select(Rental.id))))
+            db.session.commit()
         else:
-            raise ValueError("Rating must be an integer between 1 and 10.")
-
-    @validates("review")
-    def validates_review(self, key, review):
-        if review is None:
-            return None  
-        if isinstance(review, str) and 0 < len(review) <= 500:
-            return review
+            watermark = db.session.scalar(db.select(func.max(cls.due_date)))
+            if watermark is not None:
+                criteria.append(Rental.due_date >= watermark)
+
+        recorded, cursor = 0, None
+        while True:
+            statement = db.select(Rental.id, Rental.user_id, Rental.due_date).where(*criteria)
+            if cursor is not None:
+                statement = statement.where(tuple_(Rental.due_date, Rental.id) > cursor)
+            batch = db.session.execute(statement.order_by(Rental.due_date, Rental.id).limit(batch_size)).all()
+            if not batch:
+                break
+            known = set(db.session.scalars(db.select(cls.rental_id).where(cls.rental_id.in_([row.id for row in batch]))))
+            rows = [
+                {'rental_id': row.id, 'user_id': row.user_id, 'due_date': row.due_date, 'detected_at': now}
+                for row in batch if row.id not in known
+            ]
+            if rows:
+                db.session.execute(db.insert(cls), rows)
+            db.session.commit()
+            recorded += len(rows)
+            cursor = (batch[-1].due_date, batch[-1].id)
+        return recorded
+
+    @classmethod
+    def forget(cls, rental_ids, connection=None):
+        """Drop the records of `rental_ids`, on `connection` when given (as from a flush hook), else on `db.session`."""
+        execute = (connection or db.session).execute
+        rental_ids = sorted(rental_ids)
+        for start in range(0, len(rental_ids), 500):
+            execute(db.delete(cls.__table__).where(cls.__table__.c.rental_id.in_(rental_ids[start:start + 500])))
+
+    def __repr__(self):
+        return f'<OverdueRental {self.rental_id}>'
+
+
+class MovieSimilarity(db.Model):
+    """One of a movie's nearest neighbours by how users rated them, with the cosine similarity of the two.
+
+    `recommender.SimilarityIndex` computes each movie's top neighbours and
+    keeps the table in step with `ratings`; the similar-movies and
+    recommendations endpoints only ever read it. A deleted movie's rows, on
+    either side, go with it through the foreign keys' cascade.
+    """
+    __tablename__ = "movie_similarities"
+
+    movie_id = db.Column(db.Integer, db.ForeignKey('movies.id', ondelete='CASCADE'), primary_key=True, autoincrement=False)
+    similar_movie_id = db.Column(db.Integer, db.ForeignKey('movies.id', ondelete='CASCADE'), primary_key=True, autoincrement=False)
+    score = db.Column(db.Float, nullable=False)
+
+    __table_args__ = (
+        # Without it, every movie deleted would scan the table for the rows naming it as a neighbour.
+        db.Index('ix_movie_similarities_similar_movie_id', 'similar_movie_id'),
+    )
+
+    @classmethod
+    def similar_to(cls, movie_id, limit):
+        """Select (movie_id, score) of the `limit` movies most like `movie_id`."""
+        return (
+            db.select(cls.similar_movie_id.label('movie_id'), cls.score)
+            .where(cls.movie_id == movie_id)
+            .order_by(cls.score.desc(), cls.similar_movie_id)
+            .limit(limit)
+        )
+
+    @classmethod
+    def recommended_for(cls, user_id, limit):
+        """Select (movie_id, score) of the `limit` movies to recommend to `user_id`.
+
+        Every movie the user rated votes for its neighbours, with their
+        similarity times how far the user's rating is above the movie's
+        mean, so the neighbours of movies they rated below average count
+        against. Movies the user has rated and those scoring nothing are left out.
+        """
+        score = func.sum(cls.score * (Rating.rating - MovieRatingStats.mean))
+        return (
+            db.select(cls.similar_movie_id.label('movie_id'), score.label('score'))
+            .join(Rating, Rating.movie_id == cls.movie_id)
+            .join(MovieRatingStats, MovieRatingStats.movie_id == cls.movie_id)
+            .where(
+                Rating.user_id == user_id,
+                cls.similar_movie_id.not_in(db.select(Rating.movie_id).where(Rating.user_id == user_id)),
+            )
+            .group_by(cls.similar_movie_id)
+            .having(score > 0)
+            .order_by(score.desc(), cls.similar_movie_id)
+            .limit(limit)
+        )
+
+    @classmethod
+    def replace(cls, neighbours, complete=False, session=None):
+        """Store `neighbours`, {movie_id: [(similar_movie_id, score), ...]}, in place of those movies' rows.
+
+        With `complete`, `neighbours` covers every movie and all other rows go too.
+        """
+        session = session or db.session
+        movie_ids = sorted(neighbours)
+        if complete:
+            session.execute(db.delete(cls))
         else:
-            raise ValueError("Review must be a string with up to 500 characters.")
+            for start in range(0, len(movie_ids), 500):
+                session.execute(db.delete(cls).where(cls.movie_id.in_(movie_ids[start:start + 500])))
+        rows = [
+            {'movie_id': movie_id, 'similar_movie_id': similar_movie_id, 'score': score}
+            for movie_id in movie_ids for similar_movie_id, score in neighbours[movie_id]
+        ]
+        # The Core insert, several times faster per row than the ORM's bulk one.
+        for start in range(0, len(rows), 10000):
+            session.execute(cls.__table__.insert(), rows[start:start + 10000])
 
     def __repr__(self):
-        return f'<Rating {self.id}>'
\ No newline at end of file
+        return f'<MovieSimilarity {self.movie_id} ~ {self.similar_movie_id}: {self.score}>'
+
+
+# The Monday starting the week of a date, in each database's SQL; `add_to_periods` agrees.
+WEEK_STARTS = {
+    'sqlite': lambda day: func.date(day, 'weekday 0', '-6 days'),
+    'postgresql': lambda day: func.date(func.date_trunc('week', day)),
+    'mysql': lambda day: func.subdate(day, func.weekday(day)),
+}
+
+
+def add_to_periods(deltas, key, day, count, total, sign=1):
+    """Add `count` ratings summing to `total` given on `day` to `deltas` at `key` plus (period, start) of its day and week."""
+    for period, start in (('day', day), ('week', day - timedelta(days=day.weekday()))):
+        entry = deltas[(*key, period, start)]
+        entry[0] += sign * count
+        entry[1] += sign * total
+
+
+def add_to_rollup(model, deltas, session):
+    """Add `deltas`, {primary key: [count, sum]}, to the rows of `model`, one of the rating rollups.
+
+    The rows that exist are found with one query per chunk of keys and
+    updated with one executemany UPDATE; the rest go in with one INSERT.
+    Rows left with no ratings are deleted.
+    """
+    table = model.__table__
+    key_columns = list(table.primary_key.columns)
+    update = (
+        table.update()
+        .where(*[column == bindparam(f'key_{column.key}') for column in key_columns])
+        .values(count=table.c.count + bindparam('count_delta'), sum=table.c.sum + bindparam('sum_delta'))
+    )
+    keys = [key for key, (count, total) in deltas.items() if count or total]
+    for start in range(0, len(keys), 500):
+        chunk = keys[start:start + 500]
+        existing = {tuple(row) for row in session.execute(db.select(*key_columns).where(tuple_(*key_columns).in_(chunk)))}
+        updates, inserts = [], []
+        for key in chunk:
+            count, total = deltas[key]
+            if key in existing:
+                updates.append({**{f'key_{column.key}': value for column, value in zip(key_columns, key)}, 'count_delta': count, 'sum_delta': total})
+            elif count > 0:
+                inserts.append({**{column.key: value for column, value in zip(key_columns, key)}, 'count': count, 'sum': total})
+        if updates:
+            session.execute(update, updates)
+        if inserts:
+            session.execute(table.insert(), inserts)
+        if any(deltas[key][0] < 0 for key in chunk):
+            session.execute(table.delete().where(tuple_(*key_columns).in_(chunk), table.c.count <= 0))
+
+
+def rollup_series(model, criterion, period, first=None, last=None, limit=None):
+    """Select (start, count, sum) of the `limit` latest `period` rows of a rating rollup matching `criterion`, starting from `first` to `last`."""
+    statement = db.select(model.start, model.count, model.sum).where(criterion, model.period == period)
+    if first is not None:
+        statement = statement.where(model.start >= first)
+    if last is not None:
+        statement = statement.where(model.start <= last)
+    return statement.order_by(model.start.desc()).limit(limit)
+
+
+class RatingRollup(db.Model):
+    """How many ratings a movie was given, and their sum, each day and each week (weeks start on Monday).
+
+    Kept in step with `ratings` by the same write paths as `MovieRatingStats`,
+    along with `GenreRatingRollup`, the same totals per genre, so a trend reads
+    a row per day or week instead of every rating. Days are the dates of
+    `created_at` as stored. A deleted movie's rows go with it through the
+    foreign key's cascade; `rebuild` backfills them from `ratings`.
+    """
+    __tablename__ = "rating_rollups"
+
+    PERIODS = ('day', 'week')
+
+    movie_id = db.Column(db.Integer, db.ForeignKey('movies.id', ondelete='CASCADE'), primary_key=True, autoincrement=False)
+    period = db.Column(db.String(4), primary_key=True)
+    start = db.Column(db.Date, primary_key=True)
+    count = db.Column(db.Integer, nullable=False)
+    sum = db.Column(db.Integer, nullable=False)
+
+    @staticmethod
+    def grouped(*criteria):
+        """Select (movie_id, genre, day, count, sum) of the ratings matching `criteria`, per movie and day."""
+        day = func.date(Rating.created_at, type_=db.Date)
+        return (
+            db.select(Rating.movie_id, Movie.genre, day, func.count(), func.sum(Rating.rating))
+            .join(Movie, Movie.id == Rating.movie_id)
+            .where(*criteria)
+            .group_by(Rating.movie_id, Movie.genre, day)
+        )
+
+    @classmethod
+    def record_ratings(cls, *criteria, sign=1, session=None):
+        """Add (or with `sign=-1`, remove) every rating matching `criteria` to the movie and genre rollups, grouped in one query."""
+        session = session or db.session
+        movies, genres = defaultdict(lambda: [0, 0]), defaultdict(lambda: [0, 0])
+        for movie_id, genre, day, count, total in session.execute(cls.grouped(*criteria)):
+            add_to_periods(movies, (movie_id,), day, count, total, sign)
+            add_to_periods(genres, (genre,), day, count, total, sign)
+        add_to_rollup(cls, movies, session)
+        add_to_rollup(GenreRatingRollup, genres, session)
+
+    @classmethod
+    def rebuild(cls, batch_size=1000, session=None):
+        """Recompute every movie's rollups from `ratings`, then the genres' from them; return how many rows were written.
+
+        Movies are done `batch_size` at a time, each batch in a transaction of
+        its own, so writers are never held up for long: a rating written
+        between batches lands in rows that are either rebuilt already or yet to
+        be. A batch's days are grouped from `ratings` and its weeks from the
+        days, each with one INSERT ... SELECT; the genres' rollups are summed
+        from the movies' at the end, in one go.
+        """
+        session = session or db.session
+        written, after = 0, 0
+        while True:
+            movie_ids = session.scalars(db.select(Movie.id).where(Movie.id > after).order_by(Movie.id).limit(batch_size)).all()
+            if not movie_ids:
+                break
+            first, after = movie_ids[0], movie_ids[-1]
+            # Deleting first takes the write lock, so no rating lands between the reads and the inserts.
+            session.execute(db.delete(cls).where(cls.movie_id.between(first, after)).execution_options(synchronize_session=False))
+            day = func.date(Rating.created_at)
+            written += session.execute(db.insert(cls).from_select(
+                ['movie_id', 'period', 'start', 'count', 'sum'],
+                db.select(Rating.movie_id, db.literal('day'), day, func.count(), func.sum(Rating.rating))
+                .where(Rating.movie_id.between(first, after))
+                .group_by(Rating.movie_id, day),
+            )).rowcount
+            week = WEEK_STARTS[session.get_bind(cls).dialect.name](cls.start)
+            written += session.execute(db.insert(cls).from_select(
+                ['movie_id', 'period', 'start', 'count', 'sum'],
+                db.select(cls.movie_id, db.literal('week'), week, func.sum(cls.count), func.sum(cls.sum))
+                .where(cls.movie_id.between(first, after), cls.period == 'day')
+                .group_by(cls.movie_id, week),
+            )).rowcount
+            session.commit()
+        written += GenreRatingRollup.rebuild(session)
+        session.commit()
+        return written
+
+    def __repr__(self):
+        return f'<RatingRollup {self.movie_id} {self.period} {self.start}: {self.count}>'
+
+
+class GenreRatingRollup(db.Model):
+    """`RatingRollup` summed over the movies of each genre, kept in step along with it.
+
+    A movie's rollups move with it when its genre changes, and are taken out
+    before it's deleted.
+    """
+    __tablename__ = "genre_rating_rollups"
+
+    genre = db.Column(db.String(50), primary_key=True)
+    period = db.Column(db.String(4), primary_key=True)
+    start = db.Column(db.Date, primary_key=True)
+    count = db.Column(db.Integer, nullable=False)
+    sum = db.Column(db.Integer, nullable=False)
+
+    @classmethod
+    def totals(cls, genre):
+        """Select (count, sum) of every rating of `genre`'s movies, added up from its weekly rows."""
+        return db.select(func.sum(cls.count), func.sum(cls.sum)).where(cls.genre == genre, cls.period == 'week')
+
+    @staticmethod
+    def movie_rollups(movie_ids, session):
+        """Yield (movie_id, genre, period, start, count, sum) of every rollup row of `movie_ids`."""
+        movie_ids = sorted(movie_ids)
+        for start in range(0, len(movie_ids), 500):
+            yield from session.execute(
+                db.select(RatingRollup.movie_id, Movie.genre, RatingRollup.period, RatingRollup.start, RatingRollup.count, RatingRollup.sum)
+                .join(Movie, Movie.id == RatingRollup.movie_id)
+                .where(RatingRollup.movie_id.in_(movie_ids[start:start + 500]))
+            )
+
+    @classmethod
+    def forget_movies(cls, movie_ids, session=None):
+        """Take the ratings of `movie_ids`, about to be deleted, out of their genres' rollups."""
+        session = session or db.session
+        deltas = defaultdict(lambda: [0, 0])
+        for _, genre, period, start, count, total in cls.movie_rollups(movie_ids, session):
+            deltas[(genre, period, start)][0] -= count
+            deltas[(genre, period, start)][1] -= total
+        add_to_rollup(cls, deltas, session)
+
+    @classmethod
+    def move(cls, previous, session=None):
+        """Move the ratings of the movies in `previous`, {movie_id: genre before an update}, to the genres they have now."""
+        session = session or db.session
+        current = dict(session.execute(db.select(Movie.id, Movie.genre).where(Movie.id.in_(list(previous)))).all())
+        moved = [movie_id for movie_id, genre in current.items() if genre != previous[movie_id]]
+        deltas = defaultdict(lambda: [0, 0])
+        for movie_id, genre, period, start, count, total in cls.movie_rollups(moved, session):
+            for key, sign in (((previous[movie_id], period, start), -1), ((genre, period, start), 1)):
+                deltas[key][0] += sign * count
+                deltas[key][1] += sign * total
+        add_to_rollup(cls, deltas, session)
+
+    @classmethod
+    def rebuild(cls, session=None):
+        """Recompute every genre's rollups from its movies' with one INSERT ... SELECT; return how many rows were written."""
+        session = session or db.session
+        session.execute(db.delete(cls).execution_options(synchronize_session=False))
+        return session.execute(db.insert(cls).from_select(
+            ['genre', 'period', 'start', 'count', 'sum'],
+            db.select(Movie.genre, RatingRollup.period, RatingRollup.start, func.sum(RatingRollup.count), func.sum(RatingRollup.sum))
+            .join(Movie, Movie.id == RatingRollup.movie_id)
+            .group_by(Movie.genre, RatingRollup.period, RatingRollup.start),
+        )).rowcount
+
+    def __repr__(self):
+        return f'<GenreRatingRollup {self.genre} {self.period} {self.start}: {self.count}>'
+
+
+class ChangeLog(db.Model):
+    """Append-only log of row-level changes to the tables clients mirror, read by the `/changes` feed.
+
+    Triggers on `users`, `movies`, `rentals` and `ratings` write the entries,
+    so every write path (ORM flushes, bulk statements, checkouts, cascades,
+    raw SQL) is logged in the same transaction as the change itself. `data`
+    holds the row's values after an insert or update and before a delete.
+    Ids are never reused, so a client resumes from the last one it saw;
+    `prune` drops entries older than the retention. Like the search index,
+    the triggers exist only on SQLite.
+    """
+    __tablename__ = "change_log"
+
+    TABLES = ('users', 'movies', 'rentals', 'ratings')
+    ACTIONS = (('insert', 'INSERT', 'new'), ('update', 'UPDATE', 'new'), ('delete', 'DELETE', 'old'))
+
+    id = db.Column(db.Integer, primary_key=True)
+    table_name = db.Column(db.String(50), nullable=False)
+    row_id = db.Column(db.Integer, nullable=False)
+    action = db.Column(db.String(10), nullable=False)
+    data = db.Column(db.JSON, nullable=False)
+    created_at = db.Column(db.DateTime, nullable=False)
+
+    __table_args__ = {'sqlite_autoincrement': True}
+
+    @classmethod
+    def triggers(cls):
+        """(name, CREATE TRIGGER statement) for each action on each of `TABLES`, logging every column of the row."""
+        for table_name in cls.TABLES:
+            columns = db.metadata.tables[table_name].columns
+            for action, statement, row in cls.ACTIONS:
+                name = f'change_log_{table_name}_{action}'
+                values = ', '.join(f"'{column.name}', {row}.{column.name}" for column in columns)
+                yield name, (
+                    f"CREATE TRIGGER IF NOT EXISTS {name} AFTER {statement} ON {table_name} BEGIN "
+                    f"INSERT INTO change_log (table_name, row_id, action, data, created_at) "
+                    f"VALUES ('{table_name}', {row}.id, '{action}', json_object({values}), datetime('now')); END"
+                )
+
+    @classmethod
+    def create_triggers(cls, connection):
+        for _, statement in cls.triggers():
+            connection.exec_driver_sql(statement)
+
+    @classmethod
+    def drop_triggers(cls, connection):
+        """Stop logging changes, so bulk loads skip a log entry per row; `create_triggers` starts again."""
+        for name, _ in cls.triggers():
+            connection.exec_driver_sql(f"DROP TRIGGER IF EXISTS {name}")
+
+    @classmethod
+    def since(cls, after, limit, tables=None, session=None):
+        """Up to `limit` entries after id `after`, oldest first, only for `tables` when given."""
+        statement = db.select(cls).where(cls.id > after)
+        if tables:
+            statement = statement.where(cls.table_name.in_(tables))
+        return (session or db.session).scalars(statement.order_by(cls.id).limit(limit)).all()
+
+    @classmethod
+    def resume_point(cls, after, session=None):
+        """(cursor, pruned) for a feed resuming after id `after`, or starting from now if it's None.
+
+        `pruned` is true when entries after `after` have already been pruned,
+        so the client has to reload its data; the feed then carries on from
+        the oldest entry still kept.
+        """
+        session = session or db.session
+        if after is None:
+            return session.scalar(db.select(func.max(cls.id))) or 0, False
+        oldest = session.scalar(db.select(func.min(cls.id)))
+        if oldest is not None and oldest > after + 1:
+            return oldest - 1, True
+        return after, False
+
+    @classmethod
+    def prune(cls, before):
+        """Delete the entries logged before `before` (UTC); return how many went.
+
+        The newest entry is always kept, so a client whose cursor predates
+        the oldest one left can tell that it missed some.
+        """
+        newest = db.session.scalar(db.select(func.max(cls.id)))
+        if newest is None:
+            return 0
+        # Entries are logged in id order, so the first one to keep bounds the delete without an index on created_at.
+        keep = db.session.scalar(db.select(cls.id).where(cls.created_at >= before).order_by(cls.id).limit(1))
+        deleted = db.session.execute(db.delete(cls).where(cls.id < (keep or newest))).rowcount
+        db.session.commit()
+        return deleted
+
+    def to_dict(self):
+        columns = db.metadata.tables[self.table_name].columns
+        row = {
+            key: datetime.fromisoformat(value).strftime(DATETIME_FORMAT)
+            if value is not None and isinstance(columns[key].type, db.DateTime) else value
+            for key, value in self.data.items()
+        }
+        return {'id': self.id, 'table': self.table_name, 'action': self.action, 'row': row}
+
+    def __repr__(self):
+        return f'<ChangeLog {self.id}: {self.action} {self.table_name} {self.row_id}>'
+
+
+class TableVersion(db.Model):
+    __tablename__ = "table_versions"
+
+    name = db.Column(db.String(50), primary_key=True)
+    version = db.Column(db.Integer, nullable=False, default=0)
+    updated_at = db.Column(db.DateTime, nullable=False)
+
+    @classmethod
+    def bump(cls, connection, names):
+        """Increment the version of each table in `names`, creating counters on first use."""
+        table = cls.__table__
+        now = datetime.utcnow()
+        for name in names:
+            updated = connection.execute(
+                table.update().where(table.c.name == name).values(version=table.c.version + 1, updated_at=now)
+            )
+            if updated.rowcount == 0:
+                connection.execute(table.insert().values(name=name, version=1, updated_at=now))
+
+    @classmethod
+    def current(cls, names, session=None):
+        """{name: (version, updated_at)} for `names`, read in a single query."""
+        rows = (session or db.session).execute(db.select(cls.name, cls.version, cls.updated_at).where(cls.name.in_(names))).all()
+        return {name: (version, updated_at) for name, version, updated_at in rows}
+
+    def __repr__(self):
+        return f'<TableVersion {self.name}: {self.version}>'
+
+
+CASCADES = {}
+
+
+def cascaded_tables(names):
+    """The tables losing rows, through ON DELETE CASCADE foreign keys followed transitively, when rows of `names` are deleted.
+
+    The database deletes those rows itself, so no flush or statement of the
+    session's ever names their tables; their versions are bumped along with
+    the deleted rows' own.
+    """
+    if not CASCADES:
+        for table in db.metadata.tables.values():
+            for key in table.foreign_keys:
+                if (key.ondelete or '').upper() == 'CASCADE':
+                    CASCADES.setdefault(key.column.table.name, set()).add(table.name)
+    found, pending = set(), list(names)
+    while pending:
+        for child in CASCADES.get(pending.pop(), ()):
+            if child not in found:
+                found.add(child)
+                pending.append(child)
+    return found
+
+
+@event.listens_for(Session, 'after_flush')
+def bump_flushed_tables(session, flush_context):
+    deleted = {obj.__table__.name for obj in session.deleted}
+    tables = {obj.__table__.name for obj in session.new} | deleted | cascaded_tables(deleted)
+    tables |= {obj.__table__.name for obj in session.dirty if session.is_modified(obj)}
+    tables.discard(TableVersion.__tablename__)
+    if tables:
+        TableVersion.bump(session.connection(), sorted(tables))
+
+
+@event.listens_for(Session, 'after_flush')
+def refresh_flushed_user_summaries(session, flush_context):
+    """Recompute the summaries of the users whose rentals or ratings this flush wrote.
+
+    Bulk statements skip the flush; the bulk resources refresh their users themselves.
+    """
+    user_ids = set()
+    for obj in session.new | session.deleted | session.dirty:
+        if isinstance(obj, (Rental, Rating)):
+            user_ids.add(obj.user_id)
+            user_ids.update(inspect(obj).attrs.user_id.history.deleted)
+    user_ids.discard(None)
+    if user_ids:
+        UserSummary.refresh(user_ids, session.connection())
+
+
+@event.listens_for(Session, 'after_flush')
+def forget_rescheduled_overdue_rentals(session, flush_context):
+    """Drop the overdue records of rentals this flush gave a new due date; deleted rentals' records go by cascade.
+
+    Bulk statements skip the flush; the bulk resources forget their rentals themselves.
+    """
+    rental_ids = {
+        obj.id for obj in session.dirty
+        if isinstance(obj, Rental) and inspect(obj).attrs.due_date.history.has_changes()
+    }
+    if rental_ids:
+        OverdueRental.forget(rental_ids, session.connection())
+
+
+@event.listens_for(Session, 'do_orm_execute')
+def bump_written_table(orm_execute_state):
+    """Bulk INSERT/UPDATE/DELETE statements run through the session skip the flush; count them here."""
+    if orm_execute_state.is_insert or orm_execute_state.is_update or orm_execute_state.is_delete:
+        table = orm_execute_state.statement.table
+        if table is not TableVersion.__table__:
+            names = [table.name]
+            if orm_execute_state.is_delete:
+                names += sorted(cascaded_tables(names))
+            TableVersion.bump(orm_execute_state.session.connection(), names)
+
+
+class MovieSearch:
+    """SQLite FTS5 index over each movie's title, genre and the text of its reviews.
+
+    `movie_search` is keyed by movie id (its rowid) and kept in step by
+    triggers on `movies` and `ratings`, so every write path (ORM, bulk
+    statements, raw SQL) updates it in the same transaction. Prefix indexes
+    make the type-ahead queries `search` builds cheap. The table only exists
+    on SQLite; on other databases the DDL below is skipped.
+    """
+
+    table = 'movie_search'
+    # bm25 weights for title, genre and reviews: a title hit outranks a genre hit, which outranks a review.
+    weights = (10.0, 5.0, 1.0)
+
+    DDL = (
+        "CREATE VIRTUAL TABLE IF NOT EXISTS movie_search USING fts5("
+        "title, genre, reviews, tokenize = 'unicode61 remove_diacritics 2', prefix = '2 3 4')",
+        "CREATE TRIGGER IF NOT EXISTS movie_search_movies_insert AFTER INSERT ON movies BEGIN "
+        "INSERT INTO movie_search (rowid, title, genre, reviews) VALUES (new.id, new.title, new.genre, ''); END",
+        "CREATE TRIGGER IF NOT EXISTS movie_search_movies_update AFTER UPDATE OF title, genre ON movies BEGIN "
+        "UPDATE movie_search SET title = new.title, genre = new.genre WHERE rowid = new.id; END",
+        "CREATE TRIGGER IF NOT EXISTS movie_search_movies_delete AFTER DELETE ON movies BEGIN "
+        "DELETE FROM movie_search WHERE rowid = old.id; END",
+        "CREATE TRIGGER IF NOT EXISTS movie_search_ratings_insert AFTER INSERT ON ratings WHEN new.review IS NOT NULL BEGIN "
+        "UPDATE movie_search SET reviews = reviews || ' ' || new.review WHERE rowid = new.movie_id; END",
+        "CREATE TRIGGER IF NOT EXISTS movie_search_ratings_update AFTER UPDATE OF review, movie_id ON ratings BEGIN "
+        "UPDATE movie_search SET reviews = (SELECT coalesce(group_concat(review, ' '), '') FROM ratings WHERE movie_id = old.movie_id) WHERE rowid = old.movie_id; "
+        "UPDATE movie_search SET reviews = (SELECT coalesce(group_concat(review, ' '), '') FROM ratings WHERE movie_id = new.movie_id) WHERE rowid = new.movie_id; END",
+        # A rating deleted along with its movie (by the cascade) leaves nothing to re-index.
+        "CREATE TRIGGER IF NOT EXISTS movie_search_ratings_delete AFTER DELETE ON ratings "
+        "WHEN old.review IS NOT NULL AND EXISTS (SELECT 1 FROM movies WHERE id = old.movie_id) BEGIN "
+        "UPDATE movie_search SET reviews = (SELECT coalesce(group_concat(review, ' '), '') FROM ratings WHERE movie_id = old.movie_id) WHERE rowid = old.movie_id; END",
+    )
+
+    TRIGGERS = tuple(f'movie_search_{table}_{action}' for table in ('movies', 'ratings') for action in ('insert', 'update', 'delete'))
+
+    @classmethod
+    def create(cls, connection):
+        for statement in cls.DDL:
+            connection.exec_driver_sql(statement)
+        connection.exec_driver_sql(
+            f"INSERT INTO movie_search (movie_search, rank) VALUES ('rank', 'bm25({', '.join(map(str, cls.weights))})')"
+        )
+
+    @classmethod
+    def drop(cls, connection):
+        """Drop the index and its triggers, so bulk loads skip the per-row index updates until `create` and `rebuild`."""
+        for trigger in cls.TRIGGERS:
+            connection.exec_driver_sql(f"DROP TRIGGER IF EXISTS {trigger}")
+        connection.exec_driver_sql("DROP TABLE IF EXISTS movie_search")
+
+    @classmethod
+    def rebuild(cls, connection):
+        """Re-index every movie from `movies` and `ratings`, then merge the index into one segment."""
+        connection.exec_driver_sql("DELETE FROM movie_search")
+        connection.exec_driver_sql(
+            "INSERT INTO movie_search (rowid, title, genre, reviews) "
+            "SELECT movies.id, movies.title, movies.genre, "
+            "coalesce((SELECT group_concat(review, ' ') FROM ratings WHERE ratings.movie_id = movies.id), '') "
+            "FROM movies"
+        )
+        connection.exec_driver_sql("INSERT INTO movie_search (movie_search) VALUES ('optimize')")
+
+    @staticmethod
+    def match_expression(query):
+        """An FTS5 query matching every word of `query`, the last one as a prefix; None if it has no words.
+
+        A one-letter last word matches whole words only: the prefix indexes
+        start at two letters, and a one-letter prefix would rank most of the table.
+        """
+        words = re.findall(r'\w+', query)
+        if not words:
+            return None
+        expression = ' '.join(f'"{word}"' for word in words)
+        return expression + '*' if len(words[-1]) >= 2 else expression
+
+    @classmethod
+    def hits(cls, query, limit, offset=0):
+        """Subquery of (rowid, rank) for the `limit` best matches of `query` after skipping `offset`."""
+        return db.text(
+            "SELECT rowid, rank FROM movie_search WHERE movie_search MATCH :query ORDER BY rank LIMIT :limit OFFSET :offset"
+        ).bindparams(query=cls.match_expression(query), limit=limit, offset=offset).columns(
+            db.column('rowid', db.Integer), db.column('rank', db.Float),
+        ).subquery('hits')
+
+
+@event.listens_for(db.metadata, 'after_create')
+def create_movie_search(metadata, connection, **kwargs):
+    if connection.dialect.name == 'sqlite':
+        MovieSearch.create(connection)
+
+
+@event.listens_for(db.metadata, 'before_drop')
+def drop_movie_search(metadata, connection, **kwargs):
+    if connection.dialect.name == 'sqlite':
+        MovieSearch.drop(connection)
+
+
+@event.listens_for(db.metadata, 'after_create')
+def create_change_log_triggers(metadata, connection, **kwargs):
+    if connection.dialect.name == 'sqlite':
+        ChangeLog.create_triggers(connection)
+
+
+@event.listens_for(db.metadata, 'before_drop')
+def drop_change_log_triggers(metadata, connection, **kwargs):
+    if connection.dialect.name == 'sqlite':
+        ChangeLog.drop_triggers(connection)
@@ -0,0 +1,109 @@
+#!/usr/bin/env python3
+"""Run EXPLAIN QUERY PLAN over the app's hot queries and flag full table scans.
+
+    python query_plans.py
+
+Exits with status 1 if any query scans a whole table or index instead of
+searching one.
+"""
+
+# Standard library imports
+import re
+import sys
+from datetime import datetime
+
+# Remote library imports
+from sqlalchemy import func
+
+# Local imports
+from app import app
+from models import db, User, Movie, Rental, Rating, MovieRatingStats, OverdueRental, MovieSimilarity, RatingRollup, GenreRatingRollup, rollup_series
+from serializers import serializer_for
+
+# Tables whose hot queries may walk a whole covering index: none so far.
+COVERING_SCAN_TABLES = frozenset()
+
+
+def page(model, *criteria):
+    return serializer_for(model).statement.where(model.id > 1000, *criteria).order_by(model.id).limit(101)
+
+
+def hot_queries():
+    now = datetime.now()
+    return [
+        ('users page', page(User)),
+        ('movies page', page(Movie)),
+        ('rentals page', page(Rental)),
+        ('ratings page', page(Rating)),
+        ('user rentals page', page(Rental, Rental.user_id == 1)),
+        ('user ratings page', page(Rating, Rating.user_id == 1)),
+        ('movie rentals page', page(Rental, Rental.movie_id == 1)),
+        ('movie ratings page', page(Rating, Rating.movie_id == 1)),
+        ('movie detail', db.select(Movie, MovieRatingStats).outerjoin(Movie.rating_stats).where(Movie.id == 1)),
+        ('movies by genre', db.select(Movie).where(Movie.genre == 'Drama')),
+        ('top movies', db.select(MovieRatingStats).where(MovieRatingStats.mean.isnot(None)).order_by(MovieRatingStats.mean.desc()).limit(10)),
+        ('top movies by genre', db.select(MovieRatingStats).where(MovieRatingStats.genre == 'Drama', MovieRatingStats.mean.isnot(None)).order_by(MovieRatingStats.mean.desc()).limit(10)),
+        ('rentals by user', db.select(Rental).where(Rental.user_id == 1)),
+        ('rentals by movie', db.select(Rental).where(Rental.movie_id == 1)),
+        ('overdue rentals', db.select(Rental).where(Rental.due_date < now)),
+        ('overdue scan batch', db.select(Rental.id, Rental.user_id, Rental.due_date).where(
+            Rental.due_date < now, db.tuple_(Rental.due_date, Rental.id) > (now, 1),
+        ).order_by(Rental.due_date, Rental.id).limit(500)),
+        ('recorded overdue rentals page', page(Rental, Rental.id.in_(db.select(OverdueRental.rental_id)))),
+        ('ratings by movie', db.select(Rating).where(Rating.movie_id == 1).order_by(Rating.created_at)),
+        ('ratings by user', db.select(Rating).where(Rating.user_id == 1)),
+        ('forget user ratings', db.select(Rating.movie_id, Rating.rating, func.count()).where(Rating.user_id == 1).group_by(Rating.movie_id, Rating.rating)),
+        ('similar movies', MovieSimilarity.similar_to(1, 10)),
+        ('recommendations', MovieSimilarity.recommended_for(1, 10)),
+        ('record rating rollups', RatingRollup.grouped(Rating.id == 1)),
+        ('movie rating timeseries', rollup_series(RatingRollup, RatingRollup.movie_id == 1, 'day', limit=90)),
+        ('genre rating totals', GenreRatingRollup.totals('Drama')),
+        ('genre rating series', rollup_series(GenreRatingRollup, GenreRatingRollup.genre == 'Drama', 'week', now.date(), limit=90)),
+    ]
+
+
+def explain(connection, statement):
+    compiled = statement.compile(dialect=connection.dialect)
+    params = [compiled.params[name] for name in compiled.positiontup]
+    params = [str(value) if isinstance(value, datetime) else value for value in params]
+    return [row[-1] for row in connection.exec_driver_sql(f'EXPLAIN QUERY PLAN {compiled}', tuple(params))]
+
+
+def is_full_scan(detail):
+    """Whether a plan row reads a whole table or index.
+
+    Every `SCAN` counts, even one walking an index in order, except a walk
+    of a covering index on a table in `COVERING_SCAN_TABLES` and a rowid
+    range lookup (which older SQLite prints as `SCAN TABLE t USING INTEGER
+    PRIMARY KEY (rowid>?)`).
+    """
+    match = re.match(r'SCAN (?:TABLE )?(\S+)(.*)', detail)
+    if match is None:
+        return False
+    table, using = match.groups()
+    if re.search(r'USING INTEGER PRIMARY KEY \(rowid[<>=]', using):
+        return False
+    return not ('USING COVERING INDEX' in using and table in COVERING_SCAN_TABLES)
+
+
+if __name__ == '__main__':
+    with app.app_context():
+        if db.engine.dialect.name != 'sqlite':
+            sys.exit('EXPLAIN QUERY PLAN is SQLite-specific; point DATABASE_URL at a SQLite database.')
+        db.create_all()
+
+        scans = []
+        with db.engine.connect() as connection:
+            for name, statement in hot_queries():
+                plan = explain(connection, statement)
+                flagged = [detail for detail in plan if is_full_scan(detail)]
+                print(f"{'FULL SCAN' if flagged else 'ok':<10} {name}")
+                for detail in plan:
+                    print(f'           {detail}')
+                if flagged:
+                    scans.append(name)
+
+        if scans:
+            print(f"\n{len(scans)} queries scan a whole table or index: {', '.join(scans)}")
+            sys.exit(1)
+        print('\nNo full scans.')
@@ -0,0 +1,242 @@
+"""Item-item collaborative filtering: which movies are alike, judged by how users rated them.
+
+Each movie is a column of the sparse user x movie matrix of ratings, centred
+on the movie's mean rating and scaled to unit length, so the similarity of two
+movies is the cosine of their columns: positive when the users who rated both
+tended to rate them above (or below) average together. A user's repeat
+ratings of a movie count as their average.
+
+`SimilarityIndex` holds the matrix in the memory of the process running the
+`refresh_recommendations` job and stores each movie's top neighbours in
+`movie_similarities`, which is all the endpoints read. A refresh reads the
+rating changes logged since the last one and recomputes only the columns of
+the movies they touched; every other movie's neighbours are patched from
+those columns, and only a movie that may now admit a neighbour it never held
+has its whole row recomputed. The change log is kept on SQLite only, so on
+other databases the index is as fresh as its last full build.
+"""
+
+# Standard library imports
+import itertools
+
+# Remote library imports
+import numpy as np
+from scipy import sparse
+
+# Local imports
+from models import db, Rating, ChangeLog, MovieSimilarity
+
+READ_BATCH_SIZE = 100000
+CHANGE_BATCH_SIZE = 1000
+
+
+def unit_columns(rows, columns, ratings, shape):
+    """A CSC matrix of `ratings` at (`rows`, `columns`), each column centred on its mean and scaled to unit length.
+
+    Entries repeated at a position are averaged; a column whose ratings are all equal is left empty.
+    """
+    keys, positions = np.unique(rows * shape[1] + columns, return_inverse=True)
+    values = np.bincount(positions, ratings) / np.bincount(positions)
+    rows, columns = np.divmod(keys, shape[1])
+    counts = np.bincount(columns, minlength=shape[1])
+    values -= (np.bincount(columns, values, minlength=shape[1]) / np.maximum(counts, 1))[columns]
+    norms = np.sqrt(np.bincount(columns, values ** 2, minlength=shape[1]))
+    values /= np.where(norms > 0, norms, 1)[columns]
+    matrix = sparse.csc_matrix((values, (rows, columns)), shape=shape)
+    matrix.eliminate_zeros()
+    return matrix
+
+
+def read_ratings(session, movie_ids=None):
+    """(user ids, movie ids, ratings) arrays of every rating, or only of those of `movie_ids`."""
+    statement = db.select(Rating.user_id, Rating.movie_id, Rating.rating)
+    if movie_ids is None:
+        statements = [statement]
+    else:
+        statements = [statement.where(Rating.movie_id.in_(movie_ids[start:start + 500])) for start in range(0, len(movie_ids), 500)]
+    parts = [np.empty((0, 3), dtype=np.int64)]
+    for statement in statements:
+        # Straight off the connection: the ORM's result handling would cost more than the rest of a build.
+        result = session.connection().execute(statement.execution_options(yield_per=READ_BATCH_SIZE))
+        parts.extend(
+            np.fromiter(itertools.chain.from_iterable(rows), dtype=np.int64, count=3 * len(rows)).reshape(-1, 3)
+            for rows in result.partitions()
+        )
+    ratings = np.concatenate(parts)
+    return ratings[:, 0], ratings[:, 1], ratings[:, 2].astype(np.float64)
+
+
+class SimilarityIndex:
+    """The rating matrix and every movie's top `k` neighbours, kept in step with `ratings` by `refresh`.
+
+    Matrix rows and columns are positions in `user_ids` and `movie_ids`;
+    `neighbours` and `scores` hold each column's most similar columns, best
+    first, padded with -1 and 0. A refresh works out its new state aside and
+    only adopts it once `movie_similarities` has been committed, so a failed
+    one is simply redone by the next.
+    """
+
+    def __init__(self, k=20, batch_size=256):
+        self.k = k
+        self.batch_size = batch_size
+        self.matrix = None
+        self.user_ids = self.movie_ids = None
+        self.neighbours = self.scores = None
+        self.cursor = None
+
+    def refresh(self, full=False, session=None):
+        """Bring the index up to date with `ratings`; return how many movies' neighbours were rewritten.
+
+        It's rebuilt when `full`, on first use and when the change log no
+        longer reaches back to the last refresh; otherwise only the movies
+        whose ratings changed since then are recomputed.
+        """
+        session = session or db.session
+        if full or self.matrix is None:
+            return self.build(session)
+        if session.get_bind(ChangeLog).dialect.name != 'sqlite':
+            return 0
+        cursor, pruned = ChangeLog.resume_point(self.cursor, session)
+        if pruned:
+            return self.build(session)
+
+        changed = set()
+        while True:
+            entries = ChangeLog.since(cursor, CHANGE_BATCH_SIZE, ('ratings',), session)
+            if not entries:
+                break
+            changed.update(entry.data['movie_id'] for entry in entries)
+            cursor = entries[-1].id
+        if not changed:
+            self.cursor = cursor
+            session.rollback()
+            return 0
+        return self.update(np.array(sorted(changed), dtype=np.int64), cursor, session)
+
+    def build(self, session):
+        """Recompute the whole index from `ratings`; return how many movies have neighbours."""
+        # The first read starts the snapshot, so the cursor matches the ratings read after it.
+        cursor, _ = ChangeLog.resume_point(None, session)
+        users, movies, ratings = read_ratings(session)
+        movie_ids, columns = np.unique(movies, return_inverse=True)
+        user_ids, rows = np.unique(users, return_inverse=True)
+        matrix = unit_columns(rows, columns, ratings, (len(user_ids), len(movie_ids)))
+        neighbours, scores = self.nearest(matrix, np.arange(len(movie_ids)))
+
+        listed = np.flatnonzero(neighbours[:, 0] >= 0)
+        MovieSimilarity.replace(self.listing(movie_ids, neighbours, scores, listed), complete=True, session=session)
+        session.commit()
+        self.matrix, self.user_ids, self.movie_ids = matrix, user_ids, movie_ids
+        self.neighbours, self.scores, self.cursor = neighbours, scores, cursor
+        return len(listed)
+
+    def update(self, changed_ids, cursor, session):
+        """Recompute the columns of `changed_ids` and every neighbour list they affect; return how many lists changed."""
+        users, movies, ratings = read_ratings(session, changed_ids.tolist())
+        user_ids = np.concatenate([self.user_ids, np.setdiff1d(users, self.user_ids)])
+        movie_ids = np.concatenate([self.movie_ids, np.setdiff1d(changed_ids, self.movie_ids)])
+        user_rows, movie_columns = self.positions(user_ids), self.positions(movie_ids)
+        changed = movie_columns(changed_ids)
+        shape = (len(user_ids), len(movie_ids))
+
+        kept = self.matrix.tocoo()
+        keep = ~np.isin(kept.col, changed)
+        fresh = unit_columns(user_rows(users), movie_columns(movies), ratings, shape).tocoo()
+        matrix = sparse.csc_matrix((
+            np.concatenate([kept.data[keep], fresh.data]),
+            (np.concatenate([kept.row[keep], fresh.row]), np.concatenate([kept.col[keep], fresh.col])),
+        ), shape=shape)
+
+        added = shape[1] - len(self.movie_ids)
+        neighbours = np.vstack([self.neighbours, np.full((added, self.k), -1)])
+        scores = np.vstack([self.scores, np.zeros((added, self.k))])
+        previous = neighbours.copy(), scores.copy()
+
+        items, by_user = matrix.T.tocsr(), matrix.tocsr()
+        recompute = np.zeros(shape[1], dtype=bool)
+        for start in range(0, len(changed), self.batch_size):
+            batch = changed[start:start + self.batch_size]
+            similarity = (items[batch] @ by_user).toarray()
+            similarity[np.arange(len(batch)), batch] = 0
+            recompute |= self.patch(neighbours, scores, batch, similarity)
+            neighbours[batch], scores[batch] = self.top(similarity)
+        recompute[changed] = False
+        rows = np.flatnonzero(recompute)
+        neighbours[rows], scores[rows] = self.nearest(matrix, rows, items, by_user)
+
+        rewritten = np.flatnonzero(((neighbours != previous[0]) | (scores != previous[1])).any(axis=1))
+        MovieSimilarity.replace(self.listing(movie_ids, neighbours, scores, rewritten), session=session)
+        session.commit()
+        self.matrix, self.user_ids, self.movie_ids = matrix, user_ids, movie_ids
+        self.neighbours, self.scores, self.cursor = neighbours, scores, cursor
+        return len(rewritten)
+
+    def patch(self, neighbours, scores, batch, similarity):
+        """Merge the new similarities of the `batch` columns (rows of `similarity`) into every other column's list, in place.
+
+        A list is the exact top `k` of its column as long as none of the
+        neighbours it held lost similarity: anything it didn't hold scored no
+        higher than its last entry. Returns a mask of the columns where one
+        did, with a full list, which have to be recomputed.
+        """
+        position = np.full(len(neighbours), -1)
+        position[batch] = np.arange(len(batch))
+        held = np.where(neighbours >= 0, position[neighbours], -1)
+        in_batch = held >= 0
+        updated = np.where(in_batch, np.take_along_axis(similarity.T, np.maximum(held, 0), axis=1), scores)
+        lost = (in_batch & (updated < scores)).any(axis=1) & (neighbours[:, -1] >= 0)
+
+        candidates = np.hstack([np.where(in_batch, -1, neighbours), np.broadcast_to(batch, (len(neighbours), len(batch)))])
+        candidate_scores = np.hstack([np.where(in_batch, 0, scores), similarity.T])
+        candidate_scores[candidates == np.arange(len(neighbours))[:, None]] = 0
+        neighbours[:], scores[:] = self.top(candidate_scores, candidates)
+        return lost
+
+    def nearest(self, matrix, columns, items=None, by_user=None):
+        """The top `k` (neighbours, scores) of each of `columns`, `batch_size` rows of similarities at a time."""
+        items = matrix.T.tocsr() if items is None else items
+        by_user = matrix.tocsr() if by_user is None else by_user
+        neighbours, scores = np.full((len(columns), self.k), -1), np.zeros((len(columns), self.k))
+        for start in range(0, len(columns), self.batch_size):
+            batch = columns[start:start + self.batch_size]
+            similarity = (items[batch] @ by_user).toarray()
+            similarity[np.arange(len(batch)), batch] = 0
+            neighbours[start:start + len(batch)], scores[start:start + len(batch)] = self.top(similarity)
+        return neighbours, scores
+
+    def top(self, similarity, labels=None):
+        """The `k` best positive entries of each row of `similarity` as (labels, scores), best first, padded with -1 and 0.
+
+        `labels` names each entry's column; by default it's the entry's position.
+        """
+        k = min(self.k, similarity.shape[1])
+        neighbours, scores = np.full((len(similarity), self.k), -1), np.zeros((len(similarity), self.k))
+        if k == 0:
+            return neighbours, scores
+        best = np.argpartition(-similarity, k - 1, axis=1)[:, :k]
+        values = np.take_along_axis(similarity, best, axis=1)
+        order = np.argsort(-values, axis=1, kind='stable')
+        best, values = np.take_along_axis(best, order, axis=1), np.take_along_axis(values, order, axis=1)
+        if labels is not None:
+            best = np.take_along_axis(labels, best, axis=1)
+        positive = values > 0
+        neighbours[:, :k] = np.where(positive, best, -1)
+        scores[:, :k] = np.where(positive, values, 0)
+        return neighbours, scores
+
+    @staticmethod
+    def positions(ids):
+        """A function mapping an array of ids to their positions in `ids`."""
+        order = np.argsort(ids, kind='stable')
+        return lambda values: order[np.searchsorted(ids, values, sorter=order)]
+
+    @staticmethod
+    def listing(movie_ids, neighbours, scores, columns):
+        """{movie_id: [(similar_movie_id, score), ...]} for `columns`, as `MovieSimilarity.replace` takes it."""
+        return {
+            int(movie_ids[column]): [
+                (int(movie_ids[neighbour]), float(score))
+                for neighbour, score in zip(neighbours[column], scores[column]) if neighbour >= 0
+            ]
+            for column in columns
+        }
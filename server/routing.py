@@ -0,0 +1,61 @@
+# Standard library imports
+import random
+import time
+
+# Remote library imports
+from flask import g, request, has_app_context
+from flask_sqlalchemy.session import Session
+
+READ_METHODS = ('GET', 'HEAD')
+LAST_WRITE_COOKIE = 'last_write'
+
+
+class RoutingSession(Session):
+    """Session that sends a request's reads to a replica when the request allows it.
+
+    Flushes and DML statements always go to the primary, and so does every
+    query outside the requests `init_app` marked for a replica.
+    """
+
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        if bind is None and not self._flushing and not getattr(clause, 'is_dml', False):
+            replica = g.get('db_replica') if has_app_context() else None
+            if replica is not None:
+                return self._db.engines[replica]
+        return super().get_bind(mapper=mapper, clause=clause, bind=bind, **kwargs)
+
+
+def replica_keys(app):
+    return [key for key in app.config.get('SQLALCHEMY_BINDS', {}) if key.startswith('replica_')]
+
+
+def init_app(app):
+    """Route GET/HEAD requests to a random read replica, keeping read-your-writes.
+
+    A client that wrote within the last `REPLICA_MAX_STALENESS` seconds (tracked
+    with a `last_write` cookie) or that sends `X-Consistency: strong` reads
+    from the primary instead. Without replicas configured this does nothing.
+    """
+    replicas = replica_keys(app)
+    if not replicas:
+        return
+
+    @app.before_request
+    def choose_engine():
+        if request.method not in READ_METHODS or request.headers.get('X-Consistency') == 'strong':
+            return
+        try:
+            last_write = float(request.cookies.get(LAST_WRITE_COOKIE, 0))
+        except ValueError:
+            last_write = 0
+        if time.time() - last_write >= app.config['REPLICA_MAX_STALENESS']:
+            g.db_replica = random.choice(replicas)
+
+    @app.after_request
+    def remember_write(response):
+        if request.method not in READ_METHODS and request.method != 'OPTIONS' and response.status_code < 400:
+            response.set_cookie(
+                LAST_WRITE_COOKIE, str(time.time()),
+                max_age=int(app.config['REPLICA_MAX_STALENESS']) + 1, httponly=True, samesite='Lax',
+            )
+        return response
@@ -1,105 +1,171 @@
 #!/usr/bin/env python3
+"""Seed the database with deterministic data at any scale.
+
+    python seed.py                                      # the 10-movie demo dataset
+    python seed.py --users 1000000 --movies 100000 --rentals 500000 --ratings 10000000
+
+The same `--seed` always produces the same rows (due and rating dates are
+offsets from the time of seeding). Rows go in with bulk INSERTs of
+`--batch-size` generated lazily, so memory stays flat at any scale; the
+search index, the derived stats tables, the rating rollups and the similar
+movies are built once at the end instead of row by row, and the seeded rows
+aren't written to the change log.
+"""
 
 # Standard library imports
-from random import randint, choice as rc
+import argparse
+import itertools
+import random
+import time
 from datetime import datetime, timedelta
 
 # Remote library imports
 from faker import Faker
-from random import random
 
 # Local imports
 from app import app
-from models import db, User, Movie, Rental, Rating
-
-if __name__ == '__main__':
+from models import db, User, Movie, Rental, Rating, MovieRatingStats, UserSummary, MovieSearch, MovieInventory, ChangeLog, RatingRollup
+from recommender import SimilarityIndex
+
+PREDEFINED_MOVIES = [
+    {"title": "The Shawshank Redemption", "image": "https://upload.wikimedia.org/wikipedia/en/8/81/ShawshankRedemptionMoviePoster.jpg"},
+    {"title": "The Godfather", "image": "https://upload.wikimedia.org/wikipedia/en/1/1c/Godfather_ver1.jpg"},
+    {"title": "The Dark Knight", "image": "https://www.sideshow.com/cdn-cgi/image/quality=90,f=auto/https://www.sideshow.com/storage/product-images/500678F/batman-the-dark-knight_dc-comics_gallery_5c4e11bbb740a.jpg"},
+    {"title": "Pulp Fiction", "image": "https://i.ebayimg.com/00/s/MTYwMFgxMDcx/z/bLYAAOSwffNjoG1q/$_57.JPG?set_id=8800005007"},
+    {"title": "Forrest Gump", "image": "https://upload.wikimedia.org/wikipedia/en/6/67/Forrest_Gump_poster.jpg"},
+    {"title": "Inception", "image": "https://render.fineartamerica.com/images/rendered/medium/print/6/8/break/images/artworkimages/medium/3/inception-bo-kev.jpg"},
+    {"title": "Interstellar", "image": "https://upload.wikimedia.org/wikipedia/en/b/bc/Interstellar_film_poster.jpg"},
+    {"title": "Parasite", "image": "https://upload.wikimedia.org/wikipedia/en/5/53/Parasite_%282019_film%29.png"},
+    {"title": "Joker", "image": "https://upload.wikimedia.org/wikipedia/en/e/e1/Joker_%282019_film%29_poster.jpg"},
+    {"title": "Avengers: Endgame", "image": "https://upload.wikimedia.org/wikipedia/en/0/0d/Avengers_Endgame_poster.jpg"},
+]
+GENRES = ["Drama", "Action", "Thriller", "Comedy", "Sci-Fi"]
+# Scores lean toward 6-8, as they do on real rating sites.
+RATING_WEIGHTS = (1, 1, 2, 3, 5, 8, 10, 9, 6, 3)
+REVIEW_FRACTION = 0.2
+POOL_SIZE = 1000
+
+
+def popular(rng, count):
+    """An id in 1..count, skewed so low ids (the popular rows) come up far more often, like real rental traffic."""
+    return int(count * rng.random() ** 2) + 1
+
+
+def generate_users(rng, fake, count):
+    first_names = [fake.first_name() for _ in range(POOL_SIZE)]
+    last_names = [fake.last_name() for _ in range(POOL_SIZE)]
+    for i in range(count):
+        first, last = rng.choice(first_names), rng.choice(last_names)
+        yield {'name': f'{first} {last}', 'email': f'{first}.{last}.{i}@example.com'.lower()}
+
+
+def generate_movies(rng, fake, count):
+    words = [fake.word().title() for _ in range(POOL_SIZE)]
+    this_year = datetime.now().year
+    for i in range(count):
+        if i < len(PREDEFINED_MOVIES):
+            title, image = PREDEFINED_MOVIES[i]['title'], PREDEFINED_MOVIES[i]['image']
+        else:
+            title, image = ' '.join(rng.choices(words, k=rng.randint(1, 4))), f'https://example.com/posters/{i}.jpg'
+        yield {'title': title, 'genre': rng.choice(GENRES), 'release_year': rng.randint(this_year - 20, this_year), 'image': image}
+
+
+def generate_rentals(rng, users, movies, count, now):
+    for _ in range(count):
+        # About one in five is already overdue.
+        yield {'user_id': rng.randint(1, users), 'movie_id': popular(rng, movies), 'due_date': now + timedelta(days=rng.randint(-7, 21))}
+
+
+def generate_ratings(rng, fake, users, movies, count, now):
+    sentences = [fake.sentence(nb_words=10) for _ in range(POOL_SIZE)]
+    scores = range(1, 11)
+    for _ in range(count):
+        yield {
+            'user_id': rng.randint(1, users),
+            'movie_id': popular(rng, movies),
+            'rating': rng.choices(scores, weights=RATING_WEIGHTS)[0],
+            'review': rng.choice(sentences) if rng.random() < REVIEW_FRACTION else None,
+            'created_at': now - timedelta(seconds=rng.randrange(365 * 24 * 3600)),
+        }
+
+
+def insert(model, rows, batch_size):
+    """Bulk-insert `rows` (an iterator of dicts) `batch_size` at a time; return how many went in.
+
+    Goes through the Core table rather than the ORM's bulk INSERT, which is
+    several times slower per row and buys nothing here.
+    """
+    started, total = time.perf_counter(), 0
+    while True:
+        batch = list(itertools.islice(rows, batch_size))
+        if not batch:
+            break
+        db.session.execute(model.__table__.insert(), batch)
+        total += len(batch)
+    db.session.commit()
+    elapsed = time.perf_counter() - started
+    print(f"  {model.__tablename__:<8} {total:>10} rows in {elapsed:6.1f}s ({total / elapsed if elapsed else 0:,.0f}/s)")
+    return total
+
+
+def populate(users=10, movies=10, rentals=10, ratings=20, seed=0, batch_size=10000):
+    """Fill an empty, freshly created database with deterministic rows generated from `seed`."""
+    rng = random.Random(seed)
     fake = Faker()
+    Faker.seed(seed)
+    now = datetime.now().replace(microsecond=0)
+    sqlite = db.engine.dialect.name == 'sqlite'
+
+    if sqlite:
+        MovieSearch.drop(db.session.connection())
+        ChangeLog.drop_triggers(db.session.connection())
+    insert(User, generate_users(rng, fake, users), batch_size)
+    insert(Movie, generate_movies(rng, fake, movies), batch_size)
+    if users and movies:
+        insert(Rental, generate_rentals(rng, users, movies, rentals, now), batch_size)
+        insert(Rating, generate_ratings(rng, fake, users, movies, ratings, now), batch_size)
+
+    started = time.perf_counter()
+    # Popular movies are rented out more often than the default copies allow; stock them to match.
+    db.session.execute(db.insert(MovieInventory).from_select(
+        ['movie_id', 'copies'],
+        db.select(Rental.movie_id, db.func.count()).group_by(Rental.movie_id).having(db.func.count() > MovieInventory.DEFAULT_COPIES),
+    ))
+    MovieRatingStats.rebuild()
+    UserSummary.rebuild()
+    if sqlite:
+        MovieSearch.create(db.session.connection())
+        MovieSearch.rebuild(db.session.connection())
+        ChangeLog.create_triggers(db.session.connection())
+    db.session.commit()
+    print(f"  derived stats and search index in {time.perf_counter() - started:.1f}s")
+
+    started = time.perf_counter()
+    written = RatingRollup.rebuild()
+    print(f"  {written:,} rating rollup rows in {time.perf_counter() - started:.1f}s")
+
+    started = time.perf_counter()
+    listed = SimilarityIndex(app.config['RECOMMENDER_NEIGHBOURS']).refresh(full=True)
+    print(f"  similar movies of {listed} movies in {time.perf_counter() - started:.1f}s")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--users', type=int, default=10)
+    parser.add_argument('--movies', type=int, default=10)
+    parser.add_argument('--rentals', type=int, default=10)
+    parser.add_argument('--ratings', type=int, default=20)
+    parser.add_argument('--seed', type=int, default=0, help='random seed; the same seed gives the same data')
+    parser.add_argument('--batch-size', type=int, default=10000, help='rows per INSERT')
+    args = parser.parse_args()
+
     with app.app_context():
         print("Starting seed...")
-
         db.drop_all()
         db.create_all()
-
-        # Seeding Users
-        print("Seeding Users...")
-        users = []
-        for _ in range(10):
-            user = User(
-                name=fake.name(),
-                email=fake.email()
-            )
-            users.append(user)
-            db.session.add(user)
-
-        # Seeding Movies
-        predefined_movies = [
-            {"title": "The Shawshank Redemption", "image": "https://upload.wikimedia.org/wikipedia/en/8/81/ShawshankRedemptionMoviePoster.jpg"},
-            {"title": "The Godfather", "image": "https://upload.wikimedia.org/wikipedia/en/1/1c/Godfather_ver1.jpg"},
-            {"title": "The Dark Knight", "image": "https://www.sideshow.com/cdn-cgi/image/quality=90,f=auto/https://www.sideshow.com/storage/product-images/500678F/batman-the-dark-knight_dc-comics_gallery_5c4e11bbb740a.jpg"},
-            {"title": "Pulp Fiction", "image": "https://i.ebayimg.com/00/s/MTYwMFgxMDcx/z/bLYAAOSwffNjoG1q/$_57.JPG?set_id=8800005007"},
-            {"title": "Forrest Gump", "image": "https://upload.wikimedia.org/wikipedia/en/6/67/Forrest_Gump_poster.jpg"},
-            {"title": "Inception", "image": "https://render.fineartamerica.com/images/rendered/medium/print/6/8/break/images/artworkimages/medium/3/inception-bo-kev.jpg"},
-            {"title": "Interstellar", "image": "https://upload.wikimedia.org/wikipedia/en/b/bc/Interstellar_film_poster.jpg"},
-            {"title": "Parasite", "image": "https://upload.wikimedia.org/wikipedia/en/5/53/Parasite_%282019_film%29.png"},
-            {"title": "Joker", "image": "https://upload.wikimedia.org/wikipedia/en/e/e1/Joker_%282019_film%29_poster.jpg"},
-            {"title": "Avengers: Endgame", "image": "https://upload.wikimedia.org/wikipedia/en/0/0d/Avengers_Endgame_poster.jpg"},
-        ]
-
-        print("Seeding Movies...")
-        movies = []
-        for movie_data in predefined_movies:
-            movie = Movie(
-                title=movie_data["title"],
-                genre=rc(["Drama", "Action", "Thriller", "Comedy", "Sci-Fi"]),
-                release_year=fake.date_between(start_date="-20y", end_date="today").year,
-                image=movie_data["image"]
-            )
-            movies.append(movie)
-            db.session.add(movie)
-
-        db.session.commit()  
-
-
-        # Seeding Rentals
-        print("Seeding Rentals...")
-        if not users or not movies:
-            print("Error: Users or Movies list is empty.")
-        else:
-            print(f"Users: {[user.id for user in users]}")  
-            print(f"Movies: {[movie.id for movie in movies]}")  
-
-            for _ in range(10):
-                
-                user = db.session.query(User).order_by(db.func.random()).first()  
-                movie = db.session.query(Movie).order_by(db.func.random()).first()  
-
-                if not user or not movie:
-                    print(f"Skipping rental: Invalid user_id or movie_id (user: {user}, movie: {movie})")
-                    continue  
-
-                due_date = datetime.today() + timedelta(days=randint(7, 21))
-
-                rental = Rental(
-                    user_id=user.id,  
-                    movie_id=movie.id,  
-                    due_date=due_date
-                )
-                db.session.add(rental)
-
-            db.session.commit()
-            print("Seeding complete!")
-
-
-        # Seeding Ratings
-        print("Seeding Ratings...")
-        for _ in range(20):
-            rating = Rating(
-                rating=randint(1, 5),
-                review=fake.sentence(nb_words=10),
-                user_id=rc([user.id for user in users]),  
-                movie_id=rc([movie.id for movie in movies]) 
-            )
-            db.session.add(rating)
-
-        db.session.commit()
+        populate(args.users, args.movies, args.rentals, args.ratings, args.seed, args.batch_size)
         print("Seeding complete!")
+
+
+if __name__ == '__main__':
+    main()
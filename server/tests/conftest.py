@@ -0,0 +1,40 @@
+# Standard library imports
+import os
+import tempfile
+
+DATABASE = os.path.join(tempfile.mkdtemp(), 'test.db')
+os.environ['DATABASE_URL'] = f'sqlite:///{DATABASE}'
+os.environ.pop('DATABASE_REPLICA_URLS', None)
+os.environ.pop('RUN_SCHEDULER', None)
+
+# Remote library imports
+import pytest
+
+# Local imports
+from app import app as flask_app
+from config import cache, compressor
+from cache import MemoryBackend
+from models import db
+from benchmarks.common import populate
+
+
+@pytest.fixture
+def app():
+    """The Flask app in testing mode over a freshly seeded database, with empty caches."""
+    flask_app.testing = True
+    with flask_app.app_context():
+        db.drop_all()
+        populate(users=20, movies=12, rentals=20, ratings=200)
+        db.session.remove()
+    if cache.backend is not None:
+        cache.backend = MemoryBackend(flask_app.config['CACHE_MAX_ENTRIES'])
+    if compressor.store is not None:
+        compressor.store = MemoryBackend(flask_app.config['COMPRESSION_CACHE_ENTRIES'])
+    yield flask_app
+    with flask_app.app_context():
+        db.session.remove()
+
+
+@pytest.fixture
+def client(app):
+    return app.test_client()
@@ -0,0 +1,89 @@
+# Standard library imports
+import asyncio
+
+# Remote library imports
+import pytest
+
+# Local imports
+import asgi
+
+PATHS = [
+    '/users/1', '/movies/1', '/movies/2', '/rentals/1', '/ratings/1',
+    '/users?limit=5', '/movies?limit=5', '/rentals?limit=5', '/ratings?limit=5',
+]
+
+
+def asgi_get(paths):
+    """[(status, headers, body)] of GETs of `paths` served by the ASGI app, in one event loop."""
+    async def get(path):
+        path, _, query = path.partition('?')
+        scope = {
+            'type': 'http', 'method': 'GET', 'scheme': 'http', 'path': path, 'query_string': query.encode(),
+            'headers': [(b'host', b'localhost'), (b'accept-encoding', b'identity')],
+        }
+        messages = []
+
+        async def receive():
+            return {'type': 'http.request', 'body': b'', 'more_body': False}
+
+        async def send(message):
+            messages.append(message)
+
+        await asgi.app(scope, receive, send)
+        start = messages[0]
+        headers = {name.decode().lower(): value.decode() for name, value in start['headers']}
+        return start['status'], headers, b''.join(message.get('body', b'') for message in messages[1:])
+
+    async def run():
+        try:
+            return [await get(path) for path in paths]
+        finally:
+            await asgi.engine.dispose()
+
+    return asyncio.run(run())
+
+
+@pytest.mark.parametrize('path', PATHS)
+def test_asgi_and_flask_send_the_same_body_and_etag(app, client, path):
+    flask = client.get(path, headers={'Accept-Encoding': 'identity'})
+    [(status, headers, body)] = asgi_get([path])
+    assert (status, headers['etag'], body) == (flask.status_code, flask.headers['ETag'], flask.data)
+
+
+def test_change_feed_poller_survives_errors_and_clears_itself(app, monkeypatch):
+    monkeypatch.setitem(app.config, 'CHANGE_FEED_POLL_INTERVAL', 0.01)
+    resume_point, since = asgi.ChangeLog.resume_point, asgi.ChangeLog.since
+    failures = {'resume_point': 1, 'since': 1}
+
+    def failing(name, method):
+        def call(*args, **kwargs):
+            if failures[name]:
+                failures[name] -= 1
+                raise RuntimeError(f'{name} failed')
+            return method(*args, **kwargs)
+        return call
+
+    monkeypatch.setattr(asgi.ChangeLog, 'resume_point', failing('resume_point', resume_point))
+    monkeypatch.setattr(asgi.ChangeLog, 'since', failing('since', since))
+
+    async def run():
+        feed = asgi.ChangeFeed()
+        subscriber = asgi.Subscriber(100)
+        feed.subscribers.add(subscriber)
+        feed.task = asyncio.ensure_future(feed.poll())
+        async def failed_twice():
+            while any(failures.values()):
+                await asyncio.sleep(0.01)
+
+        try:
+            await asyncio.wait_for(failed_twice(), 1)
+            await asyncio.sleep(0.05)
+            task = feed.task
+            assert not task.done()
+            feed.subscribers.discard(subscriber)
+            await asyncio.wait_for(task, 1)
+            assert feed.task is None
+        finally:
+            await asgi.engine.dispose()
+
+    asyncio.run(run())
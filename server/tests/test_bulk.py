@@ -0,0 +1,82 @@
+# Standard library imports
+import json
+from datetime import datetime, timedelta
+
+# Remote library imports
+import pytest
+
+# Local imports
+from models import db, Rental, Rating
+
+
+def due_date():
+    return (datetime.now() + timedelta(days=7)).replace(microsecond=0).isoformat()
+
+
+def statuses(response):
+    assert response.status_code == 200
+    return [result['status'] for result in response.json['results']]
+
+
+@pytest.mark.parametrize('movie_id', [[1], '1', {'id': 1}, 0, -3, None])
+def test_bad_ids_fail_only_their_own_item(app, client, movie_id):
+    response = client.post('/rentals/bulk', json=[
+        {'user_id': 1, 'movie_id': movie_id, 'due_date': due_date()},
+        {'user_id': 2, 'movie_id': 2, 'due_date': due_date()},
+    ])
+    assert statuses(response) == [400, 201]
+    assert response.json['results'][0]['errors'] == {'movie_id': 'Movie ID must be a positive integer.'}
+    assert response.json['succeeded'] == 1 and response.json['failed'] == 1
+
+
+def test_mixed_batch_reports_each_item(app, client):
+    response = client.post('/ratings/bulk', json=[
+        {'user_id': 1, 'movie_id': 1, 'rating': 7, 'review': 'Fine'},
+        {'user_id': 1, 'movie_id': 1, 'rating': 11},
+        {'user_id': 1, 'movie_id': 99999, 'rating': 5},
+        'not an object',
+        {'user_id': 2, 'movie_id': 3, 'rating': 9},
+    ])
+    assert statuses(response) == [201, 400, 404, 400, 201]
+    assert [result['index'] for result in response.json['results']] == [0, 1, 2, 3, 4]
+    with app.app_context():
+        created = [result['id'] for result in response.json['results'] if result['status'] == 201]
+        assert sorted(db.session.scalars(db.select(Rating.rating).where(Rating.id.in_(created)))) == [7, 9]
+
+    updated = client.patch('/ratings/bulk', json=[{'id': created[0], 'rating': 2}, {'id': 99999, 'rating': 2}, {'rating': 2}])
+    assert statuses(updated) == [202, 404, 400]
+
+    deleted = client.delete('/ratings/bulk', json=[created[1], 99999])
+    assert statuses(deleted) == [204, 404]
+    assert client.delete('/ratings/bulk', json=['1']).status_code == 400
+
+
+def test_ndjson_body(app, client):
+    lines = [
+        json.dumps({'name': 'Nd One', 'email': 'nd.one@example.com'}),
+        '',
+        '{not json',
+        json.dumps({'name': 'Nd Two', 'email': 'nd.one@example.com'}),
+    ]
+    response = client.post('/users/bulk', data='\n'.join(lines) + '\n', content_type='application/x-ndjson')
+    assert statuses(response) == [201, 400, 409]
+    assert response.json['results'][1]['errors'].startswith('Invalid JSON')
+
+
+def test_purge_filters(app, client):
+    with app.app_context():
+        expected = db.session.scalar(db.select(db.func.count()).select_from(Rental).where(Rental.movie_id == 1))
+        total = db.session.scalar(db.select(db.func.count()).select_from(Rental))
+    response = client.delete('/rentals/bulk?movie_id=1')
+    assert response.status_code == 200 and response.json == {'deleted': expected}
+    with app.app_context():
+        assert db.session.scalar(db.select(db.func.count()).select_from(Rental)) == total - expected
+
+    future = (datetime.now() + timedelta(days=365)).isoformat()
+    assert client.delete(f'/ratings/bulk?before={future}&user_id=1').status_code == 200
+    with app.app_context():
+        assert db.session.scalar(db.select(db.func.count()).select_from(Rating).where(Rating.user_id == 1)) == 0
+
+    assert client.delete('/rentals/bulk?colour=red').status_code == 400
+    assert client.delete('/rentals/bulk?movie_id=one').status_code == 400
+    assert client.delete('/users/bulk?name=x').status_code == 400
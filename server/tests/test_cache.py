@@ -0,0 +1,26 @@
+# Local imports
+from config import cache
+from models import db, Movie, Rating, MovieRatingStats
+
+
+def test_writes_from_another_worker_invalidate_cached_movies(app, client):
+    """Entries are keyed by the shared table versions, so a write this process never saw still retires them."""
+    assert client.get('/movies/1').status_code == 200
+    listed = client.get('/movies?limit=5').json
+    hits = cache.hits['movies']
+    assert client.get('/movies/1').status_code == 200
+    assert cache.hits['movies'] == hits + 1
+
+    # Written as another worker would: straight to the database, past this process's cache.
+    with app.app_context():
+        movie = db.session.get(Movie, 1)
+        movie.title = 'Renamed Elsewhere'
+        db.session.add(Rating(user_id=1, movie_id=1, rating=10, review=None))
+        MovieRatingStats.record(1, 10)
+        db.session.commit()
+        count = db.session.get(MovieRatingStats, 1).count
+
+    detail = client.get('/movies/1').json
+    assert detail['title'] == 'Renamed Elsewhere'
+    assert detail['rating_stats']['count'] == count
+    assert client.get('/movies?limit=5').json[0]['title'] == 'Renamed Elsewhere' != listed[0]['title']
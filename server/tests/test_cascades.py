@@ -0,0 +1,51 @@
+# Remote library imports
+import pytest
+
+# Local imports
+from models import db, Rental
+
+
+def etags(client, paths):
+    tags = {}
+    for path in paths:
+        response = client.get(path)
+        assert response.status_code == 200, path
+        tags[path] = response.headers['ETag']
+    return tags
+
+
+def assert_changed(client, tags):
+    for path, etag in tags.items():
+        assert client.get(path, headers={'If-None-Match': etag}).status_code != 304, path
+
+
+def renting_user(app):
+    with app.app_context():
+        rental = db.session.scalars(db.select(Rental).order_by(Rental.id)).first()
+        return rental.user_id, rental.movie_id
+
+
+@pytest.mark.parametrize('delete', [
+    lambda client, id: client.delete(f'/users/{id}'),
+    lambda client, id: client.delete('/users/bulk', json=[id]),
+])
+def test_deleting_a_user_changes_the_etags_of_what_cascades(app, client, delete):
+    user_id, movie_id = renting_user(app)
+    tags = etags(client, ['/rentals', f'/users/{user_id}/rentals', f'/movies/{movie_id}/rentals', f'/movies/{movie_id}/inventory', '/ratings'])
+
+    assert delete(client, user_id).status_code in (200, 204)
+    assert client.get('/rentals', headers={'If-None-Match': tags['/rentals']}).status_code == 200
+    assert_changed(client, tags)
+
+
+@pytest.mark.parametrize('delete', [
+    lambda client, id: client.delete(f'/movies/{id}'),
+    lambda client, id: client.delete('/movies/bulk', json=[id]),
+])
+def test_deleting_a_movie_changes_the_etags_of_what_cascades(app, client, delete):
+    _, movie_id = renting_user(app)
+    genre = client.get(f'/movies/{movie_id}').json['genre']
+    tags = etags(client, ['/rentals', '/ratings', '/movies/top', f'/genres/{genre}/stats', '/users/1/recommendations'])
+
+    assert delete(client, movie_id).status_code in (200, 204)
+    assert_changed(client, tags)
@@ -0,0 +1,14 @@
+# Local imports
+from models import db
+from benchmarks.common import populate
+
+
+def test_etags_change_when_the_database_is_rebuilt(app, client):
+    first = client.get('/movies/1')
+    with app.app_context():
+        db.drop_all()
+        populate(users=20, movies=12, rentals=20, ratings=200)
+        db.session.remove()
+    again = client.get('/movies/1', headers={'If-None-Match': first.headers['ETag']})
+    assert again.status_code == 200
+    assert again.headers['ETag'] != first.headers['ETag']
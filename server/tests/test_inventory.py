@@ -0,0 +1,39 @@
+# Standard library imports
+from datetime import datetime, timedelta
+
+# Local imports
+from models import db, Rental
+
+
+def due_date():
+    return (datetime.now() + timedelta(days=7)).replace(microsecond=0).isoformat()
+
+
+def sell_out(client, movie_id):
+    """Stock `movie_id` with one more copy than is rented out; return how many that is."""
+    rented = client.get(f'/movies/{movie_id}/inventory').json['rented']
+    assert client.patch(f'/movies/{movie_id}/inventory', json={'copies': rented + 1}).status_code == 202
+    return rented + 1
+
+
+def test_checking_out_the_last_copy(app, client):
+    copies = sell_out(client, 1)
+    created = client.post('/rentals', json={'user_id': 1, 'movie_id': 1, 'due_date': due_date()})
+    assert created.status_code == 201
+
+    refused = client.post('/rentals', json={'user_id': 2, 'movie_id': 1, 'due_date': due_date()})
+    assert refused.status_code == 409
+    assert client.get('/movies/1/inventory').json == {'movie_id': 1, 'copies': copies, 'rented': copies, 'available': 0}
+
+
+def test_moving_a_rental_onto_a_sold_out_movie(app, client):
+    with app.app_context():
+        rental = db.session.scalars(db.select(Rental).where(Rental.movie_id != 1)).first()
+        rental_id, movie_id, user_id = rental.id, rental.movie_id, rental.user_id
+    sell_out(client, 1)
+    assert client.post('/rentals', json={'user_id': 1, 'movie_id': 1, 'due_date': due_date()}).status_code == 201
+
+    moved = client.patch(f'/rentals/{rental_id}', json={'movie_id': 1, 'user_id': user_id, 'due_date': due_date()})
+    assert moved.status_code == 409
+    assert client.get(f'/rentals/{rental_id}').json['movie_id'] == movie_id
+    assert client.get('/movies/1/inventory').json['available'] == 0
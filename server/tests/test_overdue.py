@@ -0,0 +1,29 @@
+# Standard library imports
+from datetime import datetime, timedelta
+
+# Local imports
+from models import db, Rental, OverdueRental
+
+
+def overdue_ids(client):
+    response = client.get('/rentals?status=overdue&limit=1000')
+    assert response.status_code == 200
+    return {rental['id'] for rental in response.json}
+
+
+def test_bulk_update_keeps_overdue_records_unless_the_due_date_changes(app, client):
+    with app.app_context():
+        assert OverdueRental.scan(full=True)
+        kept, rescheduled = db.session.scalars(db.select(OverdueRental.rental_id).order_by(OverdueRental.rental_id).limit(2)).all()
+        other_movie = db.session.get(Rental, kept).movie_id % 12 + 1
+        db.session.remove()
+    assert {kept, rescheduled} <= overdue_ids(client)
+
+    assert client.patch(f'/movies/{other_movie}/inventory', json={'copies': 100}).status_code == 202
+    due_date = (datetime.now() + timedelta(days=7)).replace(microsecond=0).isoformat()
+    response = client.patch('/rentals/bulk', json=[{'id': kept, 'movie_id': other_movie}, {'id': rescheduled, 'due_date': due_date}])
+    assert [result['status'] for result in response.json['results']] == [202, 202]
+
+    overdue = overdue_ids(client)
+    assert kept in overdue
+    assert rescheduled not in overdue
@@ -0,0 +1,34 @@
+# Remote library imports
+import pytest
+
+# Local imports
+import app as resources
+from instrumentation import QueryBudgetExceeded
+
+# Values for each kind of URL variable, all present in the seeded database.
+URL_VALUES = {'id': 1, 'genre': 'Drama', 'table': 'users'}
+# Streams that never end on their own.
+SKIPPED = {'/changes'}
+
+
+def get_routes(app):
+    for rule in app.url_map.iter_rules():
+        if 'GET' in rule.methods and rule.endpoint != 'static' and rule.rule not in SKIPPED:
+            yield rule.build({name: URL_VALUES[name] for name in rule.arguments})[1]
+
+
+def test_every_get_route_keeps_to_its_query_budget(app, client):
+    paths = list(get_routes(app))
+    assert '/movies/1' in paths
+    for path in paths:
+        response = client.get(path)
+        assert response.status_code < 500, path
+        # A second, conditional read is answered from the version counters.
+        if response.headers.get('ETag'):
+            assert client.get(path, headers={'If-None-Match': response.headers['ETag']}).status_code == 304, path
+
+
+def test_going_over_budget_fails(app, client, monkeypatch):
+    monkeypatch.setattr(resources.Movies, 'query_budget', {'get': 0})
+    with pytest.raises(QueryBudgetExceeded, match=r'GET /movies ran \d+ queries \(budget 0\)'):
+        client.get('/movies')
@@ -0,0 +1,33 @@
+# Remote library imports
+import pytest
+
+# Local imports
+import query_plans
+from models import db
+
+
+@pytest.mark.parametrize('detail, full', [
+    ('SCAN movies', True),
+    ('SCAN TABLE movies', True),
+    ('SCAN movies USING INDEX ix_movies_genre', True),
+    ('SCAN movies USING COVERING INDEX ix_movies_genre', True),
+    ('SCAN TABLE users USING INTEGER PRIMARY KEY (rowid>?)', False),
+    ('SEARCH movies USING INDEX ix_movies_genre (genre=?)', False),
+    ('SEARCH users USING INTEGER PRIMARY KEY (rowid>?)', False),
+    ('USE TEMP B-TREE FOR ORDER BY', False),
+])
+def test_full_scans_are_flagged(detail, full):
+    assert query_plans.is_full_scan(detail) is full
+
+
+def test_allowed_covering_index_scan(monkeypatch):
+    monkeypatch.setattr(query_plans, 'COVERING_SCAN_TABLES', frozenset({'movies'}))
+    assert not query_plans.is_full_scan('SCAN movies USING COVERING INDEX ix_movies_genre')
+    assert query_plans.is_full_scan('SCAN movies USING INDEX ix_movies_genre')
+
+
+def test_hot_queries_search_an_index(app):
+    with app.app_context(), db.engine.connect() as connection:
+        for name, statement in query_plans.hot_queries():
+            scans = [detail for detail in query_plans.explain(connection, statement) if query_plans.is_full_scan(detail)]
+            assert not scans, name
@@ -0,0 +1,141 @@
+# Standard library imports
+import re
+from datetime import datetime
+
+EMAIL_PATTERN = re.compile(r'^\b[A-Za-z0-9._%+-]+@[A-Za-z0-9.-]+\.[A-Z|a-z]{2,}\b')
+
+MISSING = 'This field is required.'
+
+# Field rules take the raw value and the batch's `now` (None for rules that
+# don't need the clock) and return the normalized value or raise ValueError.
+
+
+def name(value, now):
+    if isinstance(value, str) and len(value) <= 100:
+        return value.strip()
+    raise ValueError("Name must be a string with 2 to 100 characters.")
+
+
+def email(value, now):
+    if isinstance(value, str) and EMAIL_PATTERN.match(value):
+        return value.strip().lower()
+    raise ValueError("Email must be a valid email address.")
+
+
+def title(value, now):
+    if isinstance(value, str) and 1 < len(value) <= 100:
+        return value.strip()
+    raise ValueError("Title must be a string with more than 1 character and up to 100 characters.")
+
+
+def genre(value, now):
+    if isinstance(value, str) and 1 < len(value) <= 50:
+        return value.strip()
+    raise ValueError("Genre must be a string with more than 1 character and up to 50 characters.")
+
+
+def release_year(value, now):
+    if isinstance(value, int) and 1800 <= value <= now.year:
+        return value
+    raise ValueError(f"Release year must be an integer between 1800 and {now.year}.")
+
+
+def image(value, now):
+    if not isinstance(value, str) or not value.strip():
+        raise ValueError("Image must be a non-empty string.")
+    return value
+
+
+def positive_id(label):
+    message = f"{label} ID must be a positive integer."
+
+    def rule(value, now):
+        if isinstance(value, int) and value > 0:
+            return value
+        raise ValueError(message)
+    return rule
+
+
+def due_date(value, now):
+    if value is None:
+        return None
+    if isinstance(value, str):
+        try:
+            value = datetime.fromisoformat(value)
+        except ValueError:
+            raise ValueError("Due date must be a valid ISO 8601 date string or a `datetime` object.")
+    elif not isinstance(value, datetime):
+        raise ValueError("Due date must be a valid `datetime` object or an ISO 8601 string.")
+    if value > now:
+        return value
+    raise ValueError("Due date must be in the future.")
+
+
+def rating(value, now):
+    if isinstance(value, int) and 1 <= value <= 10:
+        return value
+    raise ValueError("Rating must be an integer between 1 and 10.")
+
+
+def review(value, now):
+    if value is None:
+        return None
+    if isinstance(value, str) and 0 < len(value) <= 500:
+        return value
+    raise ValueError("Review must be a string with up to 500 characters.")
+
+
+class Schema:
+    """The field rules of one model, applied a field at a time or to whole batches.
+
+    The model's `@validates` hook calls `validate_field`, so the ORM and the
+    request handlers share one set of rules. `validate_batch` checks a list
+    of dicts in a single pass, reading the clock once for the whole batch and
+    collecting every field's error for each item instead of stopping at the first.
+    """
+
+    def __init__(self, rules, required=None, clocked=()):
+        self.rules = rules
+        self.fields = tuple(rules)
+        self.required = tuple(rules if required is None else required)
+        self.clocked = frozenset(clocked)
+
+    def validate_field(self, field, value):
+        return self.rules[field](value, datetime.now() if field in self.clocked else None)
+
+    def validate(self, item, partial=False, now=None):
+        """Return (row, errors) for one dict: the normalized fields, and {field: message} for the invalid ones.
+
+        Fields missing from a `partial` item are left out; otherwise required
+        ones are reported and optional ones default to None.
+        """
+        if now is None and self.clocked:
+            now = datetime.now()
+        row, errors = {}, {}
+        for field, rule in self.rules.items():
+            if field in item:
+                try:
+                    row[field] = rule(item[field], now)
+                except (ValueError, TypeError) as e:
+                    errors[field] = str(e)
+            elif not partial:
+                if field in self.required:
+                    errors[field] = MISSING
+                else:
+                    row[field] = None
+        return row, errors
+
+    def validate_batch(self, items, partial=False):
+        """[(row, errors), ...] for a list of dicts, in order."""
+        now = datetime.now() if self.clocked else None
+        validate = self.validate
+        return [validate(item, partial, now) for item in items]
+
+
+USER_SCHEMA = Schema({'name': name, 'email': email})
+MOVIE_SCHEMA = Schema({'title': title, 'genre': genre, 'release_year': release_year, 'image': image}, clocked=('release_year',))
+RENTAL_SCHEMA = Schema({'user_id': positive_id('User'), 'movie_id': positive_id('Movie'), 'due_date': due_date}, clocked=('due_date',))
+RATING_SCHEMA = Schema(
+    {'user_id': positive_id('User'), 'movie_id': positive_id('Movie'), 'rating': rating, 'review': review},
+    required=('user_id', 'movie_id', 'rating'),
+)
@@ -0,0 +1,19 @@
+#!/usr/bin/env python3
+"""Run the scheduled background jobs in a process of their own.
+
+    python worker.py
+
+Use this instead of `RUN_SCHEDULER` when the API runs in several worker
+processes, so each job runs once per interval rather than once per worker.
+"""
+
+# Standard library imports
+import logging
+
+# Local imports
+from app import app
+import jobs
+
+if __name__ == '__main__':
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s %(name)s %(levelname)s %(message)s')
+    jobs.scheduler_for(app).run()